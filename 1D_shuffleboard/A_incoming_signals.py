@@ -0,0 +1,253 @@
+import os
+import sys
+import time
+from fractions import Fraction
+
+import numpy as np
+import zmq
+from scipy.signal import resample_poly
+
+# Constants
+NUM_CHANNELS = 32
+SAMPLE_RATE = 500  # Samples per second per channel; B analyzes at 500 Hz, recordings run at up to 30 kHz
+PACKET_SIZE = 10  # Samples per channel in each message
+SOURCE = 'oscillations'  # 'oscillations', 'fbm' or the path of an .rhs recording
+RHS_LOADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'load_intan_rhs_format')
+RHS_READ_SAMPLES = 300000  # Samples per channel read from an .rhs file at a time, 10 s at 30 kHz
+
+
+def oscillation_source(num_channels=NUM_CHANNELS, sample_rate=SAMPLE_RATE, packet_size=PACKET_SIZE, frequencies=None,
+                       amplitude=1.0, noise=0.1, seed=None):
+    # Sine on every channel (4-40 Hz spread across channels by default) plus white noise; phase carries over between packets
+    rng = np.random.default_rng(seed)
+    if frequencies is None:
+        frequencies = np.linspace(4, 40, num_channels)
+    frequencies = np.broadcast_to(np.asarray(frequencies, dtype=np.float64), (num_channels,))
+    phases = rng.uniform(0, 2 * np.pi, num_channels)
+    t = np.arange(packet_size)[:, np.newaxis] / sample_rate
+    start = 0
+    while True:
+        block = amplitude * np.sin(2 * np.pi * frequencies * (t + start / sample_rate) + phases)
+        block += noise * rng.standard_normal((packet_size, num_channels))
+        start += packet_size
+        yield block.astype(np.float32)
+
+def generate_fbm_sequence(length, hurst, initial_scale, num_channels=1, rng=None):
+    """
+    Midpoint-displacement fractional Brownian motion as generate_fbm_sequence in stimulation_experiments/exp1.ipynb,
+    for a power-of-two `length` and every channel at once. Each level of the recursion is filled in one step,
+    so 30 kHz x 32 channels is generated faster than real time. Returns (length, num_channels).
+    """
+    if length & (length - 1):
+        raise ValueError(f"Unexpected fBm length: {length}. Expected a power of two.")
+    rng = rng or np.random.default_rng()
+    fbm = np.zeros((length + 1, num_channels))  # Both ends stay at 0
+    step, scale = length, initial_scale
+    while step > 1:
+        left = np.arange(0, length, step)
+        mid = left + step // 2
+        fbm[mid] = 0.5 * (fbm[left] + fbm[left + step]) + scale * (rng.random((left.size, num_channels)) - 0.5)
+        step //= 2
+        scale /= 2 ** hurst
+    return np.cumsum(np.diff(fbm, axis=0), axis=0)
+
+def fbm_source(num_channels=NUM_CHANNELS, packet_size=PACKET_SIZE, hurst=0.8, initial_scale=8, segment=4096, seed=None):
+    # Consecutive fBm segments; every segment returns to 0 at its end, so the stream has no jumps between them
+    rng = np.random.default_rng(seed)
+    pending = np.empty((0, num_channels))
+    while True:
+        while pending.shape[0] < packet_size:
+            pending = np.concatenate([pending, generate_fbm_sequence(segment, hurst, initial_scale, num_channels, rng)])
+        block, pending = pending[:packet_size], pending[packet_size:]
+        yield block.astype(np.float32)
+
+def rhs_block_dtype(header):
+    # One data block of an .rhs file as a structured dtype, fields in the order intanutil.data.read_one_data_block reads them
+    samples = header['num_samples_per_data_block']
+    amplifier = ('<u2', (header['num_amplifier_channels'], samples))
+    fields = [('t', '<i4', (samples,)), ('amplifier_data',) + amplifier]
+    if header['dc_amplifier_data_saved']:
+        fields.append(('dc_amplifier_data',) + amplifier)
+    fields.append(('stim_data',) + amplifier)
+    for name, key in (('board_adc_data', 'num_board_adc_channels'), ('board_dac_data', 'num_board_dac_channels')):
+        if header[key] > 0:
+            fields.append((name, '<u2', (header[key], samples)))
+    for name, key in (('board_dig_in_raw', 'num_board_dig_in_channels'), ('board_dig_out_raw', 'num_board_dig_out_channels')):
+        if header[key] > 0:
+            fields.append((name, '<u2', (samples,)))  # One 16-bit word for all digital channels
+    return np.dtype(fields)
+
+def read_rhs_blocks(path, block_samples=RHS_READ_SAMPLES):
+    """
+    Opens an .rhs recording for reading block by block. Returns a generator of consecutive (samples, channels)
+    amplifier_data blocks in microvolts, as the Intan RHS loader (load_intan_rhs_format.read_data) returns the whole
+    file, of about block_samples samples each, and the amplifier sample rate. Only one block is in memory at a time.
+    The software notch filter that loader applies to files of Intan software before 3.0 is not applied here.
+    """
+    if RHS_LOADER_DIR not in sys.path:
+        sys.path.append(RHS_LOADER_DIR)
+    from intanutil.header import read_header
+    with open(path, 'rb') as fid:
+        header = read_header(fid)
+        data_start = fid.tell()
+    if header['num_amplifier_channels'] == 0:
+        raise ValueError(f"No amplifier data in {path}")
+    if header['notch_filter_frequency'] and header['version']['major'] < 3:
+        print(f"{path}: recorded with a {header['notch_filter_frequency']} Hz notch filter that is not applied")
+    data_block = rhs_block_dtype(header)
+    blocks_per_read = max(block_samples // header['num_samples_per_data_block'], 1)
+
+    def blocks():
+        with open(path, 'rb') as fid:
+            fid.seek(data_start)
+            while True:
+                data = np.fromfile(fid, dtype=data_block, count=blocks_per_read)
+                if data.size == 0:
+                    return
+                # (data blocks, channels, block samples) to (samples, channels), scaled as intanutil.data.scale_analog_data
+                amplifier = data['amplifier_data'].transpose(0, 2, 1).reshape(-1, header['num_amplifier_channels'])
+                yield 0.195 * (amplifier.astype(np.int32) - 32768)
+    return blocks(), header['sample_rate']
+
+def resample_blocks(blocks, sample_rate, target_rate=SAMPLE_RATE):
+    """
+    Resamples a stream of (samples, channels) blocks to target_rate with scipy.signal.resample_poly, block by
+    block. Every block is filtered together with enough of the samples around it for the polyphase filter,
+    so the output is the same as resample_poly of the whole stream. Blocks pass through when the rates match.
+    """
+    ratio = Fraction(target_rate / sample_rate).limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+    if up == down:
+        yield from blocks
+        return
+    # resample_poly's default filter reaches 10 * max(up, down) upsampled samples to each side; as input samples,
+    # rounded up to whole multiples of down so that chunk boundaries fall on output samples
+    context = -(-(10 * max(up, down) // up + 1) // down) * down
+    pending = None  # Input samples from pending_start on
+    pending_start = 0
+    done = 0  # Input samples whose output has been yielded, a multiple of down
+    for block in blocks:
+        block = np.asarray(block, dtype=np.float64)
+        pending = block if pending is None else np.concatenate([pending, block])
+        end = (pending_start + pending.shape[0] - context) // down * down  # Last input sample with its full right context
+        if end > done:
+            resampled = resample_poly(pending[:end + context - pending_start], up, down, axis=0)
+            yield resampled[(done - pending_start) * up // down:(end - pending_start) * up // down]
+            done = end
+            keep = max(done - context, 0)  # Left context of the next output
+            pending = pending[keep - pending_start:]
+            pending_start = keep
+    if pending is not None:
+        # Zero padding past the end, as resample_poly of the whole stream
+        yield resample_poly(pending, up, down, axis=0)[(done - pending_start) * up // down:]
+
+def packet_blocks(blocks, num_channels=NUM_CHANNELS, packet_size=PACKET_SIZE):
+    # Cuts a stream of (samples, channels) blocks into float32 packets, carrying partial packets over; a partial last one is dropped
+    pending = np.empty((0, num_channels), dtype=np.float32)
+    for block in blocks:
+        if block.shape[1] < num_channels:
+            raise ValueError(f"Unexpected data shape: {block.shape}. Expected at least {num_channels} channels.")
+        pending = np.concatenate([pending, np.asarray(block[:, :num_channels], dtype=np.float32)])
+        packets = pending.shape[0] // packet_size
+        for start in range(0, packets * packet_size, packet_size):
+            yield pending[start:start + packet_size]
+        pending = pending[packets * packet_size:]
+
+def rhs_source(path, sample_rate=SAMPLE_RATE, num_channels=NUM_CHANNELS, packet_size=PACKET_SIZE, loop=True):
+    # Replays an .rhs recording in packets, read block by block and resampled to sample_rate (as B expects), from the start
+    # again at the end when loop is set
+    while True:
+        blocks, recorded_rate = read_rhs_blocks(path)
+        yield from packet_blocks(resample_blocks(blocks, recorded_rate, sample_rate), num_channels, packet_size)
+        if not loop:
+            return
+
+def encode_packet(block):
+    # Raw float32 (samples, channels) bytes, as receive_neural_data in B_signals_to_features.py reads them
+    return np.ascontiguousarray(block, dtype=np.float32).tobytes()
+
+
+class NeuralSource:
+    """
+    Publishes a stream of (packet_size, channels) sample blocks on 5444 as a stand-in for the acquisition hardware.
+
+    Packet k goes out at start + k * packet_size / sample_rate, so the sample rate is kept however long
+    generating and sending take; when the publisher falls behind, packets are sent back to back until it
+    has caught up. With sample_rate=None packets go out as fast as they are generated, which makes the
+    stage a load generator for throughput benchmarks of B. Throughput is printed every report_interval seconds.
+    """
+    def __init__(self, source, sample_rate=SAMPLE_RATE, packet_size=PACKET_SIZE, address="tcp://*:5444", report_interval=1.0):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.packet_size = packet_size
+        self.report_interval = report_interval
+        self.context = zmq.Context()
+        self.pub_socket = self.context.socket(zmq.PUB)
+        self.pub_socket.bind(address)
+        self.packets = 0
+        self.bytes = 0
+        self.max_lateness = 0.0
+
+    def run(self, duration=None):
+        period = self.packet_size / self.sample_rate if self.sample_rate else 0.0
+        start = time.perf_counter()
+        last_report = start
+        reported_packets, reported_bytes = 0, 0
+        for block in self.source:
+            now = time.perf_counter()
+            if duration is not None and now - start >= duration:
+                break
+            if period:
+                due = start + self.packets * period
+                if due > now:
+                    time.sleep(due - now)
+                self.max_lateness = max(self.max_lateness, time.perf_counter() - due)
+            message = encode_packet(block)
+            self.pub_socket.send(message)
+            self.packets += 1
+            self.bytes += len(message)
+
+            now = time.perf_counter()
+            if now - last_report >= self.report_interval:
+                elapsed = now - last_report
+                packets, sent = self.packets - reported_packets, self.bytes - reported_bytes
+                print(f"Packets/s: {packets / elapsed:.0f}, samples/s per channel: {packets * self.packet_size / elapsed:.0f}, "
+                      f"MB/s: {sent / elapsed / 1e6:.2f}, max lateness: {self.max_lateness * 1000:.2f} ms")
+                reported_packets, reported_bytes = self.packets, self.bytes
+                last_report = now
+                self.max_lateness = 0.0
+
+    def close(self):
+        self.pub_socket.close(linger=0)
+
+def make_source(source=SOURCE, sample_rate=SAMPLE_RATE, packet_size=PACKET_SIZE):
+    # Returns the block generator and the sample rate to publish it at; recordings are resampled to it
+    if source == 'oscillations':
+        return oscillation_source(sample_rate=sample_rate, packet_size=packet_size), sample_rate
+    if source == 'fbm':
+        return fbm_source(packet_size=packet_size), sample_rate
+    return rhs_source(source, sample_rate, packet_size=packet_size), sample_rate
+
+def main():
+    # python A_incoming_signals.py [oscillations|fbm|recording.rhs] [sample rate|max] [packet size]
+    # An .rhs recording is resampled to the sample rate, SAMPLE_RATE unless a rate is given, the rate B analyzes at
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE
+    rate_argument = sys.argv[2] if len(sys.argv) > 2 else None
+    packet_size = int(sys.argv[3]) if len(sys.argv) > 3 else PACKET_SIZE
+
+    sample_rate = float(rate_argument) if rate_argument not in (None, 'max') else SAMPLE_RATE
+    blocks, rate = make_source(source, sample_rate, packet_size)
+    if rate_argument == 'max':
+        rate = None
+    elif rate_argument is not None:
+        rate = sample_rate
+    publisher = NeuralSource(blocks, rate, packet_size)
+    try:
+        publisher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
+import os
+import sys
 import numpy as np
 import zmq
+import time
 from scipy.signal import find_peaks, hilbert, welch
 from scipy.fft import fft, fftfreq
 import itertools
+from tracing import attach, stamp, start_trace
+
+FEATURE_MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2D_shuffleboard')  # Feature modules shared with the 2D stage
+if FEATURE_MODULES_DIR not in sys.path:
+    sys.path.append(FEATURE_MODULES_DIR)  # Appended, so the 1D modules of the same name still take precedence
+from fractal_dimension import calculate_higuchi_fractal_dimension
 
 # Constants
 NUM_CHANNELS = 32
 FS = 500  # Sampling rate in Hz
 UPDATE_RATE = 10  # Update rate in Hz, ensuring 10Hz rate
 BUFFER_SIZE = FS // UPDATE_RATE  # Size of buffer corresponding to update rate
+PSD_NPERSEG = 256  # Welch segment length, clamped to the buffer so the 50-sample window is a single segment
+BANDS = {'delta': (1, 4), 'theta': (4, 8), 'alpha': (8, 13), 'beta': (13, 30)}
 
 def receive_neural_data(socket):
     try:
@@ -55,22 +66,22 @@ def calculate_rms(signals):
     return rms
 
 def freq_bands(signals, fs=FS):
-    # Assuming signals is a 2D array: channels x samples
-    band_features = np.zeros((signals.shape[0], 4))  # 4 frequency bands
-    for i, signal in enumerate(signals):
-        frequencies, psd = welch(signal, fs, nperseg=1024)
-        # Frequency bands
-        bands = {'delta': (1, 4), 'theta': (4, 8), 'alpha': (8, 13), 'beta': (13, 30)}
-        for j, (name, (low, high)) in enumerate(bands.items()):
-            idx = np.logical_and(frequencies >= low, frequencies <= high)
-            band_features[i, j] = np.nanmean(psd[idx])
+    # One Welch estimate over all channels (channels x samples); a segment longer than the buffer is clamped to it
+    nperseg = min(PSD_NPERSEG, signals.shape[-1])
+    frequencies, psd = welch(signals, fs=fs, nperseg=nperseg, axis=-1)
+
+    band_features = np.zeros(signals.shape[:-1] + (len(BANDS),))
+    for j, (name, (low, high)) in enumerate(BANDS.items()):
+        idx = np.logical_and(frequencies >= low, frequencies <= high)
+        if np.any(idx):  # At 50 samples the bins are 10 Hz apart, bands without one stay 0
+            band_features[..., j] = np.nanmean(psd[..., idx], axis=-1)
     return band_features
     
 def calculate_spectral_entropy(neural_data_array, neural_channels, fs=FS):  
     spectral_entropy_dict = {}
     for channel, signal in zip(neural_channels, neural_data_array):
         # Calculate the power spectral density (PSD) using Welch's method
-        frequencies, psd = welch(signal, fs=fs, nperseg=fs*2)
+        frequencies, psd = welch(signal, fs=fs, nperseg=min(PSD_NPERSEG, len(signal)))
         # Normalize the PSD to get a probability distribution for entropy calculation
         normalized_psd = psd / np.sum(psd)
         # Calculate the spectral entropy
@@ -108,33 +119,13 @@ def spectral_edge_density(signals, fs=FS, percentage=95):
     return np.array(spectral_edge_densities)
 
 def phase_synchronization(signals):
-    num_channels = signals.shape[0]
-    plv_matrix = np.zeros((num_channels, num_channels))
-    for i, j in itertools.combinations(range(num_channels), 2):
-        plv_matrix[i, j] = compute_phase_locking_value(signals[i], signals[j])
-        plv_matrix[j, i] = plv_matrix[i, j]
+    # One Hilbert transform for all channels, then every pairwise PLV from a single complex matrix product
+    analytic_signals = hilbert(signals, axis=-1)
+    magnitude = np.abs(analytic_signals)
+    phasors = np.divide(analytic_signals, magnitude, out=np.zeros_like(analytic_signals), where=magnitude > 0)
+    plv_matrix = np.abs(phasors @ phasors.conj().T) / phasors.shape[-1]
     return plv_matrix
     
-def calculate_higuchi_fractal_dimension(signals, k_max): 
-    N = len(signals)
-    L = []
-    x = np.asarray(signals)
-    for k in range(1, k_max):
-        Lk = []
-        for m in range(0, k):
-            Lkm = 0
-            for i in range(1, int((N-m)/k)):
-                Lkm += abs(x[m+i*k] - x[m+i*k-k])
-            Lkm = Lkm*(N - 1)/(((N - m)/k)*k)
-            Lk.append(Lkm)
-        L.append(np.log(np.mean(Lk)))
-    hfd = np.polyfit(np.log(range(1, k_max)), L, 1)[0]
-    return higuchi_fractal_dimensions
-hfd_values = []
-for channel_data in neural_data.T:  # .T because we need to iterate over channels
-    hfd_channel = higuchi_fd(channel_data, k_max=10)  # Adjust k_max as needed
-    hfd_values.append(hfd_channel)
-
 def calculate_zero_crossing_rate(signals): 
     # Calculating zero-crossing rate
     zero_crossing_rates = np.array([((signal[:-1] * signal[1:]) < 0).sum() for signal in signals]) / len(signals[0])
@@ -169,6 +160,10 @@ def evolution_rate(signals):
         rates[i] = np.mean(np.abs(derivative))
     return rates
 
+def extract_features(buffer):
+    # Single control value for the 1D game, the mean RMS over channels (C_features_to_game.CONTROL_RULES)
+    return float(np.mean(calculate_rms(buffer.T)))
+
 def analyze_signals(signals):
     # Define `k_max` for Higuchi's fractal dimension calculation
     k_max = 5  # Example value; adjust based on your signal analysis needs
@@ -199,7 +194,7 @@ def analyze_signals(signals):
         'centroids': centroids.tolist(),
         'spectral_edge_densities': spectral_edge_densities.tolist(),
         'phase_synchronization': plv_matrix.tolist(),
-        'higuchi_fractal_dimension': hfd_values,
+        'higuchi_fractal_dimension': hfd_values.tolist(),
         'zero_crossing_rate': zero_crossing_rate.tolist(),
         'empirical_mode_decomposition': [imf.tolist() for imf in imfs],  # Assuming `imfs` is an array of IMFs
         'time_warping_factor': warping_factors.tolist(),
@@ -222,11 +217,14 @@ def main():
     while True:
         try:
             neural_data = receive_neural_data(sub_socket)
+            received_at = time.time()
             if neural_data.size > 0:
                 buffer = buffer_data(neural_data, buffer)
                 if time.time() - last_time >= 1/UPDATE_RATE:
+                    trace = start_trace('A', received_at)  # Traced from the arrival of the newest sample
                     feature = extract_features(buffer)
-                    pub_socket.send_string(f"{feature:.2f}") # edit this part as needed
+                    stamp(trace, 'B')
+                    pub_socket.send_string(attach(f"{feature:.2f}", trace)) # edit this part as needed
                     last_time = time.time()
         except Exception as e:
             print(f"Error in processing: {e}")
@@ -1,60 +1,113 @@
 import zmq
 import time
+import numpy as np
+from async_runtime import AsyncStageRuntime
+from tracing import attach, detach, stamp
+
+# Adjusted feature-to-action mappings for 1D shuffleboard, for messages with named features
+FEATURE_TO_ACTION_MAP = {
+    'variance': ('adjust_force', 0.2),  # Adjust force based on variance, indicating a need for more or less power
+    'std_dev': ('fine_tune_force', 0.1),  # Fine-tune force if standard deviation is low
+    'rms': ('execute_shot', 0.5),  # Execute shot if RMS value is high, indicating optimal shot power
+    'peak_counts': ('retry_shot', 3),  # Retry shot if peak count is high, suggesting a missed opportunity
+    # Simplified the action mapping to better fit the 1D shuffleboard context
+}
+CONTROL_FEATURE = 'rms'  # The single value B sends (extract_features)
+# Rules for that value, checked in order like the map above: the first rule whose threshold it is above fires.
+# Between the shot and hold thresholds the force follows the signal, so the next shot is played with it
+CONTROL_RULES = {
+    'shot': ('execute_shot', 0.7),  # Strong activity shoots with the current force
+    'raise': ('adjust_force', 0.55),  # Above the midpoint the force goes up
+    'hold': ('maintain_force', 0.35),  # Around it the force is kept
+    'lower': ('retry_shot', 0.0),  # Below it the force comes down for the next try
+}
+
+def control_features(value, control_rules=CONTROL_RULES):
+    # Every control rule reads the same value, so fired_rule applies them like the rules of the map
+    return {rule: value for rule in control_rules}
+
+def fired_rule(features, feature_to_action_map=FEATURE_TO_ACTION_MAP, thresholds=None):
+    """
+    Index into feature_to_action_map of the first rule whose feature is above its threshold, -1 where none fires.
+    features maps names to scalars or arrays and only the rules of the features present can fire; thresholds
+    optionally replaces the map's thresholds by name, broadcast against the values. The same applies to
+    CONTROL_RULES with control_features(value). batch_simulator plays this policy.
+    """
+    fired = -1
+    for index, (feature, entry) in reversed(list(enumerate(feature_to_action_map.items()))):
+        if feature in features:
+            threshold = thresholds[feature] if thresholds and feature in thresholds else entry[1]
+            fired = np.where(np.asarray(features[feature]) > threshold, index, fired)  # Earlier rules win
+    return fired
 
 class FeaturesToGameAction:
-    def __init__(self):
-        self.context = zmq.Context()
-        self.sub_socket = self.context.socket(zmq.SUB)
-        self.sub_socket.connect("tcp://localhost:5445")
-        self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
+    def __init__(self, runtime=None):
+        if runtime is None:
+            self.context = zmq.Context()
+            self.sub_socket = self.context.socket(zmq.SUB)
+            self.sub_socket.connect("tcp://localhost:5445")
+            self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
+            self.pub_socket = self.context.socket(zmq.PUB)
+            self.pub_socket.bind("tcp://*:5446")
+        else:
+            # Features are handled as soon as they arrive instead of being polled
+            self.sub_socket = runtime.subscribe("tcp://localhost:5445", self.handle_features_message)
+            self.pub_socket = runtime.publisher("tcp://*:5446")
         self.retry_interval = 1 / 10  # Retry interval to attempt receiving at 10Hz update rate
 
-        # Adjusted feature-to-action mappings for 1D shuffleboard
-        self.feature_to_action_map = {
-            'variance': ('adjust_force', 0.2),  # Adjust force based on variance, indicating a need for more or less power
-            'std_dev': ('fine_tune_force', 0.1),  # Fine-tune force if standard deviation is low
-            'rms': ('execute_shot', 0.5),  # Execute shot if RMS value is high, indicating optimal shot power
-            'peak_counts': ('retry_shot', 3),  # Retry shot if peak count is high, suggesting a missed opportunity
-            # Simplified the action mapping to better fit the 1D shuffleboard context
-        }
+        self.feature_to_action_map = FEATURE_TO_ACTION_MAP
+        self.control_rules = CONTROL_RULES
 
     def decode_signal_features(self):
         while True:
             try:
                 message = self.sub_socket.recv_string(flags=zmq.NOBLOCK)
-                feature_value = float(message)  # Assuming a single feature value for simplicity
-                return self.translate_features_to_action(feature_value)
+                return self.action_from_message(detach(message)[0])
             except zmq.Again:
                 time.sleep(self.retry_interval)  # Wait before retrying
                 continue
-            except ValueError:
-                print("Error decoding feature value")
-                return None
+
+    def action_from_message(self, message):
+        try:
+            feature_value = float(message)  # Assuming a single feature value for simplicity
+        except ValueError:
+            print("Error decoding feature value")
+            return None
+        return self.translate_features_to_action(feature_value)
+
+    def handle_features_message(self, message):
+        # AsyncStageRuntime handler: translate and forward to the game stage right away
+        payload, trace = detach(message)
+        action = self.action_from_message(payload)
+        if action:
+            stamp(trace, 'C')
+            self.process_actions(action, trace)
 
     def translate_features_to_action(self, feature_value):
         """
-        Translate the decoded signal feature value into a game action.
-        Adjusted for the context of a 1D shuffleboard game.
+        Translate the decoded signal feature value into a game action ShuffleboardGame.apply_action handles.
+        B sends the mean RMS only, which goes through the control rules: shoot on strong activity, otherwise
+        raise, keep or lower the force. A dict of named features goes through the feature-to-action map
+        instead. None (no action) when no rule fires.
         """
-        if feature_value > 0.5:
-            return 'increase_force'
-        elif feature_value <= 0.5:
-            return 'decrease_force'
+        if isinstance(feature_value, dict):
+            rules, features = self.feature_to_action_map, feature_value
         else:
-            return 'maintain_force'
+            rules, features = self.control_rules, control_features(feature_value, self.control_rules)
+        rule = int(fired_rule(features, rules))
+        if rule < 0:
+            return None
+        return list(rules.values())[rule][0]
 
-    def process_actions(self, action):
+    def process_actions(self, action, trace=None):
         # Implement action execution based on decoded action
         print(f"Action to perform: {action}")
+        self.pub_socket.send_string(attach(action, trace))  # Forward to the game stage on port 5446
 
 def main():
-    features_to_action = FeaturesToGameAction()
-    
-    while True:
-        action = features_to_action.decode_signal_features()
-        if action:
-            features_to_action.process_actions(action)
-            time.sleep(1 / 10)  # Ensure consistent processing rate
+    runtime = AsyncStageRuntime()
+    features_to_action = FeaturesToGameAction(runtime)
+    runtime.start()
 
 if __name__ == "__main__":
     main()
@@ -1,20 +1,35 @@
 import zmq
 import time
+from async_runtime import AsyncStageRuntime
+from game_history import GameHistory
+from tracing import attach, detach, stamp
+
+HISTORY_LOG = 'shuffleboard_history.bin'  # Round records appended in batches, read with game_history.read_history_log
+INITIAL_FORCE = 10
+FORCE_STEPS = {'adjust_force': 5, 'fine_tune_force': 2, 'retry_shot': -5}  # Force change of each action
+SCORE_BANDS = ((0, 10), (5, 5), (10, 3))  # (Largest distance to target, points); shots further away score 1
 
 class ShuffleboardGame:
-    def __init__(self, target_distance):
+    def __init__(self, target_distance, runtime=None, history_log=None):
         self.target_distance = target_distance
-        self.player_force = 10  # Initial force
+        self.player_force = INITIAL_FORCE
         self.score = 0
         self.round = 1
-        self.history = []
+        self.history = GameHistory(log_path=history_log)  # Fixed-size columns, older rounds only in the log
         self.start_time = time.time()
 
-        # ZeroMQ setup for receiving actions
-        self.context = zmq.Context()
-        self.sub_socket = self.context.socket(zmq.SUB)
-        self.sub_socket.connect("tcp://localhost:5446")
-        self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
+        if runtime is None:
+            # ZeroMQ setup for receiving actions and publishing metadata to the optical stage
+            self.context = zmq.Context()
+            self.sub_socket = self.context.socket(zmq.SUB)
+            self.sub_socket.connect("tcp://localhost:5446")
+            self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
+            self.pub_socket = self.context.socket(zmq.PUB)
+            self.pub_socket.bind("tcp://*:5556")
+        else:
+            # Actions are applied as soon as they arrive instead of being polled
+            self.sub_socket = runtime.subscribe("tcp://localhost:5446", self.handle_action_message)
+            self.pub_socket = runtime.publisher("tcp://*:5556")
 
     def receive_action(self):
         try:
@@ -25,17 +40,10 @@ class ShuffleboardGame:
             return None
 
     def apply_action(self, action):
-        if action == 'adjust_force':
-            self.player_force += 5  # Example of adjusting force
-        elif action == 'fine_tune_force':
-            self.player_force += 2  # Fine-tuning force
-        elif action == 'execute_shot':
+        if action == 'execute_shot':
             return self.execute_shot()
-        elif action == 'retry_shot':
-            self.player_force -= 5  # Decrease force for a retry
-        else:
-            # Default or unknown action, maintain current force
-            pass
+        # Adjusting, fine-tuning or decreasing force for a retry; unknown actions maintain the current force
+        self.player_force += FORCE_STEPS.get(action, 0)
         return None
 
     def execute_shot(self):
@@ -45,65 +53,83 @@ class ShuffleboardGame:
         return actual_distance
 
     def update_state(self, actual_distance):
-        current_time = time.time()
-        result = {"distance": actual_distance, "force": self.player_force}
-        self.history.append({
-            'round': self.round,
-            'action': 'execute_shot',
-            'result': result,
-            'timestamp': current_time,
-            'distance_to_target': abs(self.target_distance - actual_distance),
-            'player_force': self.player_force
-        })
-        self.score += self.calculate_score(actual_distance)
+        points = self.calculate_score(actual_distance)
+        self.history.record(self.round, 'execute_shot', actual_distance, abs(self.target_distance - actual_distance),
+                            self.player_force, points, time.time())
+        self.score += points
         self.round += 1
 
     def calculate_score(self, actual_distance):
         # Scoring logic based on distance to target
         distance_to_target = abs(self.target_distance - actual_distance)
-        if distance_to_target == 0:
-            return 10
-        elif distance_to_target <= 5:
-            return 5
-        elif distance_to_target <= 10:
-            return 3
-        else:
-            return 1
+        for max_distance, points in SCORE_BANDS:
+            if distance_to_target <= max_distance:
+                return points
+        return 1
 
     def generate_metadata(self):
+        # Rolling summary and the rounds played since the last call, not the whole history
         duration = time.time() - self.start_time
         return {
             'score': self.score,
             'round': self.round,
             'game_duration': duration,
-            'history': self.history
+            'summary': self.history.summary(),
+            'changes': self.history.changes()
         }
 
     def play_round(self):
-        action = self.receive_action()
-        if action:
+        action_message = self.receive_action()
+        if action_message:
+            action, trace = detach(action_message)
             result = self.apply_action(action)
+            stamp(trace, 'D')
             if result is not None:
                 print(f"Shot executed with distance {result} and force {self.player_force}")
             metadata = self.generate_metadata()
             print(f"Metadata: {metadata}")
+            self.publish_metadata(trace)
+
+    def handle_action_message(self, action_message):
+        # AsyncStageRuntime handler: apply the action and pass the new state on to the optical stage
+        action, trace = detach(action_message)
+        result = self.apply_action(action)
+        stamp(trace, 'D')
+        if result is not None:
+            print(f"Shot executed with distance {result} and force {self.player_force}")
+        self.publish_metadata(trace)
+
+    def stimulation_metadata(self):
+        # The state the optical stage encodes, as a dict so in-process callers skip the string round trip
+        if len(self.history):
+            last_action = self.history.last()
+            distance_to_target = last_action['distance_to_target']
+            player_force = last_action['force']
+        else:
+            distance_to_target = self.target_distance  # Default to initial target distance
+            player_force = 0  # Default to no force if no history available
+        return {
+            'score': self.score,
+            'round': self.round,
+            'duration': time.time() - self.start_time,
+            'distance_to_target': distance_to_target,
+            'player_force': player_force,
+        }
+
+    def publish_metadata(self, trace=None):
+        # Serialize and publish the metadata using a custom string format
+        # Example format: "score:10,round:2,duration:120,distance_to_target:5,player_force:15"
+        metadata_string = ','.join(f"{key}:{value}" for key, value in self.stimulation_metadata().items())
+        self.pub_socket.send_string(attach(metadata_string, trace))
+
+def main():
+    runtime = AsyncStageRuntime()
+    game = ShuffleboardGame(target_distance=50, runtime=runtime, history_log=HISTORY_LOG)
+    try:
+        runtime.start()
+    finally:
+        game.history.flush()  # Rounds since the last full batch
 
-# Inside the ShuffleboardGame class
-def publish_metadata(self):
-    # Setup a publisher socket if not already done
-    publisher = self.context.socket(zmq.PUB)
-    publisher.connect("tcp://localhost:5556")  # Connect to the game_to_optical.py subscriber
-    
-    # Serialize and publish the metadata using a custom string format
-    # Example format: "score:10,round:2,duration:120,distance_to_target:5,player_force:15"
-    if self.history:
-        last_action = self.history[-1]
-        distance_to_target = last_action['distance_to_target']
-        player_force = last_action['player_force']
-    else:
-        distance_to_target = self.target_distance  # Default to initial target distance
-        player_force = 0  # Default to no force if no history available
-
-    metadata_string = f"score:{self.score},round:{self.round},duration:{time.time() - self.start_time},distance_to_target:{distance_to_target},player_force:{player_force}"
-    publisher.send_string(metadata_string)
+if __name__ == "__main__":
+    main()
 
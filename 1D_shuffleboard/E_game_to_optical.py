@@ -1,50 +1,69 @@
-import numpy as np
 import zmq
 import time
+from async_runtime import AsyncStageRuntime
+from frame_transport import FrameSender
+from stimulation_patterns import PatternGenerator, ramp_tables
+from tick_scheduler import METRICS_PORTS, SCHEDULERS, TickScheduler
+from tracing import TraceReporter, detach, serve_metrics, stamp
 
 class GameStimulationEncoder:
     """
     Encodes game metadata and actions into stimulation patterns for optogenetic human cortical organoids,
     operating at a 10Hz rate.
     """
-    def __init__(self):
-        self.context = zmq.Context()
-        # Setup for subscribing to game metadata
-        self.subscriber = self.context.socket(zmq.SUB)
-        self.subscriber.connect("tcp://*:5556")
-        self.subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
-        
-        # Setup for publishing stimulation patterns
-        self.publisher = self.context.socket(zmq.PUB)
-        self.publisher.bind("tcp://*:5557")
+    def __init__(self, runtime=None, rate=10, frame_mode='raw'):
+        self.rate = rate
+        self.latest_pattern = None
+        self.last_publish_time = 0.0
+        self.reporter = TraceReporter()  # Completed traces go to the latency collector
+        # Column ramp over the first distance_to_target columns, row ramp over the first player_force rows
+        tables = ramp_tables()
+        self.patterns = PatternGenerator(column_tables=tables, row_tables=tables)
+        if runtime is None:
+            self.context = zmq.Context()
+            # Setup for subscribing to game metadata
+            self.subscriber = self.context.socket(zmq.SUB)
+            self.subscriber.connect("tcp://localhost:5556")
+            self.subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
 
-    def listen_and_process(self):
-        # Set up timing for 10Hz operation
-        rate = 10  # Hz
-        period = 1.0 / rate  # seconds
-        next_time = time.time() + period
+            # Setup for publishing stimulation patterns
+            self.publisher = self.context.socket(zmq.PUB)
+            self.publisher.bind("tcp://*:5557")
+        else:
+            # New metadata is encoded on arrival; the timer keeps the output at `rate` when the game is idle
+            self.subscriber = runtime.subscribe("tcp://localhost:5556", self.handle_metadata_message)
+            self.publisher = runtime.publisher("tcp://*:5557")
+            runtime.every(rate, self.refresh_stimulation, name='E')
+        # Self-contained frames: with 'delta' one frame F drops freezes the display until the next keyframe, up to 10 s at 10 Hz
+        self.frame_sender = FrameSender(self.publisher, mode=frame_mode)
 
+    def listen_and_process(self):
+        # Drain the pending metadata on every tick of a drift-free 10Hz schedule
+        scheduler = TickScheduler(self.rate, name='E')
         while True:
+            scheduler.wait()
             try:
-                while time.time() < next_time:
+                while True:
                     try:
-                        metadata_string = self.subscriber.recv_string(zmq.NOBLOCK)
-                        metadata = self.parse_metadata_string(metadata_string)
-                        if metadata:
-                            pattern = self.create_stimulation_pattern(metadata)
-                            self.publish_stimulation_pattern(pattern)
-                        time.sleep(0.01)  # Short sleep to prevent busy loop
+                        self.handle_metadata_message(self.subscriber.recv_string(zmq.NOBLOCK))
                     except zmq.Again:
-                        # No data received, short sleep to prevent busy loop
-                        time.sleep(0.01)
-                        continue
-
-                # Adjust next_time for the next iteration
-                next_time += period
+                        break
             except Exception as e:
                 print(f"An error occurred: {e}")
-                # Adjust next_time in case of error to maintain the rate
-                next_time += period
+
+    def handle_metadata_message(self, message):
+        metadata_string, trace = detach(message)
+        metadata = self.parse_metadata_string(metadata_string)
+        if metadata:
+            self.latest_pattern = self.create_stimulation_pattern(metadata)
+            stamp(trace, 'E')
+            self.publish_stimulation_pattern(self.latest_pattern)
+            self.reporter.report(stamp(trace, 'publish'))
+
+    def refresh_stimulation(self):
+        # Re-send the current pattern if nothing new went out during the last period
+        if self.latest_pattern is not None and time.perf_counter() - self.last_publish_time >= 1.0 / self.rate:
+            self.publish_stimulation_pattern(self.latest_pattern)
 
     def parse_metadata_string(self, metadata_string):
         metadata = {}
@@ -57,26 +76,19 @@ class GameStimulationEncoder:
         """
         Generates a structured stimulation pattern based on the game's current state.
         """
-        pattern_size = 256
-        stimulation_pattern = np.zeros((pattern_size, pattern_size), dtype=np.uint8)
-
-        # Example pattern generation logic
-        # Varies based on distance to target and player force
-        distance_to_target = int(metadata['distance_to_target']) % pattern_size
-        player_force = int(metadata['player_force']) % pattern_size
-        stimulation_pattern[:, :distance_to_target] = np.linspace(0, 255, distance_to_target).astype(np.uint8).reshape(-1, 1)
-        stimulation_pattern[:player_force, :] += np.linspace(0, 255, player_force).astype(np.uint8)
-
-        np.clip(stimulation_pattern, 0, 255, out=stimulation_pattern)  # Ensure values are within byte range
-        return stimulation_pattern
+        # Varies based on distance to target and player force; overlapping ramps saturate at 255
+        # Returns a cached read-only frame, repeated game states reuse it
+        return self.patterns.pattern(int(metadata['distance_to_target']), int(metadata['player_force']))
 
     def publish_stimulation_pattern(self, pattern):
         """
-        Publishes the stimulation pattern as a serialized string.
+        Publishes the stimulation pattern as a binary frame (see frame_transport), received by the F stage.
         """
-        encoded_pattern = np.array2string(pattern.flatten(), separator=',')[1:-1]  # Flatten and trim array brackets
-        self.publisher.send_string(encoded_pattern)
+        self.frame_sender.send(pattern)
+        self.last_publish_time = time.perf_counter()
 
 if __name__ == "__main__":
-    encoder = GameStimulationEncoder()
-    encoder.listen_and_process()
+    runtime = AsyncStageRuntime()
+    encoder = GameStimulationEncoder(runtime)
+    serve_metrics(SCHEDULERS, METRICS_PORTS['E'])  # Tick counts, deadline misses and jitter
+    runtime.start()
@@ -0,0 +1,95 @@
+import asyncio
+import inspect
+
+import zmq
+import zmq.asyncio
+
+from tick_scheduler import TickScheduler
+
+
+class AsyncStageRuntime:
+    """
+    asyncio event loop shared by the C, D and E stages.
+
+    Subscribed sockets are registered with one zmq.asyncio.Poller and their handlers run as soon as a
+    message is readable, so a hop costs the handler's computation instead of a sleep interval.
+    Fixed-rate callbacks run from TickSchedulers on absolute deadlines, so their rate does not drift
+    with the callback duration and missed deadlines are counted. Handlers and callbacks may be plain
+    functions or coroutines.
+    """
+    def __init__(self, context=None):
+        self.context = context or zmq.asyncio.Context.instance()
+        self.poller = zmq.asyncio.Poller()
+        self.handlers = {}  # Socket -> handler(message string)
+        self.timers = []  # (TickScheduler, callback)
+
+    def subscribe(self, address, handler, bind=False, topic=''):
+        socket = self.context.socket(zmq.SUB)
+        if bind:
+            socket.bind(address)
+        else:
+            socket.connect(address)
+        socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        self.poller.register(socket, zmq.POLLIN)
+        self.handlers[socket] = handler
+        return socket
+
+    def publisher(self, address, bind=True):
+        socket = self.context.socket(zmq.PUB)
+        if bind:
+            socket.bind(address)
+        else:
+            socket.connect(address)
+        return socket
+
+    def every(self, rate, callback, name='timer', policy='drop'):
+        scheduler = TickScheduler(rate, name=name, policy=policy)
+        self.timers.append((scheduler, callback))
+        return scheduler
+
+    async def call(self, function, *args):
+        result = function(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def receive_loop(self):
+        while True:
+            events = await self.poller.poll()
+            for socket, _ in events:
+                # Drain everything that is queued so a burst is handled in one wake-up
+                while True:
+                    try:
+                        message = await socket.recv_string(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    try:
+                        await self.call(self.handlers[socket], message)
+                    except Exception as e:
+                        print(f"An error occurred: {e}")
+
+    async def timer_loop(self, scheduler, callback):
+        while True:
+            await scheduler.wait_async()
+            try:
+                await self.call(callback)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+    async def run(self):
+        tasks = [asyncio.ensure_future(self.receive_loop())]
+        tasks += [asyncio.ensure_future(self.timer_loop(scheduler, callback)) for scheduler, callback in self.timers]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def start(self):
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for socket in self.handlers:
+                socket.close(linger=0)
@@ -0,0 +1,195 @@
+import itertools
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from C_features_to_game import CONTROL_FEATURE, CONTROL_RULES, control_features, fired_rule
+from D_shuffleboard import FORCE_STEPS, INITIAL_FORCE, SCORE_BANDS
+
+ACTIONS = ('execute_shot',) + tuple(FORCE_STEPS)  # Action codes are indices into this tuple, -1 is no action or one that keeps the force
+
+
+def parameter_grid(**axes):
+    """
+    Every combination of the given parameter values as flat arrays of equal length, one entry per setting.
+    e.g. parameter_grid(target_distance=[30, 50], shot_threshold=[0.6, 0.7]) describes 4 settings.
+    """
+    names = list(axes)
+    combinations = list(itertools.product(*(np.atleast_1d(axes[name]) for name in names)))
+    return {name: np.array([combination[i] for combination in combinations]) for i, name in enumerate(names)}
+
+def default_settings(feature_to_action_map=CONTROL_RULES):
+    # The live C- and D-stage parameters; grid axes with the same names replace them
+    settings = {
+        'target_distance': 50,
+        'initial_force': INITIAL_FORCE,
+        'adjust_increment': FORCE_STEPS['adjust_force'],
+        'fine_tune_increment': FORCE_STEPS['fine_tune_force'],
+        'retry_decrement': -FORCE_STEPS['retry_shot'],
+    }
+    for feature, entry in feature_to_action_map.items():
+        settings[f'{feature}_threshold'] = entry[1]
+    return settings
+
+def synthetic_feature_stream(games, ticks, correlation=0.95, seed=None):
+    """
+    Features of `games` independent sessions of `ticks` C-stage messages, each (games, ticks).
+    Signal amplitude follows an AR(1) process around 0.5, with variance, standard deviation and peak counts derived from it.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((games, ticks)) * np.sqrt(1 - correlation ** 2)
+    amplitude = np.abs(0.5 + 0.2 * lfilter([1.0], [1.0, -correlation], noise, axis=-1))
+    return {
+        'rms': amplitude,
+        'std_dev': amplitude * rng.uniform(0.9, 1.0, size=amplitude.shape),  # Most of the power is not DC
+        'variance': amplitude ** 2,
+        'peak_counts': rng.poisson(1.0 + 4.0 * amplitude),
+    }
+
+def load_feature_stream(path):
+    # A recorded stream saved with np.savez(path, rms=..., variance=...), each (games, ticks) or (ticks,)
+    with np.load(path) as recording:
+        return {name: np.atleast_2d(recording[name]) for name in recording.files}
+
+
+class BatchSimulator:
+    """
+    Plays the C-stage policy and the D-stage game on many feature streams and parameter settings at once.
+
+    The action of every tick comes from C_features_to_game.fired_rule, the policy the live C stage
+    runs: by default the control rules applied to the control feature (the mean RMS B sends), so the
+    stream only needs that feature. With control_feature=None the rules are a feature-to-action map
+    and each reads its own feature; only the rules of the features in the stream can fire. Either
+    way the policy only reads features, never the game state, so the whole game has a closed form:
+    the force is the initial force plus the cumulative sum of the force steps, a shot travels the
+    current force (the simplified physics of ShuffleboardGame.execute_shot) and the score is the sum
+    of the points of the shots. Nothing loops over ticks or games in Python; they are axes of the
+    same (settings, games, ticks) arrays, and settings are processed in chunks that keep those
+    arrays under max_elements.
+    """
+    def __init__(self, feature_to_action_map=CONTROL_RULES, control_feature=CONTROL_FEATURE, max_elements=2 ** 22):
+        self.feature_to_action_map = feature_to_action_map
+        self.control_feature = control_feature
+        self.max_elements = max_elements
+
+    def settings(self, grid=None):
+        settings = default_settings(self.feature_to_action_map)
+        settings.update(grid or {})
+        size = max(np.size(value) for value in settings.values())
+        for name, value in settings.items():
+            value = np.asarray(value, dtype=np.float64)
+            if value.size not in (1, size):
+                raise ValueError(f"Unexpected data shape: {name} has {value.size} values, expected 1 or {size}.")
+            settings[name] = np.broadcast_to(value.ravel(), (size,))
+        return settings
+
+    def actions(self, features, settings):
+        # Action code of every tick, (settings, games, ticks)
+        if self.control_feature is not None:
+            if self.control_feature not in features:
+                raise ValueError(f"No '{self.control_feature}' in the stream, the control rules read it.")
+            features = control_features(features[self.control_feature], self.feature_to_action_map)
+        names = [feature for feature in self.feature_to_action_map if feature in features]
+        if not names:
+            raise ValueError(f"No feature of the map in the stream: expected some of {list(self.feature_to_action_map)}.")
+        values = {name: np.atleast_2d(features[name])[np.newaxis] for name in names}
+        thresholds = {name: settings[f'{name}_threshold'][:, np.newaxis, np.newaxis] for name in names}
+        rules = fired_rule(values, self.feature_to_action_map, thresholds)
+        # Map rule index to action code, the extra last entry turns -1 (no rule fired) into no action
+        codes = np.array([ACTIONS.index(action) if action in ACTIONS else -1 for action, _ in self.feature_to_action_map.values()]
+                         + [-1])
+        return codes[rules]
+
+    def run(self, features, grid=None):
+        """
+        Simulates every stream in `features` (name -> (games, ticks)) under every setting of `grid`.
+        Returns per-setting, per-game arrays (settings, games): score, shots, final force and mean distance to target.
+        """
+        settings = self.settings(grid)
+        size = len(settings['target_distance'])
+        stream_size = max(np.size(values) for values in features.values())
+        chunk = max(self.max_elements // stream_size, 1)
+        chunks = [self.simulate(features, {name: values[i:i + chunk] for name, values in settings.items()})
+                  for i in range(0, size, chunk)]
+        results = {name: np.concatenate([result[name] for result in chunks]) for name in chunks[0]}
+        results['settings'] = settings
+        return results
+
+    def play(self, features, settings):
+        """
+        Game state after every tick, each (settings, games, ticks): action code, force, whether a shot was taken,
+        the points it scored and its distance to target (the force's distance where no shot was taken) and the score.
+        """
+        codes = self.actions(features, settings)
+
+        steps = np.stack([np.zeros_like(settings['adjust_increment']), settings['adjust_increment'],
+                          settings['fine_tune_increment'], -settings['retry_decrement']])  # (actions, settings), same order as ACTIONS
+        force_change = np.where(codes >= 0, np.take_along_axis(steps.T[:, np.newaxis, :], np.maximum(codes, 0), axis=-1), 0.0)
+        force = settings['initial_force'][:, np.newaxis, np.newaxis] + np.cumsum(force_change, axis=-1)
+
+        shots = codes == ACTIONS.index('execute_shot')
+        distance_to_target = np.abs(settings['target_distance'][:, np.newaxis, np.newaxis] - force)
+        points = np.ones_like(distance_to_target)
+        for max_distance, band_points in reversed(SCORE_BANDS):
+            points[distance_to_target <= max_distance] = band_points
+        points = np.where(shots, points, 0).astype(np.int64)
+
+        return {
+            'action': codes,
+            'force': force,
+            'shot': shots,
+            'points': points,
+            'distance_to_target': distance_to_target,
+            'score': np.cumsum(points, axis=-1),
+        }
+
+    def simulate(self, features, settings):
+        # One chunk of settings, reduced over the ticks to (settings, games)
+        ticks = self.play(features, settings)
+        shot_count = np.count_nonzero(ticks['shot'], axis=-1)
+        return {
+            'score': ticks['score'][..., -1],
+            'shots': shot_count,
+            'final_force': ticks['force'][..., -1],
+            'mean_distance_to_target': np.divide(np.sum(ticks['distance_to_target'], axis=-1, where=ticks['shot']), shot_count,
+                                                 out=np.full(shot_count.shape, np.nan), where=shot_count > 0),
+        }
+
+
+def score_distribution(results, percentiles=(5, 25, 50, 75, 95)):
+    # Score statistics over the games of every setting
+    scores = results['score']
+    distribution = {
+        'mean': scores.mean(axis=1),
+        'std': scores.std(axis=1),
+        'mean_shots': results['shots'].mean(axis=1),
+    }
+    for q, values in zip(percentiles, np.percentile(scores, percentiles, axis=1)):
+        distribution[f'p{q}'] = values
+    return distribution
+
+def print_report(results, grid, top=10):
+    # Settings ranked by mean score, with the grid parameters that define them
+    distribution = score_distribution(results)
+    order = np.argsort(-distribution['mean'], kind='stable')[:top]
+    for i in order:
+        parameters = ', '.join(f"{name}={results['settings'][name][i]:g}" for name in grid)
+        statistics = ', '.join(f"{name}={values[i]:.1f}" for name, values in distribution.items())
+        print(f"{parameters}: {statistics}")
+
+def main():
+    games, ticks = 200, 3000  # 3000 ticks is five minutes of the C stage at 10 Hz
+    features = {CONTROL_FEATURE: synthetic_feature_stream(games, ticks, seed=0)[CONTROL_FEATURE]}  # The mean RMS B sends live
+    grid = parameter_grid(target_distance=[30, 50], adjust_increment=[1, 2, 5], retry_decrement=[1, 2, 5],
+                          shot_threshold=[0.6, 0.7, 0.8], raise_threshold=[0.5, 0.55, 0.6], hold_threshold=[0.3, 0.35, 0.4])
+
+    start = time.perf_counter()
+    results = BatchSimulator().run(features, grid)
+    elapsed = time.perf_counter() - start
+    settings = len(next(iter(grid.values())))
+    print(f"Simulated {settings} settings x {games} games x {ticks} ticks in {elapsed:.2f} s")
+    print_report(results, grid)
+
+if __name__ == "__main__":
+    main()
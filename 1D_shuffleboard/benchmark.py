@@ -0,0 +1,307 @@
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import zmq
+
+import A_incoming_signals as A
+import B_signals_to_features as B
+from C_features_to_game import FeaturesToGameAction
+from D_shuffleboard import ShuffleboardGame
+from E_game_to_optical import GameStimulationEncoder
+from frame_transport import FrameReceiver, FrameSender
+from fused_engine import FusedEngine, LocalRuntime
+from stimulation_patterns import PatternGenerator, ramp_tables
+
+PACKAGE = '1D_shuffleboard'
+WINDOW_SIZES = (50, 500, 5000)  # Samples per channel in the analysis window
+PACKET_SIZE = 10
+HFD_K_MAX = 5  # k_max of analyze_signals
+END_TO_END_TICKS = 200  # Twenty seconds of 10 Hz ticks
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+REGRESSION_THRESHOLD = 1.25  # A median this many times the baseline's is reported as a regression
+
+# The analyses of analyze_signals, each called on a (channels, samples) window; some still fail and are recorded as errors
+FEATURES = {
+    'peak_heights': B.detect_peak_heights,
+    'peak_counts': B.detect_peaks,
+    'variance_std_dev': B.calculate_variance_std_dev,
+    'rms': B.calculate_rms,
+    'band_features': B.freq_bands,
+    'spectral_entropy': lambda signals: B.calculate_spectral_entropy(signals, range(len(signals))),
+    'centroids': B.spectral_centroids,
+    'spectral_edge_densities': B.spectral_edge_density,
+    'phase_synchronization': B.phase_synchronization,
+    'higuchi_fractal_dimension': lambda signals: B.calculate_higuchi_fractal_dimension(signals, HFD_K_MAX),
+    'zero_crossing_rate': B.calculate_zero_crossing_rate,
+    'empirical_mode_decomposition': B.perform_empirical_mode_decomposition,
+    'time_warping_factor': B.time_warping_factor,
+    'evolution_rate': B.evolution_rate,
+}
+
+
+def measure(function, min_time=0.2, min_iterations=3, max_iterations=1000, per_call=1):
+    # Times repeated calls of function(); per_call divides the times when one call covers several operations
+    times = []
+    total = 0.0
+    while len(times) < min_iterations or (total < min_time and len(times) < max_iterations):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed / per_call)
+        total += elapsed
+    times = np.array(times)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(times.min()),
+        'p95_s': float(np.percentile(times, 95)),
+        'iterations': len(times) * per_call,
+    }
+
+def distribution(times):
+    # Same fields as measure() for latencies collected by the caller
+    times = np.asarray(times)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(times.min()),
+        'p95_s': float(np.percentile(times, 95)),
+        'p99_s': float(np.percentile(times, 99)),
+        'max_s': float(times.max()),
+        'iterations': len(times),
+    }
+
+
+class BenchmarkResults:
+    """
+    Benchmark records of one run, keyed by group, name and parameters, written as one JSON file per run.
+    """
+    def __init__(self):
+        self.records = []
+
+    def add(self, group, name, params=None, function=None, stats=None, **extra):
+        record = {'group': group, 'name': name, 'params': params or {}}
+        try:
+            record.update(stats if stats is not None else measure(function))
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+        record.update(extra)
+        self.records.append(record)
+        if 'error' in record:
+            print(f"{group}/{name} {record['params']}: error {record['error']}")
+        else:
+            print(f"{group}/{name} {record['params']}: median {record['median_s'] * 1e6:.1f} us")
+        return record
+
+    def metadata(self):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except OSError:
+            commit = None
+        return {
+            'package': PACKAGE,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit or None,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        }
+
+    def write(self, path=None):
+        if path is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{PACKAGE}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w') as results_file:
+            json.dump({'metadata': self.metadata(), 'results': self.records}, results_file, indent=1)
+        return path
+
+def record_key(record):
+    return (record['group'], record['name'], json.dumps(record['params'], sort_keys=True))
+
+def compare(baseline_path, records, threshold=REGRESSION_THRESHOLD):
+    # Prints and returns the benchmarks whose median grew by more than `threshold` times since the baseline run
+    with open(baseline_path) as baseline_file:
+        baseline = {record_key(record): record for record in json.load(baseline_file)['results']}
+    regressions = []
+    for record in records:
+        previous = baseline.get(record_key(record))
+        if previous is None or 'median_s' not in previous or 'median_s' not in record:
+            continue
+        ratio = record['median_s'] / previous['median_s']
+        if ratio > threshold:
+            regressions.append((record_key(record), ratio))
+            print(f"Regression: {record['group']}/{record['name']} {record['params']} is {ratio:.2f}x slower")
+    print(f"{len(regressions)} regressions against {baseline_path}")
+    return regressions
+
+
+def pair_sockets(name):
+    # Connected in-process PAIR sockets without high-water marks, so a benchmark can queue many messages
+    context = zmq.Context.instance()
+    sender, receiver = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    for socket in (sender, receiver):
+        socket.setsockopt(zmq.SNDHWM, 0)
+        socket.setsockopt(zmq.RCVHWM, 0)
+    receiver.bind(f"inproc://{name}")
+    sender.connect(f"inproc://{name}")
+    return sender, receiver
+
+def synthetic_signals(window, seed=0):
+    # (channels, window) block of the A-stage oscillations, the layout analyze_signals works on
+    source = A.oscillation_source(packet_size=window, seed=seed)
+    return np.ascontiguousarray(next(source).T)
+
+def benchmark_decode(results, batch=500):
+    sender, receiver = pair_sockets('benchmark-decode')
+    message = A.encode_packet(next(A.oscillation_source(packet_size=PACKET_SIZE)))
+
+    def receive_batch():
+        for _ in range(batch):
+            sender.send(message)
+        for _ in range(batch):
+            B.receive_neural_data(receiver)
+    stats = measure(receive_batch, per_call=batch)
+    results.add('decode', 'receive_neural_data', {'packet_size': PACKET_SIZE}, stats=stats,
+                messages_per_s=1.0 / stats['median_s'], message_bytes=len(message))
+    sender.close()
+    receiver.close()
+
+def benchmark_buffering(results):
+    packet = B.scale_data(np.ascontiguousarray(synthetic_signals(PACKET_SIZE).T))
+    for window in WINDOW_SIZES:
+        buffer = np.zeros((window, B.NUM_CHANNELS), dtype=np.float32)
+        results.add('buffer', 'buffer_data', {'window': window}, lambda buffer=buffer: B.buffer_data(packet, buffer))
+    results.add('buffer', 'scale_data', {'packet_size': PACKET_SIZE}, lambda: B.scale_data(packet))
+
+def benchmark_features(results):
+    # Welch segments longer than the short windows and empty bands warn on every call
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for window in WINDOW_SIZES:
+            signals = synthetic_signals(window)
+            for name, feature in FEATURES.items():
+                results.add('features', name, {'window': window}, lambda feature=feature: feature(signals))
+            buffer = np.ascontiguousarray(signals.T)
+            results.add('features', 'extract_features', {'window': window}, lambda: B.extract_features(buffer))
+
+def benchmark_serialization(results):
+    game = ShuffleboardGame(50, LocalRuntime())
+    encoder = GameStimulationEncoder(LocalRuntime())
+    metadata = game.stimulation_metadata()
+    text = ','.join(f"{key}:{value}" for key, value in metadata.items())  # The format of publish_metadata
+    results.add('serialization', 'metadata_format', {}, lambda: ','.join(f"{key}:{value}" for key, value in metadata.items()),
+                message_bytes=len(text))
+    results.add('serialization', 'metadata_parse', {}, lambda: encoder.parse_metadata_string(text), message_bytes=len(text))
+
+    patterns = PatternGenerator(ramp_tables(), ramp_tables())  # The tables of E_game_to_optical
+    frames = [patterns.compose(d, f).copy() for d, f in zip(range(0, 256, 5), range(255, 0, -5))]
+    for mode in ('raw', 'delta', 'rle'):
+        sender, receiver = pair_sockets(f'benchmark-frames-{mode}')
+        frame_sender = FrameSender(sender, mode=mode)
+        frame_receiver = FrameReceiver()
+        sent = {'index': 0}
+
+        def send_frame():
+            frame_sender.send(frames[sent['index'] % len(frames)])
+            sent['index'] += 1
+        stats = measure(send_frame)
+        size = 0
+        while receiver.poll(timeout=0):
+            parts = receiver.recv_multipart(copy=False)
+            size = sum(len(part.buffer) for part in parts)
+            frame_receiver.decode(parts)
+        results.add('serialization', 'frame_send', {'mode': mode}, stats=stats, last_message_bytes=size)
+        sender.close()
+        receiver.close()
+
+def benchmark_policy(results):
+    features_to_action = FeaturesToGameAction(LocalRuntime())
+    game = ShuffleboardGame(50, LocalRuntime())
+    values = [0.3, 0.7]
+    step = {'index': 0}
+
+    def translate():
+        step['index'] += 1
+        return features_to_action.translate_features_to_action(values[step['index'] % 2])
+    results.add('policy', 'translate_features_to_action', {}, translate)
+    results.add('policy', 'action_from_message', {}, lambda: features_to_action.action_from_message('0.73'))
+    results.add('policy', 'apply_action', {'action': 'fine_tune_force'}, lambda: game.apply_action('fine_tune_force'))
+    results.add('policy', 'apply_action', {'action': 'execute_shot'}, lambda: game.apply_action('execute_shot'))
+    results.add('policy', 'stimulation_metadata', {}, game.stimulation_metadata)
+
+def benchmark_patterns(results):
+    encoder = GameStimulationEncoder(LocalRuntime())
+    uncached = PatternGenerator(ramp_tables(), ramp_tables(), cache_size=0)
+    states = [{'distance_to_target': d % 256, 'player_force': (3 * d) % 256} for d in range(64)]
+    step = {'index': 0}
+
+    def next_state():
+        step['index'] += 1
+        return states[step['index'] % len(states)]
+    results.add('patterns', 'create_stimulation_pattern', {'cache': 'hit'}, lambda: encoder.create_stimulation_pattern(next_state()))
+
+    def compose():
+        state = next_state()
+        return uncached.pattern(state['distance_to_target'], state['player_force'])
+    results.add('patterns', 'create_stimulation_pattern', {'cache': 'miss'}, compose)
+
+def benchmark_end_to_end(results, ticks=END_TO_END_TICKS):
+    """
+    The fused B -> C -> D -> E loop on a synthetic source, one A-stage packet decoded per tick and every
+    pattern encoded for F. Ticks run back to back, so this is the compute time per tick without the
+    waits between ticks.
+    """
+    source = A.oscillation_source(packet_size=PACKET_SIZE, seed=1)
+    a_socket, b_socket = pair_sockets('benchmark-loop-samples')
+    e_socket, f_socket = pair_sockets('benchmark-loop-frames')
+    frame_sender = FrameSender(e_socket, mode='raw')  # As E sends on this hop
+    pending = {'packet': False}
+
+    def zmq_packet():
+        # The packet sent for this tick, then None so the engine moves on to the analysis
+        if not pending['packet']:
+            return None
+        pending['packet'] = False
+        return B.receive_neural_data(b_socket)
+
+    engine = FusedEngine(zmq_packet, sink=frame_sender.send)
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(ticks):
+            a_socket.send(A.encode_packet(next(source)))
+            pending['packet'] = True
+            start = time.perf_counter()
+            engine.step()
+            f_socket.recv_multipart(copy=False)
+            latencies.append(time.perf_counter() - start)
+    stats = distribution(latencies)
+    results.add('end_to_end', 'loop_tick', {'tick_rate': B.UPDATE_RATE, 'packet_size': PACKET_SIZE}, stats=stats,
+                sustained_tick_rate=1.0 / stats['p99_s'],  # 99 % of ticks fit in the period at this rate, the median says little
+                over_period=float(np.mean(np.asarray(latencies) > 1.0 / B.UPDATE_RATE)))  # Ticks that overran the live period
+    for socket in (a_socket, b_socket, e_socket, f_socket):
+        socket.close()
+
+def main():
+    # python benchmark.py [baseline.json]; results go to benchmark_results/ and are compared with the baseline if one is given
+    results = BenchmarkResults()
+    benchmark_decode(results)
+    benchmark_buffering(results)
+    benchmark_features(results)
+    benchmark_serialization(results)
+    benchmark_policy(results)
+    benchmark_patterns(results)
+    benchmark_end_to_end(results)
+    path = results.write()
+    print(f"Results written to {path}")
+    if len(sys.argv) > 1:
+        compare(sys.argv[1], results.records)
+
+if __name__ == "__main__":
+    main()
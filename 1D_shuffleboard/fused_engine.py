@@ -0,0 +1,95 @@
+import numpy as np
+import zmq
+
+from B_signals_to_features import BUFFER_SIZE, NUM_CHANNELS, UPDATE_RATE, buffer_data, extract_features, receive_neural_data
+from C_features_to_game import FeaturesToGameAction
+from D_shuffleboard import ShuffleboardGame
+from E_game_to_optical import GameStimulationEncoder
+from tick_scheduler import METRICS_PORTS, SCHEDULERS, TickScheduler
+from tracing import serve_metrics
+
+
+class LocalRuntime:
+    """
+    Runtime for stages that share one process: no sockets are opened, the engine calls the stage methods directly.
+    Stands in for AsyncStageRuntime in the stage constructors.
+    """
+    def subscribe(self, address, handler, bind=False, topic=''):
+        return None
+
+    def publisher(self, address, bind=True):
+        return None
+
+    def every(self, rate, callback, name='timer', policy='drop'):
+        pass
+
+
+class FusedEngine:
+    """
+    The B -> C -> D -> E loop in one process, as in stimulation_experiments/Compact_1DShuffleboard.ipynb.
+
+    Each tick drains the neural source into the buffer, extracts the features and hands them, the
+    action and the game state to the next stage as in-memory values, calling the same stage methods
+    the distributed mode calls from its message handlers. Ticks come from a TickScheduler, so the
+    pattern of tick k is produced at a reproducible offset from the start of the run
+    (scheduler.deadline(k)) and late ticks are counted.
+    """
+    def __init__(self, source, target_distance=50, tick_rate=UPDATE_RATE, sink=None, policy='drop'):
+        self.source = source  # Returns a (samples, channels) block or None when nothing is pending
+        self.sink = sink  # Receives every stimulation pattern, e.g. the optical output device
+        self.scheduler = TickScheduler(tick_rate, name='fused', policy=policy)
+
+        runtime = LocalRuntime()
+        self.features_to_action = FeaturesToGameAction(runtime)
+        self.game = ShuffleboardGame(target_distance, runtime)
+        self.encoder = GameStimulationEncoder(runtime)
+        self.buffer = np.zeros((BUFFER_SIZE, NUM_CHANNELS), dtype=np.float32)
+        self.latest_pattern = None
+        self.tick_count = 0
+        self.last_deadline = None  # Scheduled time of the latest pattern, on the scheduler's clock
+
+    def step(self, tick=None):
+        # One pass through the loop; returns the stimulation pattern produced on this tick
+        while True:
+            neural_data = self.source()
+            if neural_data is None or neural_data.size == 0:
+                break
+            self.buffer = buffer_data(neural_data, self.buffer)
+
+        feature = extract_features(self.buffer)
+        action = self.features_to_action.translate_features_to_action(feature)
+        result = self.game.apply_action(action)
+        if result is not None:
+            print(f"Shot executed with distance {result} and force {self.game.player_force}")
+        self.latest_pattern = self.encoder.create_stimulation_pattern(self.game.stimulation_metadata())
+        if tick is not None:
+            self.last_deadline = self.scheduler.deadline(tick)
+        if self.sink is not None:
+            self.sink(self.latest_pattern)
+        self.tick_count += 1
+        return self.latest_pattern
+
+    def run(self, ticks=None):
+        self.scheduler.run(self.step, ticks)
+
+
+def zmq_source(address="tcp://localhost:5444"):
+    # Non-blocking reader of the A-stage stream, in the format the distributed B stage receives
+    context = zmq.Context.instance()
+    sub_socket = context.socket(zmq.SUB)
+    sub_socket.connect(address)
+    sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
+
+    def source():
+        if not sub_socket.poll(timeout=0):
+            return None
+        return receive_neural_data(sub_socket)
+    return source
+
+def main():
+    engine = FusedEngine(zmq_source())
+    serve_metrics(SCHEDULERS, METRICS_PORTS['fused'])  # Tick counts, deadline misses and jitter
+    engine.run()
+
+if __name__ == "__main__":
+    main()
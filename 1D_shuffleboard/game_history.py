@@ -0,0 +1,126 @@
+import numpy as np
+
+ACTION_CODES = {'adjust_force': 1, 'fine_tune_force': 2, 'execute_shot': 3, 'retry_shot': 4}  # 0 is any other action
+ACTION_NAMES = {code: action for action, code in ACTION_CODES.items()}
+
+# One record per round in the on-disk log, read back with read_history_log()
+HISTORY_DTYPE = np.dtype([
+    ('round', '<i8'),
+    ('action', 'u1'),
+    ('distance', '<f8'),
+    ('distance_to_target', '<f8'),
+    ('force', '<f8'),
+    ('score', '<i4'),
+    ('timestamp', '<f8'),
+])
+
+
+def read_history_log(path):
+    # Every record flushed to the log as a structured array; columns are log['round'], log['score'], ...
+    return np.fromfile(path, dtype=HISTORY_DTYPE)
+
+
+class GameHistory:
+    """
+    Columnar per-round history with a fixed memory footprint.
+
+    Each field is a preallocated array used as a ring of `capacity` rows, so recording a round writes
+    one element per column. Rows are appended to the log at log_path in batches of batch_size
+    (capacity is at least that large, so a row is never overwritten before it is flushed); without a
+    log, rows older than the ring are dropped. Totals and the sums over the last `window` rounds are
+    kept up to date as rows are recorded, so the summary costs the same in round 10 and round 10^6.
+    """
+    def __init__(self, capacity=1024, window=20, batch_size=256, log_path=None):
+        if window > capacity or batch_size > capacity:
+            raise ValueError(f"Window ({window}) and batch size ({batch_size}) must fit in the capacity ({capacity}).")
+        self.capacity = capacity
+        self.window = window
+        self.batch_size = batch_size
+        self.log_path = log_path
+        self.columns = {name: np.zeros(capacity, dtype=HISTORY_DTYPE[name]) for name in HISTORY_DTYPE.names}
+
+        self.count = 0  # Rounds recorded since the start
+        self.flushed = 0  # Rounds written to the log
+        self.reported = 0  # Rounds already returned by changes()
+        self.total_score = 0
+        self.window_distance_to_target = 0.0
+        self.window_score = 0
+        self.window_hits = 0  # Rounds in the window that scored the maximum of 10
+
+    def __len__(self):
+        return self.count
+
+    def record(self, round_number, action, distance, distance_to_target, force, score, timestamp):
+        i = self.count % self.capacity
+        if self.count >= self.window:
+            # Remove the round that leaves the rolling window
+            old = (self.count - self.window) % self.capacity
+            old_score = int(self.columns['score'][old])
+            self.window_distance_to_target -= float(self.columns['distance_to_target'][old])
+            self.window_score -= old_score
+            self.window_hits -= old_score == 10
+
+        columns = self.columns
+        columns['round'][i] = round_number
+        columns['action'][i] = ACTION_CODES.get(action, 0)
+        columns['distance'][i] = distance
+        columns['distance_to_target'][i] = distance_to_target
+        columns['force'][i] = force
+        columns['score'][i] = score
+        columns['timestamp'][i] = timestamp
+        self.count += 1
+
+        self.total_score += score
+        self.window_distance_to_target += distance_to_target
+        self.window_score += score
+        self.window_hits += score == 10
+
+        if self.count - self.flushed >= self.batch_size:
+            self.flush()
+
+    def row(self, index):
+        # Round `index` (0-based, negative counts from the latest) as a dict; only the last `capacity` rounds are held
+        if index < 0:
+            index += self.count
+        if index < max(self.count - self.capacity, 0) or index >= self.count:
+            raise IndexError(f"Round index {index} is not held in memory")
+        i = index % self.capacity
+        row = {name: column[i].item() for name, column in self.columns.items()}
+        row['action'] = ACTION_NAMES.get(row['action'], 'unknown')
+        return row
+
+    def last(self):
+        return self.row(-1) if self.count else None
+
+    def summary(self):
+        # Totals since the start and averages over the last `window` rounds
+        in_window = min(self.count, self.window)
+        return {
+            'rounds': self.count,
+            'total_score': self.total_score,
+            'window': in_window,
+            'mean_distance_to_target': self.window_distance_to_target / in_window if in_window else None,
+            'mean_score': self.window_score / in_window if in_window else None,
+            'hit_rate': self.window_hits / in_window if in_window else None,
+        }
+
+    def changes(self):
+        # Rounds recorded since the previous call, at most the rounds still held in memory
+        start = max(self.reported, self.count - self.capacity)
+        self.reported = self.count
+        return [self.row(index) for index in range(start, self.count)]
+
+    def records(self, start, stop):
+        # Rounds [start, stop) as a structured array in the log's record layout
+        indices = np.arange(start, stop) % self.capacity
+        records = np.empty(stop - start, dtype=HISTORY_DTYPE)
+        for name, column in self.columns.items():
+            records[name] = column[indices]
+        return records
+
+    def flush(self):
+        # Appends every round not yet in the log; without a log the rows just age out of the ring
+        if self.log_path is not None and self.count > self.flushed:
+            with open(self.log_path, 'ab') as log:
+                self.records(self.flushed, self.count).tofile(log)
+        self.flushed = self.count
@@ -0,0 +1,183 @@
+import struct
+import sys
+import time
+
+import zmq
+
+# Ports of the closed loop: A -> B (5444), B -> C (5445), C -> D (5446), D -> E (5556, the 2D E output) and E -> F (5557)
+SESSION_PORTS = (5444, 5445, 5446, 5556, 5557)
+
+# File: header, then one record per message. Record: header, then (length, bytes) for every part of the message
+FILE_HEADER = struct.Struct('<4sHq')  # Magic, version, wall-clock start of the recording in ns
+RECORD_HEADER = struct.Struct('<qHH')  # Time since the start in ns, port, number of parts
+PART_LENGTH = struct.Struct('<I')
+MAGIC = b'ZLOG'
+VERSION = 1
+
+
+class SessionRecorder:
+    """
+    Subscribes to the published ports of a live session and appends every message to a binary log.
+
+    Each message is stored with its arrival time on the monotonic clock (ns since the recording
+    started), the port it was published on and its raw parts, so single-part strings, the neural
+    sample blocks and the multipart optical frames are all replayed byte for byte. Writes go through
+    the file's buffer and are flushed every flush_interval seconds, so a crash loses at most that much.
+    """
+    def __init__(self, path, ports=SESSION_PORTS, host='localhost', flush_interval=1.0):
+        self.context = zmq.Context.instance()
+        self.poller = zmq.Poller()
+        self.ports = {}  # Socket -> port
+        for port in ports:
+            socket = self.context.socket(zmq.SUB)
+            socket.connect(f"tcp://{host}:{port}")
+            socket.setsockopt_string(zmq.SUBSCRIBE, '')
+            self.poller.register(socket, zmq.POLLIN)
+            self.ports[socket] = port
+        self.flush_interval = flush_interval
+        self.counts = {port: 0 for port in ports}
+
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time_ns()))
+        self.start_ns = time.perf_counter_ns()
+
+    def write(self, port, parts):
+        offset = time.perf_counter_ns() - self.start_ns
+        self.file.write(RECORD_HEADER.pack(offset, port, len(parts)))
+        for part in parts:
+            self.file.write(PART_LENGTH.pack(len(part)))
+            self.file.write(part)
+        self.counts[port] += 1
+
+    def run(self, duration=None):
+        # Records until interrupted or for `duration` seconds
+        end = time.perf_counter() + duration if duration is not None else None
+        next_flush = time.perf_counter() + self.flush_interval
+        try:
+            while end is None or time.perf_counter() < end:
+                for socket, _ in self.poller.poll(timeout=int(self.flush_interval * 1000)):
+                    # Drain the socket so a burst is written in arrival order
+                    while True:
+                        try:
+                            parts = socket.recv_multipart(zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        self.write(self.ports[socket], [part.buffer for part in parts])
+                if time.perf_counter() >= next_flush:
+                    self.file.flush()
+                    next_flush = time.perf_counter() + self.flush_interval
+                    print(f"Messages recorded per port: {self.counts}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+        for socket in self.ports:
+            socket.close(linger=0)
+
+
+def read_session(path, ports=None):
+    """
+    Yields (seconds since the start of the recording, port, list of message parts) for every recorded message,
+    optionally only those of `ports`. A record cut short by a crash of the recorder ends the log.
+    """
+    with open(path, 'rb') as log:
+        magic, version, _ = FILE_HEADER.unpack(log.read(FILE_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unexpected session log header: {magic!r}, version {version}")
+        while True:
+            header = log.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            offset, port, count = RECORD_HEADER.unpack(header)
+            parts = []
+            for _ in range(count):
+                length = log.read(PART_LENGTH.size)
+                if len(length) < PART_LENGTH.size:
+                    return
+                size = PART_LENGTH.unpack(length)[0]
+                part = log.read(size)
+                if len(part) < size:
+                    return
+                parts.append(part)
+            if ports is None or port in ports:
+                yield offset / 1e9, port, parts
+
+
+class SessionReplayer:
+    """
+    Publishes a recorded session again so that any stage can be driven from it.
+
+    Each replayed port is bound again (or the port given for it in port_map), in place of the stage
+    that published it live: 5444 drives B, 5445 drives C, 5446 drives D, 5556 drives E (F in 2D) and
+    5557 drives F. speed=1 keeps the recorded timing, speed=k runs k times faster and speed=None
+    sends every message as soon as the previous one is out. Message times are kept relative to the
+    start of the replay rather than to the previous message, so sleep overshoot does not accumulate.
+    """
+    def __init__(self, path, ports=SESSION_PORTS, speed=1.0, port_map=None, connect_delay=1.0, high_water_mark=100000):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"Replay speed must be positive or None for maximum speed, got {speed}")
+        self.path = path
+        self.speed = speed
+        self.connect_delay = connect_delay  # Time for subscribers to connect before the first message
+        self.context = zmq.Context.instance()
+        self.sockets = {}  # Recorded port -> PUB socket
+        port_map = port_map or {}
+        for port in ports:
+            socket = self.context.socket(zmq.PUB)
+            socket.setsockopt(zmq.SNDHWM, high_water_mark)  # A max-speed replay queues instead of dropping
+            socket.bind(f"tcp://*:{port_map.get(port, port)}")
+            self.sockets[port] = socket
+        self.counts = {port: 0 for port in ports}
+        self.max_lateness = 0.0
+
+    def run(self):
+        time.sleep(self.connect_delay)
+        start = time.perf_counter()
+        first = None
+        try:
+            for offset, port, parts in read_session(self.path, self.sockets):
+                if first is None:
+                    first = offset
+                if self.speed is not None:
+                    due = start + (offset - first) / self.speed
+                    remaining = due - time.perf_counter()
+                    if remaining > 0:
+                        time.sleep(remaining)
+                    self.max_lateness = max(self.max_lateness, time.perf_counter() - due)
+                self.sockets[port].send_multipart(parts, copy=False)
+                self.counts[port] += 1
+        except KeyboardInterrupt:
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {sum(self.counts.values())} messages in {elapsed:.2f} s, per port: {self.counts}, "
+              f"max lateness: {self.max_lateness * 1000:.2f} ms")
+        return self.counts
+
+    def close(self):
+        for socket in self.sockets.values():
+            socket.close(linger=1000)
+
+
+def main():
+    # python session_log.py record session.zlog
+    # python session_log.py replay session.zlog [speed, e.g. 1, 4 or max] [port ...]
+    if len(sys.argv) < 3 or sys.argv[1] not in ('record', 'replay'):
+        print("Usage: session_log.py record <log> | session_log.py replay <log> [speed|max] [port ...]")
+        return
+    if sys.argv[1] == 'record':
+        SessionRecorder(sys.argv[2]).run()
+        return
+    speed = sys.argv[3] if len(sys.argv) > 3 else '1'
+    ports = tuple(int(port) for port in sys.argv[4:]) or SESSION_PORTS
+    replayer = SessionReplayer(sys.argv[2], ports, speed=None if speed == 'max' else float(speed))
+    try:
+        replayer.run()
+    finally:
+        replayer.close()
+
+if __name__ == "__main__":
+    main()
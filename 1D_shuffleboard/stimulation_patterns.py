@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+import numpy as np
+
+PATTERN_SIZE = 256
+
+
+def ramp_tables(size=PATTERN_SIZE):
+    # Row n holds np.linspace(0, 255, n) as uint8 in its first n entries and zeros after
+    table = np.zeros((size, size), dtype=np.uint8)
+    for n in range(1, size):
+        table[n, :n] = np.linspace(0, 255, n).astype(np.uint8)
+    return table
+
+def constant_tables(value, size=PATTERN_SIZE):
+    # Row n holds `value` in its first n entries and zeros after
+    return np.where(np.arange(size) < np.arange(size)[:, np.newaxis], value, 0).astype(np.uint8)
+
+
+class PatternGenerator:
+    """
+    Stimulation frames for (distance, force) packets, composed from precomputed tables.
+
+    column_tables[distance] is the intensity profile across columns and row_tables[force] the
+    profile down the rows. A frame is their saturating sum, min(column + row, 255), so overlapping
+    regions clip at full intensity instead of wrapping around like a plain uint8 add. Frames are
+    composed into one reused buffer and kept in an LRU cache keyed by the packet, so a repeated
+    game state costs a dictionary lookup. Cached frames are read-only; with cache_size=0 the
+    returned frame is the reused buffer and is only valid until the next call.
+    """
+    def __init__(self, column_tables, row_tables, cache_size=128):
+        self.column_tables = column_tables
+        self.row_tables = row_tables
+        self.size = column_tables.shape[1]
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.buffer = np.empty((self.size, self.size), dtype=np.uint8)
+        self.headroom = np.empty((self.size, self.size), dtype=np.uint8)
+        self.hits = 0
+        self.misses = 0
+
+    def compose(self, distance, force):
+        column = self.column_tables[distance % self.size][np.newaxis, :]
+        row = self.row_tables[force % self.size][:, np.newaxis]
+        # Saturating add without leaving uint8: column + min(row, 255 - column)
+        np.subtract(255, column, out=self.headroom, casting='unsafe')
+        np.minimum(self.headroom, row, out=self.buffer)
+        np.add(self.buffer, column, out=self.buffer)
+        return self.buffer
+
+    def pattern(self, distance, force):
+        key = (distance % self.size, force % self.size)
+        if self.cache_size <= 0:
+            self.misses += 1
+            return self.compose(*key)
+
+        frame = self.cache.get(key)
+        if frame is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        frame = self.compose(*key).copy()
+        frame.flags.writeable = False  # Shared by every later request for this packet
+        self.cache[key] = frame
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return frame
@@ -0,0 +1,35 @@
+import numpy as np
+
+from batch_simulator import BatchSimulator, parameter_grid, synthetic_feature_stream
+from C_features_to_game import CONTROL_FEATURE, CONTROL_RULES, FeaturesToGameAction
+from D_shuffleboard import ShuffleboardGame
+from fused_engine import LocalRuntime
+
+
+def test_simulator_matches_shuffleboard_game_tick_by_tick():
+    games, ticks = 3, 400
+    features = {CONTROL_FEATURE: synthetic_feature_stream(games, ticks, seed=1)[CONTROL_FEATURE]}
+    grid = parameter_grid(target_distance=[30, 50], initial_force=[10, 40], shot_threshold=[0.6, 0.7], hold_threshold=[0.3, 0.4])
+    simulator = BatchSimulator()
+    settings = simulator.settings(grid)
+    played = simulator.play(features, settings)
+
+    for i in range(len(settings['target_distance'])):
+        for game_index in range(games):
+            features_to_action = FeaturesToGameAction(LocalRuntime())
+            features_to_action.control_rules = {rule: (action, settings[f'{rule}_threshold'][i])
+                                                for rule, (action, _) in CONTROL_RULES.items()}
+            game = ShuffleboardGame(settings['target_distance'][i], LocalRuntime())
+            game.player_force = settings['initial_force'][i]
+            for tick, value in enumerate(features[CONTROL_FEATURE][game_index]):
+                game.apply_action(features_to_action.translate_features_to_action(float(value)))
+                assert game.player_force == played['force'][i, game_index, tick]
+                assert game.score == played['score'][i, game_index, tick]
+            assert game.round - 1 == np.count_nonzero(played['shot'][i, game_index])
+
+def test_force_follows_the_control_value():
+    # Raising the force takes values above raise_threshold, so lowering that threshold raises the final force
+    features = {CONTROL_FEATURE: synthetic_feature_stream(50, 1000, seed=2)[CONTROL_FEATURE]}
+    results = BatchSimulator().run(features, parameter_grid(raise_threshold=[0.4, 0.6]))
+    assert np.mean(results['final_force'][0]) > np.mean(results['final_force'][1])
+    assert np.any(results['final_force'] != results['settings']['initial_force'][:, np.newaxis])
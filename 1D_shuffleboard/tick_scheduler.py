@@ -0,0 +1,128 @@
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+
+class SchedulerRegistry:
+    """
+    The tick schedulers of one process, so their counters can be reported or scraped together.
+    """
+    def __init__(self):
+        self.schedulers = {}
+
+    def register(self, scheduler):
+        self.schedulers[scheduler.name] = scheduler
+
+    def report(self):
+        return {name: scheduler.metrics() for name, scheduler in self.schedulers.items()}
+
+    def prometheus_text(self):
+        # Same exposition format as tracing.LatencyCollector, so tracing.serve_metrics can serve it
+        lines = []
+        for metric, kind, key in (('tick_total', 'counter', 'ticks'), ('tick_deadline_misses_total', 'counter', 'misses'),
+                                  ('tick_dropped_total', 'counter', 'dropped'), ('tick_jitter_seconds_p99', 'gauge', 'jitter_p99'),
+                                  ('tick_jitter_seconds_max', 'gauge', 'jitter_max')):
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, scheduler in self.schedulers.items():
+                lines.append(f'{metric}{{stage="{name}"}} {scheduler.metrics()[key]}')
+        return '\n'.join(lines) + '\n'
+
+SCHEDULERS = SchedulerRegistry()
+METRICS_PORTS = {'E': 9103, 'fused': 9104}  # Per-process scrape ports for tracing.serve_metrics(SCHEDULERS, port)
+
+
+class TickScheduler:
+    """
+    Fixed-rate ticks on a drift-free grid of absolute deadlines, start + k * period, on the monotonic clock.
+
+    Tick k is always due at deadline(k), however long earlier ticks took, so stimulation produced on
+    tick k has a reproducible time relative to the start of the run. When ticks fall behind, the
+    'drop' policy skips the deadlines that have already passed and the 'catch_up' policy runs up to
+    max_catch_up of them back to back before skipping the rest. Every tick records its jitter
+    (start - deadline); one that starts more than `tolerance` late counts as a deadline miss and a
+    skipped deadline counts as dropped.
+    """
+    def __init__(self, rate, name='stage', policy='drop', max_catch_up=2, tolerance=None, spin_time=0.001, history=1000,
+                 clock=time.perf_counter, registry=SCHEDULERS):
+        if policy not in ('drop', 'catch_up'):
+            raise ValueError(f"Unknown tick policy: {policy}. Expected 'drop' or 'catch_up'.")
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.name = name
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.tolerance = tolerance if tolerance is not None else self.period / 2
+        self.spin_time = spin_time  # Last part of a wait is spun instead of slept, for sub-millisecond jitter
+        self.clock = clock
+
+        self.start_time = None
+        self.next_index = 0
+        self.ticks = 0
+        self.misses = 0
+        self.dropped = 0
+        self.jitter = deque(maxlen=history)
+        if registry is not None:
+            registry.register(self)
+
+    def deadline(self, index):
+        return self.start_time + index * self.period
+
+    def schedule(self):
+        # Picks the next tick to run according to the policy and returns its deadline
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = now
+        passed = int((now - self.deadline(self.next_index)) // self.period)  # Later deadlines already passed
+        if passed > 0:
+            skipped = passed - (self.max_catch_up if self.policy == 'catch_up' else 0)
+            if skipped > 0:
+                self.dropped += skipped
+                self.next_index += skipped
+        return self.deadline(self.next_index)
+
+    def start_tick(self, deadline):
+        lateness = self.clock() - deadline
+        self.jitter.append(lateness)
+        if lateness > self.tolerance:
+            self.misses += 1
+        index = self.next_index
+        self.next_index += 1
+        self.ticks += 1
+        return index
+
+    def wait(self):
+        """
+        Blocks until the next tick is due and returns its index.
+        """
+        deadline = self.schedule()
+        remaining = deadline - self.clock()
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        while self.clock() < deadline:
+            pass
+        return self.start_tick(deadline)
+
+    async def wait_async(self):
+        # asyncio variant of wait(); no spinning, the event loop has other work to do
+        deadline = self.schedule()
+        await asyncio.sleep(max(deadline - self.clock(), 0))
+        return self.start_tick(deadline)
+
+    def run(self, callback, ticks=None):
+        # Calls callback(tick_index) on every tick, forever or for `ticks` ticks
+        while ticks is None or self.ticks < ticks:
+            callback(self.wait())
+
+    def metrics(self):
+        jitter = np.fromiter(self.jitter, dtype=np.float64)
+        return {
+            'rate': self.rate,
+            'ticks': self.ticks,
+            'misses': self.misses,
+            'dropped': self.dropped,
+            'jitter_mean': float(jitter.mean()) if jitter.size else 0.0,
+            'jitter_p99': float(np.percentile(jitter, 99)) if jitter.size else 0.0,
+            'jitter_max': float(jitter.max()) if jitter.size else 0.0,
+        }
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import zmq
+
+TRACE_SEPARATOR = '\x1e'  # ASCII record separator, never part of a stage payload
+COLLECTOR_ADDRESS = "tcp://localhost:5560"
+METRICS_PORT = 9100
+LATENCY_BOUND = 0.1  # Seconds from neural sample to optical pattern within which the closed loop is valid
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)  # Histogram upper bounds in seconds
+
+
+def start_trace(stage='A', timestamp=None):
+    # A new trace id with its first timestamp, e.g. when the neural sample arrived
+    return {'id': uuid.uuid4().hex, 'stamps': [[stage, time.time() if timestamp is None else timestamp]]}
+
+def stamp(trace, stage):
+    # Wall-clock time, so stamps taken in different processes on one machine can be compared
+    if trace is not None:
+        trace['stamps'].append([stage, time.time()])
+    return trace
+
+def attach(payload, trace):
+    if trace is None:
+        return payload
+    return payload + TRACE_SEPARATOR + json.dumps(trace)
+
+def detach(message):
+    """
+    Splits a stage message into (payload, trace); trace is None for messages sent without tracing.
+    """
+    payload, separator, trace = message.partition(TRACE_SEPARATOR)
+    return payload, (json.loads(trace) if separator else None)
+
+
+class TraceReporter:
+    """
+    Sends completed traces to the collector. Sends never block: if no collector is running, traces are dropped.
+    """
+    def __init__(self, address=COLLECTOR_ADDRESS):
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.PUSH)
+        self.socket.setsockopt(zmq.SNDHWM, 1000)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(address)
+
+    def report(self, trace):
+        if trace is None:
+            return
+        try:
+            self.socket.send_string(json.dumps(trace), zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+
+class LatencyCollector:
+    """
+    Per-stage and end-to-end latency of completed traces.
+
+    A stage's latency is the time from the previous stamp to its own, so it includes the hop that
+    delivered the message. Recent samples (up to `window` per stage) give p50/p95/p99; cumulative
+    histograms over BUCKETS are kept for scraping in the Prometheus text format.
+    """
+    def __init__(self, window=10000, bound=LATENCY_BOUND, buckets=BUCKETS):
+        self.window = window
+        self.bound = bound
+        self.buckets = np.asarray(buckets)
+        self.samples = {}  # Stage -> deque of recent latencies
+        self.histograms = {}  # Stage -> (bucket counts, sum, count)
+        self.bound_violations = 0
+        self.lock = threading.Lock()
+
+    def record(self, trace):
+        stamps = trace['stamps']
+        latencies = [(stage, t - previous_t) for (_, previous_t), (stage, t) in zip(stamps, stamps[1:])]
+        latencies.append(('end_to_end', stamps[-1][1] - stamps[0][1]))
+        with self.lock:
+            for stage, latency in latencies:
+                self.samples.setdefault(stage, deque(maxlen=self.window)).append(latency)
+                counts, total, count = self.histograms.get(stage, (np.zeros(len(self.buckets) + 1, dtype=np.int64), 0.0, 0))
+                counts[np.searchsorted(self.buckets, latency)] += 1  # Last slot is the +Inf bucket
+                self.histograms[stage] = (counts, total + latency, count + 1)
+            if latencies[-1][1] > self.bound:
+                self.bound_violations += 1
+
+    def percentiles(self):
+        with self.lock:
+            report = {}
+            for stage, samples in self.samples.items():
+                p50, p95, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95, 99])
+                report[stage] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'count': self.histograms[stage][2]}
+            return report
+
+    def prometheus_text(self):
+        lines = ['# HELP closed_loop_latency_seconds Latency per stage and end to end',
+                 '# TYPE closed_loop_latency_seconds histogram']
+        with self.lock:
+            for stage, (counts, total, count) in self.histograms.items():
+                cumulative = np.cumsum(counts)
+                for le, value in zip(self.buckets, cumulative):
+                    lines.append(f'closed_loop_latency_seconds_bucket{{stage="{stage}",le="{le:g}"}} {value}')
+                lines.append(f'closed_loop_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]}')
+                lines.append(f'closed_loop_latency_seconds_sum{{stage="{stage}"}} {total}')
+                lines.append(f'closed_loop_latency_seconds_count{{stage="{stage}"}} {count}')
+            lines.append('# TYPE closed_loop_bound_violations_total counter')
+            lines.append(f'closed_loop_bound_violations_total{{bound="{self.bound:g}"}} {self.bound_violations}')
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(collector, port=METRICS_PORT):
+    # GET /metrics returns the histograms; runs in a daemon thread next to the collector loop
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = collector.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(report_interval=5.0):
+    collector = LatencyCollector()
+    serve_metrics(collector)
+    context = zmq.Context()
+    pull_socket = context.socket(zmq.PULL)
+    pull_socket.bind("tcp://*:5560")
+
+    next_report = time.time() + report_interval
+    while True:
+        if pull_socket.poll(timeout=int(report_interval * 1000)):
+            collector.record(json.loads(pull_socket.recv_string()))
+        if time.time() >= next_report:
+            next_report += report_interval
+            for stage, stats in collector.percentiles().items():
+                print(f"{stage}: p50 {stats['p50'] * 1e3:.2f} ms, p95 {stats['p95'] * 1e3:.2f} ms, "
+                      f"p99 {stats['p99'] * 1e3:.2f} ms ({stats['count']} traces)")
+            if collector.bound_violations:
+                print(f"End-to-end latency exceeded {collector.bound * 1e3:.0f} ms {collector.bound_violations} times")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,39 @@
 import numpy as np
 import zmq
 import json
-from scipy.signal import find_peaks, hilbert, welch
+import sys
+import time
+from scipy.signal import find_peaks, hilbert
 from scipy.fft import fft, fftfreq
 import itertools
-from scipy.spatial.distance import euclidean
-from fastdtw import fastdtw
+import multiprocessing
 import logging
+from phase_locking import PhaseLockingEngine, phasors_from_analytic, plv_from_phasors
+from streaming_stats import SlidingWindowStats, WindowStats
+from streaming_spectrum import BANDS, StreamingWelch
+from feature_registry import FeatureRegistry, FeatureScheduler, to_serializable
+from dtw import warping_factors
+from fractal_dimension import calculate_higuchi_fractal_dimension
+from emd_features import EMDStage, empirical_mode_decomposition
+from feature_workers import FeatureWorkerPool
+from feature_store import FEATURE_STORE_DIR, FeatureStore
 
 # Constants
 NUM_CHANNELS = 32
 FS = 500  # Sampling rate in Hz
-UPDATE_RATE = 1  # Update rate in Hz
+UPDATE_RATE = 1  # Update rate in Hz of the slowest features, sets the analysis window
 BUFFER_SIZE = int(FS // UPDATE_RATE)  # Size of buffer corresponding to update rate
+TICK_RATE = 50  # Messages per second; each one carries the latest value of every feature
+FAST_RATE = TICK_RATE  # Incrementally maintained time-domain statistics
+SPECTRAL_RATE = 10  # Welch band powers, spectral shape features and peak detection
+SLOW_RATE = UPDATE_RATE  # PLV, HFD, DTW, EMD and evolution rate
+PSD_NPERSEG = 256  # Welch segment length, ~2 Hz resolution so every band has bins
+UPDATE_BUDGET = 0.5 / TICK_RATE  # Seconds of feature computation allowed per tick before features are slowed down
+EMD_MAX_IMFS = 4  # IMFs extracted per channel
+EMD_MAX_SIFTS = 8  # Sifting iterations per IMF, bounds the EMD cost per update
+EMD_PROCESSES = min(4, multiprocessing.cpu_count())  # Worker processes for the per-channel EMD, 1 runs it in the loop process
+FEATURE_WORKERS = 0  # Feature worker processes fed from a shared-memory ring, 0 computes features in the receiving process
+FEATURE_STORE = None  # Directory every published message is also persisted to for offline analysis, None disables it
 
 def receive_neural_data(socket):
     try:
@@ -27,10 +48,10 @@ def receive_neural_data(socket):
         print(f"Error receiving data: {e}")
         return None
 
-def buffer_data(data, buffer):
-    buffer = np.roll(buffer, -data.shape[0], axis=1)
-    buffer[:, -data.shape[0]:] = data
-    return buffer
+def buffer_data(data, window_stats):
+    # Ring-buffer write that also updates the running statistics; only the new samples are touched
+    window_stats.append(data)
+    return window_stats.window()
 
 def scale_data(data, fs=FS, factor=2):
     if data.ndim != 2 or data.shape[0] != 32:
@@ -47,312 +68,210 @@ def scale_data(data, fs=FS, factor=2):
 
     return scaled_data
 
+def detect_peak_heights(signals):
+    # Average height of all local maxima for each channel, over any leading (e.g. window) axes
+    signals = np.asarray(signals)
+    peak_heights = np.zeros(signals.shape[:-1])
+    for index in np.ndindex(signals.shape[:-1]):  # Row by row, a reshape would copy a strided window view
+        signal = signals[index]
+        peaks, _ = find_peaks(signal)  # All local maxima are considered
+        heights = signal[peaks]
+        peak_heights[index] = np.mean(heights) if len(heights) > 0 else 0
+    return peak_heights
+
 def detect_peaks(signals):
-    # Dynamically setting parameters based on signal characteristics
-    median_height = np.median(signal)
-    std_height = np.std(signal)
-    height = median_height + std_height  # Setting height to be above median + 1 std deviation
-    distance = len(signal) * 0.05  # Example to set distance to 5% of signal length
-    prominence = std_height * 0.5  # Setting prominence to be half of std deviation
-    
-    # Detecting peaks
-    peaks, properties = find_peaks(signal, height=height, distance=distance, prominence=prominence)
-        
-    # Calculating properties if peaks were found
-    if peaks.size > 0:
-        peak_count = len(peaks)
-        average_peak_height = np.mean(properties["peak_heights"])
-        average_distance = np.mean(np.diff(peaks)) if len(peaks) > 1 else 0
-        average_prominence = np.mean(properties["prominences"])
-    
-    else:
-        peak_count = 0
-        average_peak_height = 0
-        average_distance = 0
-        average_prominence = 0
-            
+    # One dict of peak properties per channel; windowed (..., channels, samples) input gives nested lists of them
+    signals = np.asarray(signals)
+    peaks_results = []
+    for index in np.ndindex(signals.shape[:-1]):  # Row by row, a reshape would copy a strided window view
+        signal = signals[index]
+        # Dynamically setting parameters based on signal characteristics
+        median_height = np.median(signal)
+        std_height = np.std(signal)
+        height = median_height + std_height  # Setting height to be above median + 1 std deviation
+        distance = max(len(signal) * 0.05, 1)  # Example to set distance to 5% of signal length
+        prominence = std_height * 0.5  # Setting prominence to be half of std deviation
+
+        # Detecting peaks
+        peaks, properties = find_peaks(signal, height=height, distance=distance, prominence=prominence)
+
+        # Calculating properties if peaks were found
+        if peaks.size > 0:
+            peak_count = len(peaks)
+            average_peak_height = np.mean(properties["peak_heights"])
+            average_distance = np.mean(np.diff(peaks)) if len(peaks) > 1 else 0
+            average_prominence = np.mean(properties["prominences"])
+        else:
+            peak_count = 0
+            average_peak_height = 0
+            average_distance = 0
+            average_prominence = 0
+
         # Appending results for each channel
         peaks_results.append({
             "peak_count": peak_count,
-            "average_peak_height": average_peak_height,
-            "average_distance": average_distance,
-            "average_prominence": average_prominence,
+            "average_peak_height": float(average_peak_height),
+            "average_distance": float(average_distance),
+            "average_prominence": float(average_prominence),
         })
-    
+
+    if signals.ndim > 2:
+        grouped = np.empty(len(peaks_results), dtype=object)
+        grouped[:] = peaks_results
+        return grouped.reshape(signals.shape[:-1]).tolist()
     return peaks_results
 
-def calculate_variance_std_dev(signals):
-    # Calculating variance and standard deviation
-    variance = np.var(signals, axis=1) 
-    std_dev = np.std(signals, axis=1)
-    return variance, std_dev
-
-def calculate_rms(signals): 
-    # Calculating RMS value
-    rms = np.sqrt(np.mean(signals**2, axis=1))
-    return rms
-
-def freq_bands(signals, fs=FS):
-    band_features = np.zeros((signals.shape[0], 4))
-
-    for i, signal in enumerate(signals):
-        
-        nperseg = min(32, len(downsampled_signal))
-        
-        frequencies, psd = welch(downsampled_signal, fs=FS, nperseg=nperseg)
-        
-        print("Frequencies:", frequencies)
-        print("PSD:", psd)
-        
-        bands = {'delta': (1, 4), 'theta': (4, 8), 'alpha': (8, 13), 'beta': (13, 30)}
-        for j, (name, (low, high)) in enumerate(bands.items()):
-            idx = np.logical_and(frequencies >= low, frequencies <= high)
-            if np.any(idx):
-                band_features[i, j] = np.nanmean(psd[idx])
-            else:
-                band_features[i, j] = 0.0
-    
-    return band_features
-
-
-def calculate_spectral_entropy(neural_data_array, fs):  
-    # Initialize an array to hold spectral entropy values for each channel
-    spectral_entropy_values = np.zeros(neural_data_array.shape[0])
-    
-    for i, signal in enumerate(neural_data_array):
-        # Determine nperseg based on the length of the signal
-        nperseg = min(len(signal), fs * 2)
-        # Calculate the power spectral density (PSD) using Welch's method
-        frequencies, psd = welch(signal, fs=fs, nperseg=nperseg)
-        
-        # Check if the sum of psd is zero
-        if np.sum(psd) == 0:
-            spectral_entropy_values[i] = 0.0  # Set spectral entropy to 0
-        else:
-            # Normalize the PSD to get a probability distribution for entropy calculation
-            normalized_psd = psd / np.sum(psd)
-            # Calculate the spectral entropy
-            spectral_entropy = -np.sum(normalized_psd * np.log2(normalized_psd))
-            # Store the spectral entropy value in the array
-            spectral_entropy_values[i] = spectral_entropy
-    
-    return spectral_entropy_values
-
-def spectral_centroids(signals, fs): 
-    # Calculate the spectral centroids for each signal
-    centroids = []
-    for signal in signals:
-        fft_result = fft(signal)
-        frequencies = fftfreq(len(signal), 1.0/fs)
-        magnitude = np.abs(fft_result)
-        centroid = np.sum(frequencies * magnitude) / np.sum(magnitude)
-        centroids.append(centroid)
+def spectral_centroids(signals, fs):
+    # Calculate the spectral centroids for each signal, one FFT over all channels (and windows)
+    magnitude = np.abs(fft(signals, axis=-1))
+    frequencies = fftfreq(np.shape(signals)[-1], 1.0/fs)
+    centroids = magnitude @ frequencies / np.sum(magnitude, axis=-1)
     return centroids
 
 def spectral_edge_density(signals, fs, percentage=95):
-    spectral_edge_densities = []
-
-    for signal in signals:
-        fft_result = fft(signal)
-        frequencies = fftfreq(len(signal), 1.0/fs)
-        positive_frequencies = frequencies[frequencies >= 0]
-        positive_fft_result = fft_result[frequencies >= 0]
-        magnitude = np.abs(positive_fft_result)
-        cumulative_sum = np.cumsum(np.sort(magnitude)[::-1])
-        total_power = np.sum(magnitude)
-        threshold = total_power * (percentage / 100)
-        spectral_edge = positive_frequencies[np.argmax(cumulative_sum >= threshold)]
-        spectral_edge_densities.append(spectral_edge)  
+    # One FFT over all channels (and windows); the edge is read at the index where the sorted magnitudes reach the threshold
+    frequencies = fftfreq(np.shape(signals)[-1], 1.0/fs)
+    positive = frequencies >= 0
+    magnitude = np.abs(fft(signals, axis=-1)[..., positive])
+    cumulative_sum = np.cumsum(np.sort(magnitude, axis=-1)[..., ::-1], axis=-1)
+    total_power = np.sum(magnitude, axis=-1, keepdims=True)
+    threshold = total_power * (percentage / 100)
+    spectral_edge_densities = frequencies[positive][np.argmax(cumulative_sum >= threshold, axis=-1)]
 
     return spectral_edge_densities
 
-def phase_locking_values(signal1, signal2):
-    # Compute the analytical signal for each input signal
-    num_signals = signals.shape[0]
-    plv_matrix = np.zeros((num_signals, num_signals))
-
-    for i in range(num_signals):
-        for j in range(i+1, num_signals):  # Only compute for unique pairs
-            signal1 = signals[i]
-            signal2 = signals[j]
-            
-            # Compute the analytical signal for each input signal
-            analytic_signal1 = hilbert(signal1)
-            analytic_signal2 = hilbert(signal2)
-            
-            # Compute the instantaneous phase for each analytical signal
-            phase1 = np.angle(analytic_signal1)
-            phase2 = np.angle(analytic_signal2)
-            
-            # Compute the phase difference
-            phase_diff = phase1 - phase2
-            
-            # Compute the PLV
-            plv = np.abs(np.sum(np.exp(1j * phase_diff)) / len(signal1))
-            
-            # Store the PLV in the matrix
-            plv_matrix[i, j] = plv
-            plv_matrix[j, i] = plv  # PLV is symmetric
-
-    return plv_matrix
-
-def calculate_higuchi_fractal_dimension(signals, k_max):
-    hfd_values = []  # To store HFD for each channel
-    
-    for signal in signals:
-        N = len(signal)
-        L = []
-        x = np.asarray(signal)
-        for k in range(1, k_max + 1):
-            Lk = []
-            for m in range(k):
-                Lkm_sum = 0
-                max_index = int((N - m - 1) / k) + 1  # Ensures valid indexing
-                for i in range(1, max_index):
-                    Lkm_sum += abs(x[m + i*k] - x[m + (i-1)*k])
-                if max_index - 1 > 0:  # Check to avoid division by zero
-                    Lkm = Lkm_sum * (N - 1) / (k * (max_index - 1))
-                    Lk.append(Lkm)
-                else:
-                    Lk.append(0)  # Or handle appropriately
-                
-            # Check if Lk contains non-zero values before taking log
-            if np.mean(Lk) > 0:
-                L.append(np.log(np.mean(Lk)))
-            else:
-                # Handle the case where np.mean(Lk) results in 0 or a negative number
-                # For example, append a very small positive value or handle as an error
-                L.append(np.log(np.finfo(float).eps))  # Using machine epsilon for a small positive number
-
-        # Proceed with polyfit only if L contains valid log values
-        if len(L) > 0 and np.all(np.isfinite(L)):
-            hfd = np.polyfit(np.log(range(1, k_max + 1)), L, 1)[0]  # Linear fit to log-log plot
-            hfd_values.append(hfd)
-        else:
-            # Handle the case where HFD cannot be computed due to invalid L values
-            hfd_values.append(np.nan)  # Append NaN or another placeholder to indicate failure
-    
-    return hfd_values
-
 def calculate_zero_crossing_rate(signals):
-    sign_changes = np.diff(np.sign(signals), axis=1)
-    zero_crossings = np.count_nonzero(sign_changes, axis=1)
-    zero_crossing_rates = zero_crossings / (signals.shape[1] - 1)
-    
-    print("Sign Changes:", sign_changes)
-    print("Zero Crossings:", zero_crossings)
-    
+    sign_changes = np.diff(np.sign(signals), axis=-1)
+    zero_crossings = np.count_nonzero(sign_changes, axis=-1)
+    zero_crossing_rates = zero_crossings / (signals.shape[-1] - 1)
     return zero_crossing_rates
 
-def perform_empirical_mode_decomposition(signals):
-    # Initialize EMD
-    emd = EMD()
-    
-    # Initialize an empty list to store IMFs for each signal
-    imfs_all_signals = []
-    
-    # Loop through each signal
-    for signal in signals:
-        # Perform EMD decomposition for the current signal
-        imfs = emd(signal)
-        
-        # Append the IMFs of the current signal to the list
-        imfs_all_signals.append(imfs)
-    
-    # Convert the list of IMFs into a NumPy array
-    imfs_all_signals = np.array(imfs_all_signals)
-    
-    return imfs
-
-def time_warping_factor(signals): 
-    # Calculate the average signal (mean across all signals for each time point)
-    average_signal = np.mean(np.array(signals), axis=0)
-    warping_factors = []
-    for signal in signals:
-        # Ensure that the signals are 1-D
-        signal = np.atleast_1d(signal)
-        average_signal = np.atleast_1d(average_signal)
-        
-        print("Signal shape:", signal.shape)
-        print("Average signal shape:", average_signal.shape)
-        distance, _ = fastdtw(np.squeeze(signal), np.squeeze(average_signal), dist=euclidean)
-        
-
-        
-        # Calculate the DTW distance between the signal and the average signal
-        distance, _ = fastdtw(np.squeeze(signal), np.squeeze(average_signal), dist=euclidean)
-
-        # Append the distance as the warping factor for this signal
-        warping_factors.append(distance)
-    return warping_factors
-
-def evolution_rate(signals):
-    rates = np.zeros(signals.shape[0])
-
-    for i, signal in enumerate(signals):
-        analytic_signal = hilbert(signal)
-        envelope = np.abs(analytic_signal)
-        derivative = np.diff(envelope)
-        rates[i] = np.mean(np.abs(derivative))
-        
-        print("Analytic Signal:", analytic_signal)
-        print("Envelope:", envelope)
-        print("Derivative:", derivative)
-    
+def perform_empirical_mode_decomposition(signals, max_imfs=EMD_MAX_IMFS, max_sifts=EMD_MAX_SIFTS):
+    # Full IMFs of every channel, one (number_of_imfs, samples) array per channel; sifting is capped per IMF.
+    # Windowed (..., channels, samples) input gives nested lists of them
+    if np.ndim(signals) > 2:
+        return [perform_empirical_mode_decomposition(window, max_imfs, max_sifts) for window in signals]
+    return [empirical_mode_decomposition(signal, max_imfs, max_sifts) for signal in signals]
+
+def time_warping_factor(signals, band=None):
+    # DTW distance of every channel to the average signal, Sakoe-Chiba banded and batched over channels
+    return warping_factors(signals, band)
+
+def evolution_rate(signals, analytic_signal=None):
+    # Mean absolute derivative of the amplitude envelope; the analytic signal can be shared with PLV
+    if analytic_signal is None:
+        analytic_signal = hilbert(signals, axis=-1)
+    envelope = np.abs(analytic_signal)
+    derivative = np.diff(envelope, axis=-1)
+    rates = np.mean(np.abs(derivative), axis=-1)
+
     return rates
 
-def analyze_signals(buffer):
-    signals = buffer.T  # Assuming signals are organized as channels x samples in the buffer
-    
-    peak_heights = detect_peak_heights(signals)
-    peak_counts = detect_peaks(signals)
-    variance, std_dev = calculate_variance_std_dev(signals)
-    rms = calculate_rms(signals)
-    band_features = freq_bands(signals, FS)  # Assuming this returns an array of shape (num_signals, num_bands)
-    # Assuming band_features order: delta, theta, alpha, beta
-    delta_band_power = band_features[:, 0]  # Delta band powers for all signals
-    theta_band_power = band_features[:, 1]  # Theta band powers for all signals
-    alpha_band_power = band_features[:, 2]  # Alpha band powers for all signals
-    beta_band_power = band_features[:, 3]  # Beta band powers for all signals
-    #spectral_entropy_values = spectral_entropy_values(signals, FS)
-    centroids = spectral_centroids(signals, FS)
-    spectral_edge_densities = spectral_edge_density(signals, FS, 95)
-    #plv = phase_locking_values(signals) 
-    hfd_values = calculate_higuchi_fractal_dimension(signals, k_max=10)
-    zero_crossing_rate = calculate_zero_crossing_rate(signals)
-    #imfs = perform_empirical_mode_decomposition(signals) 
-    #warping_factors = time_warping_factor(signals)
-    rates = evolution_rate(signals)
-
-    # Convert float32 values to Python floats in the results dictionary
-    results = {
-        'peak_heights': peak_heights.tolist() if isinstance(peak_heights, np.ndarray) else peak_heights,
-        'peaks': peak_counts.tolist() if isinstance(peak_counts, np.ndarray) else peak_counts,
-        'variance': variance.tolist() if isinstance(variance, np.ndarray) else variance,
-        'std_dev': std_dev.tolist() if isinstance(std_dev, np.ndarray) else std_dev,
-        'rms': rms.tolist() if isinstance(rms, np.ndarray) else rms,
-        'delta_band_power': delta_band_power.tolist() if isinstance(delta_band_power, np.ndarray) else delta_band_power,
-        'theta_band_power': theta_band_power.tolist() if isinstance(theta_band_power, np.ndarray) else theta_band_power,
-        'alpha_band_power': alpha_band_power.tolist() if isinstance(alpha_band_power, np.ndarray) else alpha_band_power,
-        'beta_band_power': beta_band_power.tolist() if isinstance(beta_band_power, np.ndarray) else beta_band_power,
-        #'spectral_entropy...
-        'centroids': centroids.tolist() if isinstance(centroids, np.ndarray) else centroids,
-        'spectral_edge_densities': spectral_edge_densities.tolist() if isinstance(spectral_edge_densities, np.ndarray) else spectral_edge_densities,
-        #'phase_synchronization': plv.tolist(),
-        'higuchi_fractal_dimension': hfd_values if isinstance(hfd_values, list) else hfd_values.tolist(),
-        'zero_crossing_rate': zero_crossing_rate.tolist() if isinstance(zero_crossing_rate, np.ndarray) else zero_crossing_rate,
-        #'empirical_mode_decomposition': [imf.tolist() for imf in imfs],
-        #'time_warping_factor': warping_factors.tolist(),
-        'evolution_rate': rates.tolist() if isinstance(rates, np.ndarray) else rates,
-    }
-
-        # Print the results
+def build_feature_registry():
+    """
+    Registers every B-stage feature with the intermediates it reads, a relative cost, its output shape and its rate.
+    """
+    registry = FeatureRegistry()
+
+    # Shared intermediates, computed at most once per update and only when a running feature needs them.
+    # The live loop seeds 'stats', 'psd', 'plv' and 'emd' with its incrementally maintained state instead.
+    registry.register_input('stats', lambda signals: stats_from_signals(signals))
+    registry.register_input('psd', lambda signals: spectrum_from_signals(signals))
+    registry.register_input('analytic', lambda signals: hilbert(signals, axis=-1))
+    registry.register_input('plv', lambda analytic_signal: plv_from_phasors(phasors_from_analytic(analytic_signal)), inputs=('analytic',))
+    registry.register_input('emd', lambda signals: EMDStage(signals.shape[-2], fs=FS, max_imfs=EMD_MAX_IMFS, max_sifts=EMD_MAX_SIFTS))
+
+    registry.register('peak_heights', detect_peak_heights, cost=2.0, rate=SPECTRAL_RATE)
+    registry.register('peaks', detect_peaks, cost=3.0, output_shape=('channels', 'peak_properties'), rate=SPECTRAL_RATE)
+    registry.register('variance', lambda stats: stats.variance(), inputs=('stats',), cost=0.1, rate=FAST_RATE)
+    registry.register('std_dev', lambda stats: stats.std_dev(), inputs=('stats',), cost=0.1, rate=FAST_RATE)
+    registry.register('rms', lambda stats: stats.rms(), inputs=('stats',), cost=0.1, rate=FAST_RATE)
+    for j, band in enumerate(BANDS):
+        registry.register(f'{band}_band_power', lambda spectrum, j=j: spectrum.band_powers()[..., j], inputs=('psd',), cost=0.2,
+                          rate=SPECTRAL_RATE)
+    registry.register('spectral_entropy', lambda spectrum: spectrum.spectral_entropy(), inputs=('psd',), cost=0.2, rate=SPECTRAL_RATE)
+    registry.register('centroids', lambda signals: spectral_centroids(signals, FS), cost=1.0, rate=SPECTRAL_RATE)
+    registry.register('spectral_edge_densities', lambda signals: spectral_edge_density(signals, FS, 95), cost=1.0, rate=SPECTRAL_RATE)
+    registry.register('phase_synchronization', lambda plv: plv, inputs=('plv',), cost=2.0, output_shape=('channels', 'channels'),
+                      rate=SLOW_RATE)
+    registry.register('higuchi_fractal_dimension', lambda signals: calculate_higuchi_fractal_dimension(signals, k_max=10), cost=3.0,
+                      rate=SLOW_RATE)
+    registry.register('zero_crossing_rate', lambda stats: stats.zero_crossing_rate(), inputs=('stats',), cost=0.1, rate=FAST_RATE)
+    # Per-IMF energy and mean frequency only, the IMFs themselves are too large to publish every update
+    registry.register('empirical_mode_decomposition', lambda signals, emd_stage: emd_stage.summaries(signals),
+                      inputs=('raw', 'emd'), cost=20.0, output_shape=('summaries', 'channels', 'imfs'), rate=SLOW_RATE)
+    registry.register('time_warping_factor', time_warping_factor, cost=5.0, rate=SLOW_RATE)
+    registry.register('evolution_rate', lambda signals, analytic_signal: evolution_rate(signals, analytic_signal),
+                      inputs=('raw', 'analytic'), cost=1.0, rate=SLOW_RATE)
+
+    return registry
+
+def stats_from_signals(signals):
+    # One-shot statistics of a (..., channels, samples) window when no live SlidingWindowStats is available, without copying it
+    return WindowStats(signals)
+
+def spectrum_from_signals(signals):
+    # One-shot Welch estimate over the whole (..., channels, samples) window, identical to scipy.signal.welch with the same segments
+    spectrum = StreamingWelch(signals.shape[:-1], signals.shape[-1], fs=FS, nperseg=PSD_NPERSEG)
+    spectrum.update(signals)
+    return spectrum
+
+def analyze_signals(buffer, plv_engine=None, window_stats=None, spectrum=None, scheduler=None, emd_stage=None):
+    signals = buffer  # Signals are organized as channels x samples in the buffer
+    if scheduler is None:
+        scheduler = FeatureScheduler(build_feature_registry())
+
+    # State kept current by the live loop replaces the one-shot intermediates
+    live_inputs = {'raw': signals}
+    if window_stats is not None:
+        live_inputs['stats'] = window_stats
+    if spectrum is not None:
+        live_inputs['psd'] = spectrum
+    if plv_engine is not None:
+        live_inputs['plv'] = plv_engine.plv_matrix()
+    if emd_stage is not None:
+        live_inputs['emd'] = emd_stage
+
+    tick = scheduler.update_count
+    features = scheduler.run(**live_inputs)
+
+    # Convert NumPy values to Python lists and floats in the results dictionary
+    results = {name: to_serializable(value) for name, value in features.items()}
+    # Slow features are republished between their runs; the timestamp says when each value was computed
+    results['timestamps'] = scheduler.timestamps()
+
+    # Print the results computed on this tick
     print("Analysis Results:")
-    for key, value in results.items():
-        print(f"{key}: {value}")
-        
+    for feature in scheduler.registry.enabled_features():
+        if feature.last_run == tick:
+            print(f"{feature.name}: {results[feature.name]}")
+
     return results
 
+def run_with_workers(sub_socket, pub_socket, num_workers=FEATURE_WORKERS, store=None):
+    # Receiver and collector: samples go into the shared ring, workers compute their share of the features from it
+    pool = FeatureWorkerPool(build_feature_registry, NUM_CHANNELS, BUFFER_SIZE, num_workers,
+                             update_budget=UPDATE_BUDGET, tick_rate=TICK_RATE, fs=FS, slow_rate=SLOW_RATE)
+    tick_period = 1.0 / TICK_RATE
+    next_tick = time.perf_counter()
+    try:
+        while True:
+            neural_data = receive_neural_data(sub_socket)
+            if neural_data is not None and neural_data.size > 0:
+                pool.append(scale_data(neural_data))
+                if pool.is_full() and time.perf_counter() >= next_tick:
+                    next_tick = max(next_tick + tick_period, time.perf_counter())
+                    pool.tick()
+                    analysis_results = pool.collect()  # Latest value of every feature received from the workers so far
+                    if len(analysis_results) > 1:
+                        pub_socket.send_string(json.dumps(analysis_results))
+                        if store is not None:
+                            store.append(analysis_results)
+            else:
+                print("No neural data received or neural_data is empty.")
+    finally:
+        pool.close()
+
 def main():
     context = zmq.Context()
     sub_socket = context.socket(zmq.SUB)
@@ -367,27 +286,51 @@ def main():
 
     pub_socket = context.socket(zmq.PUB)
     pub_socket.bind("tcp://*:5445")
-    
-    buffer = np.zeros((NUM_CHANNELS, BUFFER_SIZE), dtype=np.float32)
-
-    while True:
-        neural_data = receive_neural_data(sub_socket)
-        # Inside main(), after receiving and checking neural_data
-        if neural_data is not None and neural_data.size > 0:
-            scaled_data = scale_data(neural_data)  # Scale the received data
-            buffer = buffer_data(scaled_data, buffer)  # Buffer the scaled data
+    # python B_signals_to_features.py --store persists the session under FEATURE_STORE_DIR
+    store_root = FEATURE_STORE_DIR if '--store' in sys.argv[1:] else FEATURE_STORE
+    store = FeatureStore(store_root) if store_root else None
+    try:
+        if FEATURE_WORKERS > 0:
+            run_with_workers(sub_socket, pub_socket, store=store)
+        else:
+            run_in_process(sub_socket, pub_socket, store)
+    finally:
+        if store is not None:
+            store.close()
+
+def run_in_process(sub_socket, pub_socket, store=None):
+    window_stats = SlidingWindowStats(NUM_CHANNELS, BUFFER_SIZE)  # Sliding buffer with running variance/RMS/zero-crossing sums
+    plv_engine = PhaseLockingEngine(NUM_CHANNELS, BUFFER_SIZE, fs=FS)  # Keeps the PLV matrix current as the buffer slides
+    spectrum = StreamingWelch(NUM_CHANNELS, BUFFER_SIZE, fs=FS, nperseg=PSD_NPERSEG)  # Only new Welch segments are transformed
+    emd_stage = EMDStage(NUM_CHANNELS, fs=FS, max_imfs=EMD_MAX_IMFS, max_sifts=EMD_MAX_SIFTS, processes=EMD_PROCESSES)  # Pool released in the finally below
+    scheduler = FeatureScheduler(build_feature_registry(), update_budget=UPDATE_BUDGET, tick_rate=TICK_RATE)  # Slows down features that overrun the budget
+    tick_period = 1.0 / TICK_RATE
+    next_tick = time.perf_counter()
+
+    try:
+        while True:
+            neural_data = receive_neural_data(sub_socket)
+            # Inside main(), after receiving and checking neural_data
+            if neural_data is not None and neural_data.size > 0:
+                scaled_data = scale_data(neural_data)  # Scale the received data
+                buffer = buffer_data(scaled_data, window_stats)  # Buffer the scaled data
+                plv_engine.update(scaled_data)
+                spectrum.update(scaled_data)
             
-            # Once the buffer is ready for analysis
-            if np.all(buffer != 0):  # Assuming buffer is filled to a point where analysis is meaningful
-                analysis_results = analyze_signals(buffer)  # Analyze the buffered signals
-                serialized_results = json.dumps(analysis_results)  # Serialize analysis results
-                pub_socket.send_string(serialized_results)  # Send the results
+                # Once the buffer is ready for analysis, publish at most once per tick
+                if window_stats.is_full() and time.perf_counter() >= next_tick:
+                    # Skip missed ticks instead of bursting to catch up
+                    next_tick = max(next_tick + tick_period, time.perf_counter())
+                    analysis_results = analyze_signals(buffer, plv_engine, window_stats, spectrum, scheduler, emd_stage)  # Analyze the buffered signals
+                    serialized_results = json.dumps(analysis_results)  # Serialize analysis results
+                    pub_socket.send_string(serialized_results)  # Send the results
+                    if store is not None:
+                        store.append(analysis_results)  # Written in batches by the store's thread
 
-        else:
-            print("No neural data received or neural_data is empty.")
-        # Inside the while loop of the main function
-        message = sub_socket.recv_string()
-        analyzed_features = json.loads(message)
+            else:
+                print("No neural data received or neural_data is empty.")
+    finally:
+        emd_stage.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
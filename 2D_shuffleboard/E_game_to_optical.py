@@ -1,16 +1,20 @@
-import numpy as np
 import zmq
 import time
+from frame_transport import FrameSender
+from stimulation_patterns import PatternGenerator, constant_tables
 
 class GameStimulationEncoder:
     """
     Encodes game metadata and actions into stimulation patterns.
     """
-    def __init__(self):
+    def __init__(self, frame_mode='rle'):
         # ZeroMQ setup for publishing stimulation patterns
         self.context = zmq.Context()
         self.publisher = self.context.socket(zmq.PUB)
         self.publisher.bind("tcp://*:5556")  # Bind to port 5556
+        self.frame_sender = FrameSender(self.publisher, mode=frame_mode)  # Banded frames compress to a few runs
+        # Half intensity over the first distance columns, +127 over the first force rows, saturating at 255
+        self.patterns = PatternGenerator(column_tables=constant_tables(128), row_tables=constant_tables(127))
 
     def encode_game_metadata(self, metadata):
         """
@@ -30,27 +34,16 @@ class GameStimulationEncoder:
         Creates an optical stimulation pattern from the encoded packet.
         The pattern's complexity reflects the game state and player actions.
         """
-        pattern_size = 256  # Define pattern size
-        stimulation_pattern = np.zeros((pattern_size, pattern_size), dtype=np.uint8)
-
-        # Use distance to target for vertical pattern intensity
-        distance_intensity = packet[0]
-        stimulation_pattern[:, :distance_intensity] = 128  # Half intensity
-        
-        # Use player force for a horizontal pattern overlay
-        force_intensity = packet[1]
-        stimulation_pattern[:force_intensity, :] += 127  # Additive intensity to make it stand out
-        stimulation_pattern[stimulation_pattern > 255] = 255  # Ensure max intensity isn't exceeded
-
-        return stimulation_pattern
+        # Distance to target sets the vertical band, player force the horizontal overlay; the overlap saturates
+        # Returns a cached read-only frame, repeated packets reuse it
+        return self.patterns.pattern(*packet)
 
     def publish_stimulation_pattern(self, pattern):
         """
         Publishes the optical stimulation pattern over ZeroMQ.
         """
-        # Convert pattern to string or a format suitable for sending
-        encoded_pattern = np.array2string(pattern)
-        self.publisher.send_string(encoded_pattern)
+        # Binary frame (see frame_transport), rebuilt by the F stage
+        self.frame_sender.send(pattern)
 
     def process_game_metadata(self, metadata):
         """
@@ -0,0 +1,138 @@
+import sys
+import time
+
+import numpy as np
+import zmq
+from frame_transport import FrameReceiver
+
+REFRESH_RATE = 60  # Hz, refresh rate of the projector or LED device
+
+
+class VirtualFramebuffer:
+    """
+    Stands in for the optical device: keeps a copy of the frame on display.
+    """
+    def __init__(self):
+        self.frame = None
+        self.shown = 0
+
+    def show(self, frame):
+        if self.frame is None or self.frame.shape != frame.shape:
+            self.frame = np.empty_like(frame)
+        np.copyto(self.frame, frame)
+        self.shown += 1
+
+    def close(self):
+        pass
+
+class FileSink:
+    """
+    Stands in for the optical device by appending every displayed frame to a raw uint8 file,
+    read back with np.fromfile(path, dtype=np.uint8).reshape(-1, height, width).
+    """
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.shown = 0
+
+    def show(self, frame):
+        self.file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        self.shown += 1
+
+    def close(self):
+        self.file.close()
+
+
+class OpticalOutput:
+    """
+    Receives the binary stimulation frames published by the E stage and shows them at the device's refresh rate.
+
+    Refreshes are on a fixed grid of deadlines. At each one every queued message is decoded (deltas
+    need their predecessors) and only the newest frame is shown; frames replaced before their
+    refresh are counted as dropped, so a fast producer never builds a queue of stale frames here. A
+    refresh that starts more than half a period late counts as late, and refreshes that passed
+    entirely are skipped and counted as missed instead of being shown back to back. The subscriber
+    keeps ZeroMQ's default high-water mark: a full queue drops the newest messages, not the stale
+    ones, so the queue is kept short by draining it on every refresh instead. The E stage sends
+    self-contained frames on this hop, so a frame lost anyway costs one refresh, not every frame up
+    to the next keyframe of a delta stream.
+    """
+    def __init__(self, address="tcp://localhost:5556", refresh_rate=REFRESH_RATE, sink=None, report_interval=1.0):
+        self.context = zmq.Context()
+        self.subscriber = self.context.socket(zmq.SUB)
+        self.subscriber.connect(address)
+        self.subscriber.setsockopt_string(zmq.SUBSCRIBE, '')
+        self.receiver = FrameReceiver()
+        self.sink = sink if sink is not None else VirtualFramebuffer()
+        self.period = 1.0 / refresh_rate
+        self.report_interval = report_interval
+
+        self.received = 0  # Messages decoded
+        self.frames = 0  # Frames shown
+        self.dropped = 0  # Frames replaced by a newer one before they were shown
+        self.late = 0  # Refreshes that started more than half a period after their deadline
+        self.missed = 0  # Refreshes skipped because their deadline had passed
+
+    def display(self, frame):
+        # Hand-off point to the optical device driver; frame is a (256, 256) uint8 array reused between calls
+        self.sink.show(frame)
+
+    def latest_frame(self):
+        # Decodes everything that is queued and returns the newest complete frame, or None if nothing new arrived
+        frame = None
+        while True:
+            try:
+                parts = self.subscriber.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return frame
+            self.received += 1
+            decoded = self.receiver.decode(parts)
+            if decoded is None:
+                continue  # Delta without its base frame, wait for the next keyframe
+            if frame is not None:
+                self.dropped += 1
+            frame = decoded
+
+    def refresh(self, lateness=0.0):
+        if lateness > self.period / 2:
+            self.late += 1
+        frame = self.latest_frame()
+        if frame is not None:
+            self.display(frame)
+            self.frames += 1
+
+    def run(self, duration=None):
+        start = time.perf_counter()
+        index = 0
+        last_report = start
+        while duration is None or time.perf_counter() - start < duration:
+            deadline = start + index * self.period
+            now = time.perf_counter()
+            if now < deadline:
+                time.sleep(deadline - now)  # Frames arriving meanwhile wait in the socket until the next refresh drains it
+                now = time.perf_counter()
+            passed = int((now - deadline) // self.period)
+            if passed > 0:
+                self.missed += passed
+                index += passed
+                deadline = start + index * self.period
+            self.refresh(time.perf_counter() - deadline)
+            index += 1
+
+            if now - last_report >= self.report_interval:
+                print(f"Frames displayed: {self.frames}, dropped: {self.dropped}, late refreshes: {self.late}, "
+                      f"missed refreshes: {self.missed}, gaps in the frame sequence: {self.receiver.missed}")
+                last_report = now
+
+    def close(self):
+        self.subscriber.close(linger=0)
+        self.sink.close()
+
+if __name__ == "__main__":
+    # python F_optical_out.py [frames.raw] writes the displayed frames to a file instead of the virtual framebuffer
+    output = OpticalOutput(sink=FileSink(sys.argv[1]) if len(sys.argv) > 1 else None)
+    try:
+        output.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        output.close()
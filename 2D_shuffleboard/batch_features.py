@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from A_incoming_signals import PACKET_SIZE, SAMPLE_RATE, read_rhs_blocks, resample_blocks
+from B_signals_to_features import BUFFER_SIZE, FS, NUM_CHANNELS, PSD_NPERSEG, build_feature_registry
+from feature_registry import FeatureScheduler
+from feature_store import FEATURE_STORE_DIR, flatten_features, write_chunk
+from phase_locking import PhaseLockingEngine
+from streaming_spectrum import StreamingWelch, WindowSpectrum
+from windowing import sliding_windows
+
+HOP = BUFFER_SIZE // 10  # Scaled samples between consecutive windows, a tenth of the live analysis window
+WINDOWS_PER_CHUNK = 100  # Windows computed in one batch and written as one chunk
+SUBSAMPLING = 2  # The factor scale_data keeps every n-th sample with
+
+
+def prepare_signals(blocks, sample_rate, packet_size=PACKET_SIZE):
+    """
+    The (channels, samples) stream the live B stage buffers, block by block, for a stream of (samples, channels)
+    blocks of a recording: resampled to the A-stage SAMPLE_RATE, cut into A packets and scaled packet by packet
+    as scale_data does. This is also what A publishes when it replays the recording. A partial packet is carried
+    over to the next block.
+    """
+    pending = np.empty((0, NUM_CHANNELS), dtype=np.float32)
+    for samples in resample_blocks(blocks, sample_rate):
+        if samples.ndim != 2 or samples.shape[1] < NUM_CHANNELS:
+            raise ValueError(f"Unexpected data shape: {samples.shape}. Expected (number_of_samples, {NUM_CHANNELS} or more).")
+        pending = np.concatenate([pending, np.asarray(samples[:, :NUM_CHANNELS], dtype=np.float32)])
+        packets = pending.shape[0] // packet_size
+        # (channels, packets, packet samples) with the same subsampling and per-packet, per-channel min-max as scale_data
+        packet_blocks = pending[:packets * packet_size].T.reshape(NUM_CHANNELS, packets, packet_size)[..., ::SUBSAMPLING]
+        pending = pending[packets * packet_size:]
+        data_min = packet_blocks.min(axis=-1, keepdims=True)
+        data_max = packet_blocks.max(axis=-1, keepdims=True)
+        scaled = (packet_blocks - data_min) / np.where(data_max > data_min, data_max - data_min, 1)
+        yield scaled.reshape(NUM_CHANNELS, -1)
+
+class LiveReplay:
+    """
+    Replays the scaled stream through the engines the live B loop keeps, PhaseLockingEngine and StreamingWelch,
+    one A packet at a time as B receives them, and keeps their state at the end of every hop-spaced window.
+    The live loop reads the window's PLV and PSD from these engines, and they depend on the stream before the
+    window and on how it was split into packets, so replaying them is the only way to get its values offline.
+    Windows end on packet boundaries, as live ticks do.
+    """
+    def __init__(self, window=BUFFER_SIZE, hop=HOP, packet_size=PACKET_SIZE):
+        self.packet = len(range(0, packet_size, SUBSAMPLING))  # Scaled samples per packet
+        if hop % self.packet or window % self.packet:
+            raise ValueError(f"Window ({window}) and hop ({hop}) must be multiples of the {self.packet} scaled samples of a packet.")
+        self.window = window
+        self.hop = hop
+        # Same engines as run_in_process
+        self.plv_engine = PhaseLockingEngine(NUM_CHANNELS, window, fs=FS)
+        self.spectrum = StreamingWelch(NUM_CHANNELS, window, fs=FS, nperseg=PSD_NPERSEG)
+        self.samples = 0  # Scaled samples fed so far
+        self.plv = []  # State at the end of every window not yet taken
+        self.psd = []
+
+    def update(self, signals):
+        # Feeds a (channels, samples) block of the scaled stream; it must continue the stream at a packet boundary
+        for start in range(0, signals.shape[1], self.packet):
+            packet = signals[:, start:start + self.packet]
+            self.plv_engine.update(packet)
+            self.spectrum.update(packet)
+            self.samples += packet.shape[1]
+            if self.samples >= self.window and (self.samples - self.window) % self.hop == 0:
+                self.plv.append(self.plv_engine.plv_matrix())
+                self.psd.append(self.spectrum.psd())
+
+    def take(self, count):
+        # Live inputs of the next `count` windows for window_features, (count, ...) batches
+        plv, self.plv = self.plv[:count], self.plv[count:]
+        psd, self.psd = self.psd[:count], self.psd[count:]
+        return {'plv': np.stack(plv), 'psd': WindowSpectrum(np.stack(psd), self.spectrum.frequencies, self.spectrum.band_matrix)}
+
+def as_arrays(value):
+    # Output of a feature for a batch of windows as arrays; the nested (windows, channels) lists of per-channel dicts
+    # that detect_peaks returns become a dict of (windows, channels) arrays
+    if isinstance(value, dict):
+        return {key: as_arrays(item) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], list) and value[0] and isinstance(value[0][0], dict):
+        return {key: np.array([[item[key] for item in row] for row in value]) for key in value[0][0]}
+    return np.asarray(value)
+
+def window_features(windows, registry=None, live_inputs=None):
+    """
+    Every enabled feature of the B-stage registry for a (windows, channels, samples) batch, each as an array
+    (windows, *live output shape) or a dict of such arrays. The feature functions take the batch as it is, a
+    strided view included, and their shared intermediates (window statistics, Welch PSD, analytic signal) are
+    computed once for the whole batch. Without live_inputs the values match analyze_signals on each window on
+    its own. The live loop instead reads PLV and the Welch PSD from engines that follow the stream, which the
+    one-shot estimates differ from (PLV by about 0.02, and the PSD's segments follow the stream rather than
+    the window); live_inputs from LiveReplay carry those, and every value then matches the live loop.
+    """
+    registry = registry or build_feature_registry()
+    scheduler = FeatureScheduler(registry)
+    intermediates = {'raw': windows}
+    intermediates.update(live_inputs or {})
+    results = {}
+    for feature in registry.enabled_features():
+        value = feature.compute(*[scheduler.resolve(name, intermediates) for name in feature.inputs])
+        results[feature.name] = as_arrays(value)
+    return results
+
+def write_windows(directory, index, signals, first, hop, window, registry, live_inputs=None):
+    # Features of every window of `hop`-spaced windows of (channels, samples) signals as chunk `index`; window 0 is window `first` of the session
+    windows = sliding_windows(signals, window, hop)  # A view, the features take it as it is
+    ends = ((first + np.arange(windows.shape[0])) * hop + window) * SUBSAMPLING / SAMPLE_RATE
+    columns = {'time': ends}
+    columns.update({name: np.asarray(value, dtype=np.float64)
+                    for name, value in flatten_features(window_features(windows, registry, live_inputs)).items()})
+    os.makedirs(directory, exist_ok=True)
+    write_chunk(directory, index, columns)
+    return windows.shape[0]
+
+def extract_session(blocks, sample_rate, session, root=FEATURE_STORE_DIR, hop=HOP, window=BUFFER_SIZE,
+                    windows_per_chunk=WINDOWS_PER_CHUNK):
+    """
+    Computes the live features on windows of `window` scaled samples every `hop` samples of a recording and
+    writes them to the feature store as session `session`, one chunk per windows_per_chunk windows. blocks is
+    the recording as consecutive (samples, channels) blocks, e.g. from read_rhs_blocks, or one such array;
+    only the scaled samples of the next chunk are kept between blocks. PLV and the Welch PSD come from a
+    LiveReplay of the stream, so every feature matches what the live B stage computes on a tick at the end of
+    the same window. Times are the end of each window in seconds from the start of the recording. Returns
+    the number of windows.
+    """
+    if isinstance(blocks, np.ndarray):
+        blocks = [blocks]
+    directory = os.path.join(root, session)
+    registry = build_feature_registry()
+    replay = LiveReplay(window, hop)
+    span = (windows_per_chunk - 1) * hop + window  # Scaled samples the windows of one chunk cover
+    pending = np.empty((NUM_CHANNELS, 0), dtype=np.float32)  # Scaled samples from the start of window `count` on
+    count = index = 0
+    for signals in prepare_signals(blocks, sample_rate):
+        replay.update(signals)
+        pending = np.concatenate([pending, signals], axis=1)
+        while pending.shape[1] >= span:
+            count += write_windows(directory, index, pending[:, :span], count, hop, window, registry, replay.take(windows_per_chunk))
+            index += 1
+            pending = pending[:, windows_per_chunk * hop:]
+    if pending.shape[1] >= window:
+        windows = (pending.shape[1] - window) // hop + 1
+        count += write_windows(directory, index, pending, count, hop, window, registry, replay.take(windows))
+    return count
+
+def extract_recording(path, root=FEATURE_STORE_DIR, hop=HOP):
+    # One .rhs file as one session, named after the file; the file is read block by block
+    session = os.path.splitext(os.path.basename(path))[0]
+    start = time.perf_counter()
+    blocks, sample_rate = read_rhs_blocks(path)
+    count = extract_session(blocks, sample_rate, session, root, hop)
+    print(f"{path}: {count} windows in {time.perf_counter() - start:.1f} s")
+    return session, count
+
+def extract_recordings(paths, root=FEATURE_STORE_DIR, hop=HOP, processes=None):
+    # Files are independent, so they are spread over a process pool; returns (session, windows) per file
+    processes = min(processes or os.cpu_count(), len(paths))
+    if processes <= 1:
+        return [extract_recording(path, root, hop) for path in paths]
+    with multiprocessing.Pool(processes=processes) as pool:
+        return pool.starmap(extract_recording, [(path, root, hop) for path in paths])
+
+def main():
+    # python batch_features.py recording.rhs [recording.rhs ...]; read back with feature_store.read_features(session)
+    if len(sys.argv) < 2:
+        print("Usage: batch_features.py <recording.rhs> [...]")
+        return
+    extract_recordings(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import zmq
+
+import A_incoming_signals as A
+import B_signals_to_features as B
+from C_features_to_game import FeaturesToGameAction
+from feature_registry import FeatureScheduler
+from frame_transport import FrameReceiver, FrameSender
+from phase_locking import PhaseLockingEngine
+from stimulation_patterns import PatternGenerator, constant_tables
+from streaming_spectrum import StreamingWelch
+from streaming_stats import SlidingWindowStats
+from emd_features import EMDStage
+
+PACKAGE = '2D_shuffleboard'
+WINDOW_SIZES = (50, 500, 5000)  # Samples per channel in the analysis window
+PACKET_SIZE = 10
+END_TO_END_TICKS = 200  # Four seconds of 50 Hz ticks, so every slow feature runs a few times
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+REGRESSION_THRESHOLD = 1.25  # A median this many times the baseline's is reported as a regression
+
+
+def measure(function, min_time=0.2, min_iterations=3, max_iterations=1000, per_call=1):
+    # Times repeated calls of function(); per_call divides the times when one call covers several operations
+    times = []
+    total = 0.0
+    while len(times) < min_iterations or (total < min_time and len(times) < max_iterations):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed / per_call)
+        total += elapsed
+    times = np.array(times)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(times.min()),
+        'p95_s': float(np.percentile(times, 95)),
+        'iterations': len(times) * per_call,
+    }
+
+def distribution(times):
+    # Same fields as measure() for latencies collected by the caller
+    times = np.asarray(times)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(times.min()),
+        'p95_s': float(np.percentile(times, 95)),
+        'p99_s': float(np.percentile(times, 99)),
+        'max_s': float(times.max()),
+        'iterations': len(times),
+    }
+
+
+class BenchmarkResults:
+    """
+    Benchmark records of one run, keyed by group, name and parameters, written as one JSON file per run.
+    """
+    def __init__(self):
+        self.records = []
+
+    def add(self, group, name, params=None, function=None, stats=None, **extra):
+        record = {'group': group, 'name': name, 'params': params or {}}
+        try:
+            record.update(stats if stats is not None else measure(function))
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+        record.update(extra)
+        self.records.append(record)
+        if 'error' in record:
+            print(f"{group}/{name} {record['params']}: error {record['error']}")
+        else:
+            print(f"{group}/{name} {record['params']}: median {record['median_s'] * 1e6:.1f} us")
+        return record
+
+    def metadata(self):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except OSError:
+            commit = None
+        return {
+            'package': PACKAGE,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': commit or None,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        }
+
+    def write(self, path=None):
+        if path is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{PACKAGE}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w') as results_file:
+            json.dump({'metadata': self.metadata(), 'results': self.records}, results_file, indent=1)
+        return path
+
+def record_key(record):
+    return (record['group'], record['name'], json.dumps(record['params'], sort_keys=True))
+
+def compare(baseline_path, records, threshold=REGRESSION_THRESHOLD):
+    # Prints and returns the benchmarks whose median grew by more than `threshold` times since the baseline run
+    with open(baseline_path) as baseline_file:
+        baseline = {record_key(record): record for record in json.load(baseline_file)['results']}
+    regressions = []
+    for record in records:
+        previous = baseline.get(record_key(record))
+        if previous is None or 'median_s' not in previous or 'median_s' not in record:
+            continue
+        ratio = record['median_s'] / previous['median_s']
+        if ratio > threshold:
+            regressions.append((record_key(record), ratio))
+            print(f"Regression: {record['group']}/{record['name']} {record['params']} is {ratio:.2f}x slower")
+    print(f"{len(regressions)} regressions against {baseline_path}")
+    return regressions
+
+
+def pair_sockets(name):
+    # Connected in-process PAIR sockets without high-water marks, so a benchmark can queue many messages
+    context = zmq.Context.instance()
+    sender, receiver = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+    for socket in (sender, receiver):
+        socket.setsockopt(zmq.SNDHWM, 0)
+        socket.setsockopt(zmq.RCVHWM, 0)
+    receiver.bind(f"inproc://{name}")
+    sender.connect(f"inproc://{name}")
+    return sender, receiver
+
+def synthetic_signals(window, seed=0):
+    # (channels, window) block of the A-stage oscillations, the layout analyze_signals works on
+    source = A.oscillation_source(packet_size=window, seed=seed)
+    return np.ascontiguousarray(next(source).T)
+
+def benchmark_decode(results, batch=500):
+    sender, receiver = pair_sockets('benchmark-decode')
+    message = A.encode_packet(next(A.oscillation_source(packet_size=PACKET_SIZE)))
+
+    def receive_batch():
+        for _ in range(batch):
+            sender.send(message)
+        for _ in range(batch):
+            B.receive_neural_data(receiver)
+    stats = measure(receive_batch, per_call=batch)
+    results.add('decode', 'receive_neural_data', {'packet_size': PACKET_SIZE}, stats=stats,
+                messages_per_s=1.0 / stats['median_s'], message_bytes=len(message))
+    sender.close()
+    receiver.close()
+
+def benchmark_buffering(results):
+    packet = B.scale_data(synthetic_signals(2 * PACKET_SIZE))
+    for window in WINDOW_SIZES:
+        window_stats = SlidingWindowStats(B.NUM_CHANNELS, window)
+        results.add('buffer', 'buffer_data', {'window': window}, lambda: B.buffer_data(packet, window_stats))
+    results.add('buffer', 'scale_data', {'packet_size': 2 * PACKET_SIZE}, lambda: B.scale_data(synthetic_signals(2 * PACKET_SIZE)))
+
+def benchmark_features(results):
+    for window in WINDOW_SIZES:
+        signals = synthetic_signals(window)
+        registry = B.build_feature_registry()
+        scheduler = FeatureScheduler(registry)
+        # Shared intermediates first, so each feature below is timed on its own
+        intermediates = {'raw': signals}
+        for name in registry.providers:
+            def provide(name=name):
+                intermediates.pop(name, None)
+                scheduler.resolve(name, intermediates)
+            results.add('intermediates', name, {'window': window}, provide)
+        for feature in registry.features.values():
+            if not all(name in intermediates for name in feature.inputs):
+                results.add('features', feature.name, {'window': window}, stats={}, error='missing intermediate')
+                continue
+            args = [intermediates[name] for name in feature.inputs]
+            results.add('features', feature.name, {'window': window}, lambda feature=feature, args=args: feature.compute(*args))
+
+def analysis_message(window=B.BUFFER_SIZE):
+    # One full B-stage message, as published
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return B.analyze_signals(synthetic_signals(window))
+
+def benchmark_serialization(results):
+    message = analysis_message()
+    text = json.dumps(message)
+    results.add('serialization', 'features_json_dumps', {}, lambda: json.dumps(message), message_bytes=len(text))
+    results.add('serialization', 'features_json_loads', {}, lambda: json.loads(text), message_bytes=len(text))
+
+    patterns = PatternGenerator(constant_tables(128), constant_tables(127))  # The tables of E_game_to_optical
+    frames = [patterns.compose(d, f).copy() for d, f in zip(range(0, 256, 5), range(255, 0, -5))]
+    for mode in ('raw', 'delta', 'rle'):
+        sender, receiver = pair_sockets(f'benchmark-frames-{mode}')
+        frame_sender = FrameSender(sender, mode=mode)
+        frame_receiver = FrameReceiver()
+        sent = {'index': 0}
+
+        def send_frame():
+            frame_sender.send(frames[sent['index'] % len(frames)])
+            sent['index'] += 1
+        stats = measure(send_frame)
+        size = 0
+        while receiver.poll(timeout=0):
+            parts = receiver.recv_multipart(copy=False)
+            size = sum(len(part.buffer) for part in parts)
+            frame_receiver.decode(parts)
+        results.add('serialization', 'frame_send', {'mode': mode}, stats=stats, last_message_bytes=size)
+        sender.close()
+        receiver.close()
+
+def benchmark_policy(results):
+    features = json.loads(json.dumps(analysis_message()))
+    policy = FeaturesToGameAction().policy
+    results.add('policy', 'evaluate', {'timestamps': 'unchanged'}, lambda: policy.evaluate(features))
+
+    def evaluate_cold():
+        policy.reset()
+        policy.evaluate(features)
+    results.add('policy', 'evaluate', {'timestamps': 'new'}, evaluate_cold)
+
+def benchmark_patterns(results):
+    uncached = PatternGenerator(constant_tables(128), constant_tables(127), cache_size=0)
+    cached = PatternGenerator(constant_tables(128), constant_tables(127))
+    packets = [(d % 256, (3 * d) % 256) for d in range(64)]
+    step = {'index': 0}
+
+    def next_packet():
+        step['index'] += 1
+        return packets[step['index'] % len(packets)]
+    results.add('patterns', 'create_stimulation_pattern', {'cache': 'miss'}, lambda: uncached.pattern(*next_packet()))
+    results.add('patterns', 'create_stimulation_pattern', {'cache': 'hit'}, lambda: cached.pattern(*next_packet()))
+
+def benchmark_end_to_end(results, ticks=END_TO_END_TICKS):
+    """
+    The live loop in one process, one packet per 50 Hz tick: decode, buffer, incremental engines, analysis,
+    JSON round trip, policy, pattern and frame encoding. The synthetic source runs ahead, so this is the
+    compute time per tick without the waits between ticks.
+    """
+    source = A.oscillation_source(packet_size=2 * PACKET_SIZE, seed=1)
+    a_socket, b_socket = pair_sockets('benchmark-loop-samples')
+    e_socket, f_socket = pair_sockets('benchmark-loop-frames')
+    window_stats = SlidingWindowStats(B.NUM_CHANNELS, B.BUFFER_SIZE)
+    plv_engine = PhaseLockingEngine(B.NUM_CHANNELS, B.BUFFER_SIZE, fs=B.FS)
+    spectrum = StreamingWelch(B.NUM_CHANNELS, B.BUFFER_SIZE, fs=B.FS, nperseg=B.PSD_NPERSEG)
+    emd_stage = EMDStage(B.NUM_CHANNELS, fs=B.FS, max_imfs=B.EMD_MAX_IMFS, max_sifts=B.EMD_MAX_SIFTS, processes=B.EMD_PROCESSES)
+    scheduler = FeatureScheduler(B.build_feature_registry(), tick_rate=B.TICK_RATE)
+    policy = FeaturesToGameAction().policy
+    patterns = PatternGenerator(constant_tables(128), constant_tables(127))
+    frame_sender = FrameSender(e_socket, mode='rle')
+
+    # Fill the window first; the loop only analyzes full windows
+    while not window_stats.is_full():
+        scaled = B.scale_data(next(source).T)
+        B.buffer_data(scaled, window_stats)
+        plv_engine.update(scaled)
+        spectrum.update(scaled)
+
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(ticks):
+            a_socket.send(A.encode_packet(next(source)))
+            start = time.perf_counter()
+            scaled = B.scale_data(B.receive_neural_data(b_socket))
+            buffer = B.buffer_data(scaled, window_stats)
+            plv_engine.update(scaled)
+            spectrum.update(scaled)
+            message = json.dumps(B.analyze_signals(buffer, plv_engine, window_stats, spectrum, scheduler, emd_stage))
+            actions = policy.evaluate(json.loads(message))
+            frame_sender.send(patterns.pattern(len(actions) * 16 % 256, int(window_stats.rms().mean() * 255) % 256))
+            f_socket.recv_multipart(copy=False)
+            latencies.append(time.perf_counter() - start)
+    emd_stage.close()
+    stats = distribution(latencies)
+    results.add('end_to_end', 'loop_tick', {'tick_rate': B.TICK_RATE, 'packet_size': 2 * PACKET_SIZE}, stats=stats,
+                sustained_tick_rate=1.0 / stats['p99_s'],  # 99 % of ticks fit in the period at this rate, the median says little
+                over_period=float(np.mean(np.asarray(latencies) > 1.0 / B.TICK_RATE)))  # Ticks that overran the live period
+    for socket in (a_socket, b_socket, e_socket, f_socket):
+        socket.close()
+
+def main():
+    # python benchmark.py [baseline.json]; results go to benchmark_results/ and are compared with the baseline if one is given
+    results = BenchmarkResults()
+    benchmark_decode(results)
+    benchmark_buffering(results)
+    benchmark_features(results)
+    benchmark_serialization(results)
+    benchmark_policy(results)
+    benchmark_patterns(results)
+    benchmark_end_to_end(results)
+    path = results.write()
+    print(f"Results written to {path}")
+    if len(sys.argv) > 1:
+        compare(sys.argv[1], results.records)
+
+if __name__ == "__main__":
+    main()
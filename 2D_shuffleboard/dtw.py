@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def dtw_distance(x, y, band=None):
+    """
+    Dynamic time warping distance between scalar series with a Sakoe-Chiba band, batched over leading axes.
+
+    x has shape (..., n) and y shape (..., m); leading axes broadcast, so one call can compare every
+    channel against a reference. The local cost is |x[i] - y[j]| (the euclidean distance used with
+    fastdtw for scalar series) and cell (i, j) is allowed when it lies within `band` samples of the
+    diagonal from (0, 0) to (n - 1, m - 1). band=None means no constraint (exact DTW).
+
+    The recurrence D[i, j] = cost[i, j] + min(D[i-1, j], D[i, j-1], D[i-1, j-1]) is evaluated one
+    anti-diagonal at a time: every cell of an anti-diagonal only depends on the two previous ones,
+    so each step is a handful of NumPy operations over all series and band cells at once.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n, m = x.shape[-1], y.shape[-1]
+    batch_shape = np.broadcast_shapes(x.shape[:-1], y.shape[:-1])
+    x = np.broadcast_to(x, batch_shape + (n,))
+    y = np.broadcast_to(y, batch_shape + (m,))
+    if n == 1 or m == 1:
+        # Every sample of the longer series has to match the single sample of the other one
+        return np.abs(x[..., :, np.newaxis] - y[..., np.newaxis, :]).sum(axis=(-2, -1))
+
+    band = max(n, m) if band is None else max(int(band), 1)
+    # Band test |i * (m - 1) - j * (n - 1)| <= radius, i.e. distance to the diagonal scaled to the longer axis
+    radius = band * max(n - 1, m - 1)
+    span = n + m - 2
+
+    # Three rotating anti-diagonals indexed by i + 1, with inf borders standing in for cells outside the band
+    diagonals = [np.full(batch_shape + (n + 2,), np.inf) for _ in range(3)]
+    diagonals[0][..., 1] = np.abs(x[..., 0] - y[..., 0])
+
+    for d in range(1, n + m - 1):
+        previous2, previous1, current = diagonals[(d - 2) % 3], diagonals[(d - 1) % 3], diagonals[d % 3]
+        lo = max(0, d - m + 1, -(-(d * (n - 1) - radius) // span))
+        hi = min(n - 1, d, (d * (n - 1) + radius) // span)
+
+        i = slice(lo + 1, hi + 2)  # Cells (i, d - i) for i in [lo, hi], in padded indexing
+        cost = np.abs(x[..., lo:hi + 1] - y[..., d - hi:d - lo + 1][..., ::-1])
+        best = np.minimum(np.minimum(previous1[..., lo:hi + 1], previous1[..., i]), previous2[..., lo:hi + 1])
+        current[..., i] = cost + best
+        # Cells just outside this anti-diagonal's range are read by the next two; keep them at inf
+        current[..., lo] = np.inf
+        current[..., hi + 2] = np.inf
+
+    return diagonals[(n + m - 2) % 3][..., n]
+
+
+def warping_factors(signals, band=None):
+    """
+    DTW distance from every channel to the channel mean, in one batched call.
+    signals has shape (..., channels, samples); band defaults to 10% of the window.
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    average_signal = signals.mean(axis=-2, keepdims=True)
+    if band is None:
+        band = max(signals.shape[-1] // 10, 1)
+    return dtw_distance(signals, average_signal, band)
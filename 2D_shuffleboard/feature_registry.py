@@ -0,0 +1,238 @@
+import math
+import time
+
+import numpy as np
+
+
+class Feature:
+    """
+    A registered feature: how to compute it, which shared intermediates it needs and what it costs.
+
+    compute is called with one positional argument per name in inputs, in order. cost is a relative
+    estimate used to order degradation, budget is an optional per-feature time limit in seconds and
+    output_shape names the axes of the result, e.g. ('channels',) or ('channels', 'bands'). rate is
+    the publishing rate in Hz; None means every scheduler tick.
+    """
+    def __init__(self, name, compute, inputs=('raw',), cost=1.0, output_shape=('channels',), enabled=True, budget=None, rate=None):
+        self.name = name
+        self.compute = compute
+        self.inputs = tuple(inputs)
+        self.cost = cost
+        self.output_shape = tuple(output_shape)
+        self.enabled = enabled
+        self.budget = budget
+        self.rate = rate
+
+        # Scheduling state, owned by FeatureScheduler
+        self.interval = 1  # Slow-down factor applied on top of the rate, reusing the last value in between
+        self.phase = 0  # Tick within the period the feature runs on, so slow features do not all run on the same tick
+        self.latency = None  # Exponentially weighted mean of the measured compute time in seconds
+        self.last_value = None
+        self.last_run = None  # Update counter of the last run
+        self.timestamp = None  # Wall-clock time (time.time()) the last value was computed
+        self.disabled_reason = None
+
+
+class FeatureRegistry:
+    """
+    Named features plus the providers of the intermediates they share (raw signals, PSD, analytic signal, ...).
+    """
+    def __init__(self):
+        self.features = {}
+        self.providers = {}
+
+    def register(self, name, compute, inputs=('raw',), cost=1.0, output_shape=('channels',), enabled=True, budget=None, rate=None):
+        self.features[name] = Feature(name, compute, inputs, cost, output_shape, enabled, budget, rate)
+        return self.features[name]
+
+    def register_input(self, name, provider, inputs=('raw',)):
+        # provider is called with the listed inputs, like a feature, and its result is shared by every consumer
+        self.providers[name] = (provider, tuple(inputs))
+
+    def enable(self, *names):
+        for name in names:
+            self.features[name].enabled = True
+            self.features[name].interval = 1
+            self.features[name].disabled_reason = None
+
+    def disable(self, *names):
+        for name in names:
+            self.features[name].enabled = False
+
+    def enabled_features(self):
+        return [feature for feature in self.features.values() if feature.enabled]
+
+
+class FeatureScheduler:
+    """
+    Runs the enabled features of a registry on each update (tick).
+
+    With tick_rate set, each run() is one tick of a fixed-rate loop and a feature with a rate runs
+    every round(tick_rate / rate) ticks, so cheap features are refreshed at a high rate while
+    expensive ones run at their own, lower rate. Shared intermediates are computed lazily, at most
+    once per update and only if a feature that runs needs them. Per-feature latency is measured on
+    every run. A feature whose latency exceeds its own budget, or the largest contributor when the
+    expected time per update (sum of latency / period) exceeds update_budget, has its rate halved
+    (interval doubled); past max_interval it is switched off. Skipped features keep publishing their
+    last value together with the time it was computed, or None until their first run.
+
+    Each feature runs on the ticks where (tick - phase) is a multiple of its period. Phases are
+    assigned most expensive feature first, each to the phase whose busiest tick is least loaded, so
+    the 1 Hz and 10 Hz features are spread over the ticks instead of all landing on one. Declared
+    costs are used until every feature has a measured latency, then the phases are reassigned with
+    the latencies and the busiest tick is checked against update_budget.
+
+    With skipped_ticks set, update_count may jump over ticks (a feature worker only computes the
+    newest tick it was handed), so a phase tick can be missed every time. A feature is then due on
+    its first tick at or after its phase and from there on once a period has passed since its last run.
+    """
+    def __init__(self, registry, update_budget=None, max_interval=16, smoothing=0.2, tick_rate=None, skipped_ticks=False):
+        self.registry = registry
+        self.skipped_ticks = skipped_ticks
+        self.update_budget = update_budget
+        self.tick_rate = tick_rate
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.update_count = 0
+        self.last_update_time = 0.0
+        self.tick_costs = None  # Expected cost of each tick of the current phase assignment, over one cycle of all periods
+        self.assigned_periods = None  # Period of every enabled feature when the phases were assigned
+        self.measured_phases = False  # Phases assigned from measured latencies rather than declared costs
+
+    def run(self, **live_inputs):
+        """
+        Computes all due features. live_inputs seeds the intermediates (e.g. raw=signals, psd=spectrum)
+        so that state maintained by the live loop is used instead of being recomputed.
+        """
+        intermediates = dict(live_inputs)
+        results = {}
+        start = time.perf_counter()
+        if self.assigned_periods != self.periods():
+            self.assign_phases()  # First run, or a feature was slowed down, enabled or disabled
+
+        for feature in self.registry.enabled_features():
+            if self.is_due(feature):
+                args = [self.resolve(name, intermediates) for name in feature.inputs]
+                feature_start = time.perf_counter()
+                feature.last_value = feature.compute(*args)
+                self.record_latency(feature, time.perf_counter() - feature_start)
+                feature.last_run = self.update_count
+                feature.timestamp = time.time()
+            results[feature.name] = feature.last_value
+
+        self.last_update_time = time.perf_counter() - start
+        self.enforce_budgets()
+        self.update_count += 1
+        return results
+
+    def is_due(self, feature):
+        if not self.skipped_ticks:
+            return (self.update_count - feature.phase) % self.period(feature) == 0
+        if feature.last_run is None:
+            return self.update_count >= feature.phase
+        return self.update_count - feature.last_run >= self.period(feature)
+
+    def period(self, feature):
+        # Ticks between runs: the feature's own rate, slowed down by its degradation interval
+        ticks = 1
+        if self.tick_rate is not None and feature.rate is not None:
+            ticks = max(int(round(self.tick_rate / feature.rate)), 1)
+        return ticks * feature.interval
+
+    def periods(self):
+        return {feature.name: self.period(feature) for feature in self.registry.enabled_features()}
+
+    def assign_phases(self):
+        features = self.registry.enabled_features()
+        measured = all(feature.latency is not None for feature in features)
+        periods = self.periods()
+        tick_costs = np.zeros(math.lcm(*periods.values()) if periods else 1)
+        for feature in sorted(features, key=lambda f: -(f.latency if measured else f.cost)):
+            # Column k of the (cycles, period) view holds the ticks of phase k
+            by_phase = tick_costs.reshape(-1, periods[feature.name])
+            feature.phase = int(np.argmin(by_phase.max(axis=0)))
+            by_phase[:, feature.phase] += feature.latency if measured else feature.cost
+        self.tick_costs = tick_costs
+        self.assigned_periods = periods
+        self.measured_phases = measured
+        return tick_costs
+
+    def check_tick_budget(self):
+        # Expected time of the busiest tick; prints the features that share it when it is over update_budget
+        busiest = int(np.argmax(self.tick_costs))
+        if self.update_budget is not None and self.tick_costs[busiest] > self.update_budget:
+            names = [feature.name for feature in self.registry.enabled_features()
+                     if (busiest - feature.phase) % self.period(feature) == 0]
+            print(f"Busiest tick expected to take {self.tick_costs[busiest] * 1e3:.2f} ms, budget "
+                  f"{self.update_budget * 1e3:.2f} ms: {', '.join(names)}")
+        return self.tick_costs[busiest]
+
+    def timestamps(self):
+        # When each published value was computed, so consumers can tell fresh values from held ones
+        return {feature.name: feature.timestamp for feature in self.registry.enabled_features()}
+
+    def resolve(self, name, intermediates):
+        if name not in intermediates:
+            if name not in self.registry.providers:
+                raise KeyError(f"No provider registered for feature input '{name}'")
+            provider, inputs = self.registry.providers[name]
+            intermediates[name] = provider(*[self.resolve(dependency, intermediates) for dependency in inputs])
+        return intermediates[name]
+
+    def record_latency(self, feature, elapsed):
+        if feature.latency is None:
+            feature.latency = elapsed
+        else:
+            feature.latency += self.smoothing * (elapsed - feature.latency)
+
+    def enforce_budgets(self):
+        if not self.measured_phases and all(feature.latency is not None for feature in self.registry.enabled_features()):
+            self.assign_phases()
+            self.check_tick_budget()
+
+        for feature in self.registry.enabled_features():
+            if feature.budget is not None and feature.latency is not None and feature.latency > feature.budget:
+                self.degrade(feature, f"latency {feature.latency * 1e3:.2f} ms over budget {feature.budget * 1e3:.2f} ms")
+
+        if self.update_budget is not None:
+            # Amortized over intervals, so updates where several slow features coincide do not trigger on their own
+            candidates = [feature for feature in self.registry.enabled_features() if feature.latency is not None]
+            expected_time = sum(feature.latency / self.period(feature) for feature in candidates)
+            if expected_time > self.update_budget:
+                # Slow down the feature that costs the most per update at its current rate
+                feature = max(candidates, key=lambda f: (f.latency / self.period(f), f.cost))
+                self.degrade(feature, f"expected {expected_time * 1e3:.2f} ms per update, budget {self.update_budget * 1e3:.2f} ms")
+
+    def degrade(self, feature, reason):
+        if feature.interval * 2 > self.max_interval:
+            feature.enabled = False
+            feature.disabled_reason = reason
+            print(f"Feature '{feature.name}' disabled: {reason}")
+        else:
+            feature.interval *= 2
+            print(f"Feature '{feature.name}' now runs every {feature.interval} updates: {reason}")
+
+    def report(self):
+        return {
+            name: {
+                'enabled': feature.enabled,
+                'interval': feature.interval,
+                'phase': feature.phase,
+                'rate': feature.rate,
+                'latency_ms': None if feature.latency is None else feature.latency * 1e3,
+                'cost': feature.cost,
+                'disabled_reason': feature.disabled_reason,
+            }
+            for name, feature in self.registry.features.items()
+        }
+
+
+def to_serializable(value):
+    # Feature outputs go out as JSON, so arrays become nested lists
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: to_serializable(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,166 @@
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+FEATURE_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_store')  # One subdirectory per session, beside the scripts whatever the working directory
+BATCH_SIZE = 250  # Feature messages per chunk, 5 s at the 50 Hz tick rate of B
+MAX_PENDING_BATCHES = 16  # Batches waiting for the writer before new ones are dropped
+CHUNK_NAME = re.compile(r'chunk_(\d+)_(\d+)_(\d+)\.npz$')  # Index, first and last message time in ns
+
+
+def flatten_features(message, prefix=''):
+    # Dict-valued features become one column per entry, e.g. 'empirical_mode_decomposition.imf_energy'
+    # and 'timestamps.rms' for the compute time B sends along with every feature; per-channel dicts
+    # such as the peak properties become one per-channel column per key, e.g. 'peaks.peak_count'.
+    # Features without a value yet (None before their first run) are left out, their rows become NaN
+    columns = {}
+    for name, value in message.items():
+        if value is None:
+            continue
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            value = {key: [item.get(key) for item in value] for key in value[0]}
+        if isinstance(value, dict):
+            columns.update(flatten_features(value, f"{prefix}{name}."))
+        else:
+            columns[prefix + name] = value
+    return columns
+
+def batch_columns(times, messages):
+    """
+    Column arrays of a batch of feature messages: 'time' (seconds since the epoch) and one float64 array
+    per feature of shape (messages, *feature shape), e.g. (messages, channels) or (messages, channels, channels).
+    The first message that has a feature sets its shape; rows without the feature or with another shape are NaN.
+    Values that are not numeric, and features that have no value in any message of the batch, are left out.
+    """
+    rows = [flatten_features(message) for message in messages]
+    columns = {'time': np.asarray(times, dtype=np.float64)}
+    for name in dict.fromkeys(name for row in rows for name in row):
+        values = [row.get(name) for row in rows]
+        shape = next((np.shape(value) for value in values if value is not None), None)
+        if shape is None:
+            continue
+        column = np.full((len(rows),) + shape, np.nan)
+        try:
+            for i, value in enumerate(values):
+                if value is not None and np.shape(value) == shape:
+                    column[i] = value
+        except (TypeError, ValueError):
+            continue
+        columns[name] = column
+    return columns
+
+def write_chunk(directory, index, columns):
+    # Written under a temporary name and renamed, so a reader never sees half a chunk
+    start_ns, stop_ns = (int(t * 1e9) for t in (columns['time'][0], columns['time'][-1]))
+    path = os.path.join(directory, f"chunk_{index:06d}_{start_ns}_{stop_ns}.npz")
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as chunk_file:
+        np.savez(chunk_file, **columns)
+    os.replace(temporary, path)
+    return path
+
+def session_chunks(root, session):
+    # (index, start, stop, path) of every chunk of a session in write order, times in seconds
+    directory = os.path.join(root, session)
+    chunks = []
+    for name in os.listdir(directory):
+        match = CHUNK_NAME.match(name)
+        if match:
+            index, start_ns, stop_ns = (int(group) for group in match.groups())
+            chunks.append((index, start_ns / 1e9, stop_ns / 1e9, os.path.join(directory, name)))
+    return sorted(chunks)
+
+
+class FeatureStore:
+    """
+    Persists every feature message of a session as chunked columnar arrays for offline analysis.
+
+    append() only keeps a reference to the message; every batch_size messages the batch is handed to
+    a writer thread, which converts it to columns and writes one .npz chunk per batch under
+    root/session/. The chunk's time range is in its file name, so range queries open only the chunks
+    they need. The hand-off never waits: when max_pending batches are already queued (a stalled disk)
+    the batch is dropped and counted instead of blocking the live loop.
+    """
+    def __init__(self, root=FEATURE_STORE_DIR, session=None, batch_size=BATCH_SIZE, max_pending=MAX_PENDING_BATCHES):
+        self.session = session or time.strftime('%Y%m%d-%H%M%S')
+        self.directory = os.path.join(root, self.session)
+        os.makedirs(self.directory, exist_ok=True)
+        self.batch_size = batch_size
+        self.times = []
+        self.messages = []
+        self.chunks = len(session_chunks(root, self.session))  # Appending to an existing session continues its numbering
+        self.dropped = 0  # Messages lost because the writer fell behind
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.writer = threading.Thread(target=self.write_batches, name='feature-store', daemon=True)
+        self.writer.start()
+
+    def append(self, message, timestamp=None):
+        # message is the dict analyze_signals returns; it must not be modified after this call
+        self.times.append(time.time() if timestamp is None else timestamp)
+        self.messages.append(message)
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.messages:
+            return
+        try:
+            self.pending.put_nowait((self.chunks, self.times, self.messages))
+            self.chunks += 1
+        except queue.Full:
+            self.dropped += len(self.messages)
+            print(f"Feature store writer is behind, dropped {self.dropped} messages so far")
+        self.times, self.messages = [], []
+
+    def write_batches(self):
+        while True:
+            batch = self.pending.get()
+            if batch is None:
+                return
+            index, times, messages = batch
+            try:
+                write_chunk(self.directory, index, batch_columns(times, messages))
+            except Exception as e:
+                print(f"Error writing feature chunk {index}: {e}")
+
+    def close(self):
+        # Writes the partial batch and waits for the writer to finish
+        self.flush()
+        self.pending.put(None)
+        self.writer.join()
+
+
+def list_sessions(root=FEATURE_STORE_DIR):
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+def read_features(session, start=None, stop=None, columns=None, root=FEATURE_STORE_DIR):
+    """
+    Feature messages of `session` with start <= time <= stop (seconds since the epoch, None for open ends)
+    as a dict of arrays: 'time' and every column, or only those in `columns`, each (messages, *feature shape).
+    A column missing from some chunks is NaN for their messages.
+    """
+    chunks = [chunk for chunk in session_chunks(root, session)
+              if (start is None or chunk[2] >= start) and (stop is None or chunk[1] <= stop)]
+    parts = []
+    for _, _, _, path in chunks:
+        with np.load(path) as chunk:
+            times = chunk['time']
+            first = 0 if start is None else np.searchsorted(times, start, side='left')
+            last = len(times) if stop is None else np.searchsorted(times, stop, side='right')
+            names = ['time'] + [name for name in chunk.files if name != 'time' and (columns is None or name in columns)]
+            parts.append({name: chunk[name][first:last] for name in names})
+
+    result = {'time': np.concatenate([part['time'] for part in parts]) if parts else np.empty(0)}
+    names = dict.fromkeys(name for part in parts for name in part if name != 'time')
+    for name in names:
+        shapes = {part[name].shape[1:] for part in parts if name in part}
+        if len(shapes) > 1:
+            raise ValueError(f"Unexpected data shape: {name} has shapes {sorted(shapes)} in session {session}.")
+        shape = shapes.pop()
+        result[name] = np.concatenate([part[name] if name in part else np.full((len(part['time']),) + shape, np.nan)
+                                       for part in parts])
+    return result
@@ -0,0 +1,252 @@
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from emd_features import EMDStage
+from feature_registry import FeatureScheduler, to_serializable
+
+
+class SharedRingBuffer:
+    """
+    (channels, capacity) sample ring in shared memory, written by one process and read by many.
+
+    Like SlidingWindowStats, every sample is stored twice (at i and i + capacity) so any window of up
+    to `capacity` samples is one contiguous slice and readers get a view without copying. The block
+    starts with an int64 count of samples written so far. capacity is larger than the analysis window
+    so a window handed to a worker stays intact for capacity - window_size more samples; readers
+    check is_valid() after computing to detect a window that was overwritten meanwhile.
+    """
+    HEADER_BYTES = 8
+
+    def __init__(self, num_channels, window_size, capacity=None, dtype=np.float32, name=None):
+        self.num_channels = num_channels
+        self.window_size = window_size
+        self.capacity = capacity if capacity is not None else 2 * window_size
+        if self.capacity < window_size:
+            raise ValueError("capacity must be at least window_size")
+        self.dtype = np.dtype(dtype)
+
+        size = self.HEADER_BYTES + num_channels * 2 * self.capacity * self.dtype.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.header = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.samples = np.ndarray((num_channels, 2 * self.capacity), dtype=self.dtype, buffer=self.shm.buf, offset=self.HEADER_BYTES)
+        if self.owner:
+            self.header[0] = 0
+
+    def spec(self):
+        # Everything another process needs to attach to the same block
+        return (self.num_channels, self.window_size, self.capacity, self.dtype.str, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        num_channels, window_size, capacity, dtype, name = spec
+        return cls(num_channels, window_size, capacity, dtype, name)
+
+    @property
+    def total_samples(self):
+        return int(self.header[0])
+
+    def append(self, new_samples):
+        """
+        Writes a (channels, n) block; the sample count is published after the data so readers never see unwritten samples.
+        """
+        new_samples = np.asarray(new_samples)
+        if new_samples.ndim != 2 or new_samples.shape[0] != self.num_channels:
+            raise ValueError(f"Unexpected data shape: {new_samples.shape}. Expected ({self.num_channels}, number_of_samples).")
+        new_samples = new_samples[:, -self.capacity:]
+        total = self.total_samples
+        write = (total + np.arange(new_samples.shape[1])) % self.capacity
+        self.samples[:, write] = new_samples
+        self.samples[:, write + self.capacity] = new_samples
+        self.header[0] = total + np.shape(new_samples)[1]
+
+    def is_full(self):
+        return self.total_samples >= self.window_size
+
+    def window(self, end_index=None):
+        # View of the window_size samples ending just before end_index, oldest first
+        end_index = self.total_samples if end_index is None else end_index
+        start = (end_index - self.window_size) % self.capacity
+        return self.samples[:, start:start + self.window_size]
+
+    def is_valid(self, end_index):
+        # The window ending at end_index has not been overwritten by newer samples
+        return self.total_samples - end_index <= self.capacity - self.window_size
+
+    def close(self):
+        self.header = None
+        self.samples = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def shared_inputs(registry, feature):
+    # Intermediates a feature needs, including those its providers read, except the raw window every feature has
+    names = set()
+    pending = list(feature.inputs)
+    while pending:
+        name = pending.pop()
+        if name in registry.providers and name not in names:
+            names.add(name)
+            pending.extend(registry.providers[name][1])
+    return names
+
+def feature_groups(registry):
+    # Enabled features that share an intermediate, directly or through another feature, end up in one group
+    groups = []
+    for feature in registry.enabled_features():
+        inputs = shared_inputs(registry, feature)
+        joined = [group for group in groups if group[1] & inputs]
+        for group in joined:
+            groups.remove(group)
+        groups.append(([feature] + [member for group in joined for member in group[0]],
+                       inputs.union(*[group[1] for group in joined])))
+    return [members for members, _ in groups]
+
+def assign_features(registry, num_workers, tick_rate=None, slow_rate=None):
+    """
+    Splits the enabled features over workers. Features that share an intermediate (window statistics,
+    PSD, analytic signal) stay on one worker, so each intermediate is computed by a single worker.
+    With slow_rate set and more than one worker, groups whose features all run at slow_rate or below
+    get the workers other than the first, packed largest cost first onto the least loaded one, so an
+    expensive slow feature such as EMD never holds up the features due on every tick. The rest share
+    the first worker. Otherwise groups are packed by expected load (cost x rate).
+    """
+    def load(feature):
+        rate = feature.rate if feature.rate is not None else (tick_rate or 1.0)
+        return feature.cost * rate
+
+    def is_slow(group):
+        return slow_rate is not None and all(feature.rate is not None and feature.rate <= slow_rate for feature in group)
+
+    groups = feature_groups(registry)
+    slow = [group for group in groups if is_slow(group)] if num_workers > 1 else []
+    fast = [group for group in groups if group not in slow]
+    if slow:
+        # One worker for the fast groups, the others for the slow ones; spare workers go back to the fast side
+        slow_workers = min(num_workers - 1, len(slow))
+        packing = [(fast, lambda group: sum(load(feature) for feature in group), num_workers - slow_workers),
+                   (slow, lambda group: sum(feature.cost for feature in group), slow_workers)]
+    else:
+        packing = [(groups, lambda group: sum(load(feature) for feature in group), num_workers)]
+
+    assignments = []
+    for side, weight, workers in packing:
+        names = [[] for _ in range(workers)]
+        loads = [0.0] * workers
+        for group in sorted(side, key=weight, reverse=True):
+            worker = loads.index(min(loads))
+            names[worker].extend(feature.name for feature in group)
+            loads[worker] += weight(group)
+        assignments.extend(names)
+    return assignments
+
+def worker_loop(ring_spec, registry_factory, feature_names, tasks, results, update_budget=None, tick_rate=None, fs=500):
+    """
+    Runs in a worker process: computes its share of the features on the shared window for each tick.
+    Only the newest queued tick is computed, so a slow worker drops ticks instead of falling behind;
+    its scheduler then runs a feature once a period has passed since its last run rather than on
+    exact phase ticks, which a worker busy with EMD would keep skipping.
+    """
+    ring = SharedRingBuffer.attach(ring_spec)
+    registry = registry_factory()
+    for feature in registry.features.values():
+        if feature.name not in feature_names:
+            feature.enabled = False
+    scheduler = FeatureScheduler(registry, update_budget=update_budget, tick_rate=tick_rate, skipped_ticks=True)
+    emd_stage = EMDStage(ring.num_channels, fs=fs)  # Serial, the worker itself is the parallelism
+
+    try:
+        while True:
+            task = tasks.get()
+            try:
+                while task is not None:
+                    task = tasks.get_nowait()
+            except queue.Empty:
+                pass
+            if task is None:
+                break
+
+            tick, end_index = task
+            signals = ring.window(end_index)
+            scheduler.update_count = tick  # Worker ticks follow the receiver's, including the dropped ones
+            features = scheduler.run(raw=signals, emd=emd_stage)
+
+            if not ring.is_valid(end_index):
+                print(f"Worker dropped tick {tick}: window was overwritten during computation")
+                continue
+            computed = {name: to_serializable(features[name]) for name in feature_names
+                        if registry.features[name].enabled and registry.features[name].last_run == tick}
+            results.put((tick, computed, scheduler.timestamps()))
+    finally:
+        ring.close()
+
+
+class FeatureWorkerPool:
+    """
+    Multiprocess feature extraction: the receiving process appends samples to a SharedRingBuffer and
+    calls tick(); num_workers processes each compute their share of the registry's features on the
+    shared window, the slow ones on workers of their own (see assign_features). collect() merges
+    whatever results have arrived into the latest value of every feature, so fast features are not
+    held back by a worker busy with a slow one.
+    """
+    def __init__(self, registry_factory, num_channels, window_size, num_workers=2, update_budget=None, tick_rate=None, fs=500,
+                 capacity=None, slow_rate=None):
+        self.ring = SharedRingBuffer(num_channels, window_size, capacity=capacity)
+        self.assignments = assign_features(registry_factory(), num_workers, tick_rate, slow_rate)
+        self.results = multiprocessing.Queue()
+        self.tasks = []
+        self.workers = []
+        for feature_names in self.assignments:
+            tasks = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=worker_loop, daemon=True,
+                                             args=(self.ring.spec(), registry_factory, feature_names, tasks, self.results,
+                                                   update_budget, tick_rate, fs))
+            worker.start()
+            self.tasks.append(tasks)
+            self.workers.append(worker)
+
+        self.tick_count = 0
+        self.latest = {}  # Feature name -> last value received
+        self.timestamps = {}
+
+    def append(self, new_samples):
+        self.ring.append(new_samples)
+
+    def is_full(self):
+        return self.ring.is_full()
+
+    def tick(self):
+        # Hands the current window to every worker; only the end index crosses the process boundary
+        end_index = self.ring.total_samples
+        for tasks in self.tasks:
+            tasks.put((self.tick_count, end_index))
+        self.tick_count += 1
+
+    def collect(self):
+        """
+        Merges the results received so far; returns the latest value of every feature plus its 'timestamps'.
+        """
+        while True:
+            try:
+                _, computed, timestamps = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.latest.update(computed)
+            self.timestamps.update({name: timestamps[name] for name in computed})
+        results = dict(self.latest)
+        results['timestamps'] = dict(self.timestamps)
+        return results
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.ring.close()
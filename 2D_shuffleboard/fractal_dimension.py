@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def calculate_higuchi_fractal_dimension(signals, k_max):
+    # Works on the last axis, so (channels, samples) and (windows, channels, samples) both go through in one call
+    x = np.asarray(signals, dtype=np.float64)
+    N = x.shape[-1]
+    ks = np.arange(1, k_max + 1)
+    L = np.empty(x.shape[:-1] + (k_max,))
+
+    for k in ks:
+        # Lag-k absolute increments |x[m + i*k] - x[m + (i-1)*k]|; offset m lands in column j % k
+        increments = np.abs(x[..., k:] - x[..., :-k])
+        rows, remainder = divmod(increments.shape[-1], k)
+        # Summing the (rows, k) view over rows with a ones-vector product is much faster than .sum(axis=-2)
+        Lkm_sum = np.ones(rows) @ increments[..., :rows * k].reshape(x.shape[:-1] + (rows, k))
+        Lkm_sum[..., :remainder] += increments[..., rows * k:]  # Trailing increments for the first offsets
+
+        # Number of increments for each offset m, same as max_index - 1 in the loop formulation
+        counts = np.maximum((N - np.arange(k) - 1) // k, 0)
+        Lkm = np.divide(Lkm_sum * (N - 1), k * counts, out=np.zeros_like(Lkm_sum), where=counts > 0)
+        Lk = Lkm.mean(axis=-1)
+
+        # Fall back to machine epsilon where the mean curve length is not positive
+        L[..., k - 1] = np.log(Lk, out=np.full_like(Lk, np.log(np.finfo(float).eps)), where=Lk > 0)
+
+    # Least-squares slope of the log-log plot for every channel at once (same fit as np.polyfit(..., 1)[0])
+    log_k = np.log(ks)
+    log_k_centered = log_k - log_k.mean()
+    hfd_values = (L - L.mean(axis=-1, keepdims=True)) @ log_k_centered / np.dot(log_k_centered, log_k_centered)
+
+    # Channels whose log curve lengths are not all finite get NaN to indicate failure
+    hfd_values = np.where(np.all(np.isfinite(L), axis=-1), hfd_values, np.nan)
+
+    return hfd_values
@@ -0,0 +1,123 @@
+import struct
+
+import numpy as np
+import zmq
+
+# Multipart message: header, then the mode's payload parts
+HEADER = struct.Struct('<4sBBIHHI')  # Magic, mode, axis, frame index, height, width, count
+MAGIC = b'OPTF'
+RAW, DELTA, RLE = 0, 1, 2
+MODES = {'raw': RAW, 'delta': DELTA, 'rle': RLE}
+ROWS, COLUMNS = 0, 1
+
+
+def run_length_encode(frame):
+    # (values, lengths) of the runs of equal pixels in row-major order
+    flat = frame.ravel()
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    lengths = np.diff(np.append(starts, flat.size)).astype(np.uint32)
+    return flat[starts], lengths
+
+
+class FrameSender:
+    """
+    Sends uint8 stimulation frames as binary multipart messages.
+
+    'raw' sends the frame buffer itself without copying. 'delta' sends only the rows or the columns
+    (whichever is smaller) that changed since the previous frame, with a full keyframe every
+    keyframe_interval frames and whenever a delta would not be smaller, so a subscriber that joins
+    late or drops a message recovers. 'rle' run-length encodes every frame, which suits the banded
+    patterns of the 2D stage.
+    """
+    def __init__(self, socket, mode='raw', keyframe_interval=100):
+        if mode not in MODES:
+            raise ValueError(f"Unknown frame mode: {mode}. Expected one of {list(MODES)}.")
+        self.socket = socket
+        self.mode = MODES[mode]
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.index = 0
+
+    def send(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        height, width = frame.shape
+        if self.mode == RLE:
+            values, lengths = run_length_encode(frame)
+            parts = [HEADER.pack(MAGIC, RLE, 0, self.index, height, width, values.size), values, lengths]
+        elif self.mode == DELTA and self.previous is not None and self.index % self.keyframe_interval:
+            parts = self.delta_parts(frame)
+        else:
+            parts = [HEADER.pack(MAGIC, RAW, 0, self.index, height, width, 0), frame]
+
+        self.socket.send_multipart(parts, copy=False)
+        if self.mode == DELTA:
+            # Keep our own copy, the caller may reuse or mutate the frame it passed in
+            if self.previous is None or self.previous.shape != frame.shape:
+                self.previous = frame.copy()
+            else:
+                np.copyto(self.previous, frame)
+        self.index += 1
+
+    def delta_parts(self, frame):
+        height, width = frame.shape
+        changed = frame != self.previous
+        rows = np.flatnonzero(changed.any(axis=1)).astype(np.uint16)
+        columns = np.flatnonzero(changed.any(axis=0)).astype(np.uint16)
+        if rows.size * width <= columns.size * height:
+            axis, indices, data = ROWS, rows, frame[rows]
+        else:
+            axis, indices, data = COLUMNS, columns, np.ascontiguousarray(frame[:, columns])
+        if data.size * 2 >= frame.size:
+            return [HEADER.pack(MAGIC, RAW, 0, self.index, height, width, 0), frame]
+        return [HEADER.pack(MAGIC, DELTA, axis, self.index, height, width, indices.size), indices, data]
+
+
+class FrameReceiver:
+    """
+    Rebuilds frames from FrameSender messages. decode() returns the current frame, or None while a
+    delta cannot be applied because the frame it builds on was missed (until the next keyframe).
+    """
+    def __init__(self):
+        self.frame = None
+        self.last_index = None
+        self.missed = 0
+
+    def decode(self, parts):
+        buffers = [part.buffer if isinstance(part, zmq.Frame) else part for part in parts]
+        magic, mode, axis, index, height, width, count = HEADER.unpack(buffers[0])
+        if magic != MAGIC:
+            raise ValueError(f"Unexpected frame header: {bytes(magic)!r}")
+
+        in_sequence = self.last_index is not None and index == self.last_index + 1
+        if self.last_index is not None and not in_sequence:
+            self.missed += 1
+        self.last_index = index
+
+        if self.frame is None or self.frame.shape != (height, width):
+            self.frame = np.zeros((height, width), dtype=np.uint8)
+            in_sequence = False
+
+        if mode == RAW:
+            self.frame[...] = np.frombuffer(buffers[1], dtype=np.uint8).reshape(height, width)
+        elif mode == RLE:
+            values = np.frombuffer(buffers[1], dtype=np.uint8)
+            lengths = np.frombuffer(buffers[2], dtype=np.uint32)
+            self.frame[...] = np.repeat(values, lengths).reshape(height, width)
+        elif mode == DELTA:
+            if not in_sequence:
+                self.last_index = None  # Stay out of sequence until a keyframe arrives
+                return None
+            if count:
+                indices = np.frombuffer(buffers[1], dtype=np.uint16)
+                data = np.frombuffer(buffers[2], dtype=np.uint8)
+                if axis == ROWS:
+                    self.frame[indices] = data.reshape(count, width)
+                else:
+                    self.frame[:, indices] = data.reshape(height, count)
+        else:
+            raise ValueError(f"Unknown frame mode: {mode}")
+        return self.frame
+
+    def receive(self, socket):
+        # Blocks for the next message; the payload is read from zmq's buffers without an extra copy
+        return self.decode(socket.recv_multipart(copy=False))
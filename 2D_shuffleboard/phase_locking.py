@@ -0,0 +1,131 @@
+import numpy as np
+from scipy.signal import butter, hilbert, sosfilt, sosfiltfilt
+
+
+def bandpass_sos(band, fs, order=4):
+    # Second-order sections are numerically safer than (b, a) for the narrow low-frequency bands we use
+    low, high = band
+    return butter(order, [low, high], btype='bandpass', fs=fs, output='sos')
+
+def phasors_from_analytic(analytic_signal):
+    magnitude = np.abs(analytic_signal)
+    # Flat channels have no defined phase, they contribute zero phasors instead of NaN
+    return np.divide(analytic_signal, magnitude, out=np.zeros_like(analytic_signal), where=magnitude > 0)
+
+def plv_from_phasors(phasors):
+    # PLV[i, j] = |mean_t exp(1j * (phase_i(t) - phase_j(t)))| for all pairs in one complex matrix product,
+    # batched over leading axes such as the windows of windowing.sliding_windows
+    return np.abs(phasors @ np.swapaxes(phasors.conj(), -1, -2)) / phasors.shape[-1]
+
+def unit_phasors(signals, fs=500, band=None):
+    """
+    Returns exp(1j * phase) for every channel, taking a single Hilbert transform over all channels.
+    If band is given as (low, high) in Hz, the signals are zero-phase band-pass filtered first.
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    if band is not None:
+        signals = sosfiltfilt(bandpass_sos(band, fs), signals, axis=-1)
+    return phasors_from_analytic(hilbert(signals, axis=-1))
+
+def phase_locking_matrix(signals, fs=500, band=None):
+    """
+    Computes the full channels x channels phase-locking value matrix in one complex matrix product.
+    PLV[i, j] = |mean_t exp(1j * (phase_i(t) - phase_j(t)))|
+    """
+    return plv_from_phasors(unit_phasors(signals, fs, band))
+
+
+class PhaseLockingEngine:
+    """
+    Maintains the PLV matrix of a sliding window incrementally.
+
+    Each new block of samples is turned into unit phasors once, using the last `context` samples
+    as history for the Hilbert transform, and its outer product is added to a running cross-spectrum
+    while the outer product of the evicted phasors is subtracted. The cost per update is
+    O(channels^2 x new samples) instead of O(channels^2 x window) Hilbert transforms per pair.
+    """
+    def __init__(self, num_channels, window_size, fs=500, band=None, context=None, refresh_interval=None):
+        self.num_channels = num_channels
+        self.window_size = window_size
+        self.fs = fs
+        self.band = band
+        self.context = context if context is not None else window_size
+        # Re-summing the cross-spectrum from stored phasors now and then stops add/subtract drift
+        self.refresh_interval = refresh_interval if refresh_interval is not None else window_size
+
+        self.phasors = np.zeros((num_channels, window_size), dtype=np.complex128)  # Ring buffer of unit phasors
+        self.history = np.zeros((num_channels, self.context), dtype=np.float64)  # Recent (filtered) samples
+        self.cross_spectrum = np.zeros((num_channels, num_channels), dtype=np.complex128)
+        self.position = 0  # Next write index into the phasor ring
+        self.count = 0  # Number of valid phasors in the window
+        self.samples_since_refresh = 0
+
+        self.sos = bandpass_sos(band, fs) if band is not None else None
+        if self.sos is not None:
+            # Causal filter state carried across updates, so each sample is filtered exactly once
+            self.filter_state = np.zeros((self.sos.shape[0], num_channels, 2))
+
+    def reset(self):
+        self.phasors[:] = 0
+        self.history[:] = 0
+        self.cross_spectrum[:] = 0
+        self.position = 0
+        self.count = 0
+        self.samples_since_refresh = 0
+        if self.sos is not None:
+            self.filter_state[:] = 0
+
+    def update(self, new_samples):
+        """
+        Adds a (channels, n) block of new samples and returns the updated PLV matrix.
+        """
+        new_samples = np.asarray(new_samples, dtype=np.float64)
+        if new_samples.ndim != 2 or new_samples.shape[0] != self.num_channels:
+            raise ValueError(f"Unexpected data shape: {new_samples.shape}. Expected ({self.num_channels}, number_of_samples).")
+        n = new_samples.shape[1]
+        if n == 0:
+            return self.plv_matrix()
+
+        if self.sos is not None:
+            new_samples, self.filter_state = sosfilt(self.sos, new_samples, axis=-1, zi=self.filter_state)
+
+        # Phase of the new samples estimated with the preceding history as context
+        segment = np.concatenate([self.history, new_samples], axis=1)
+        new_phasors = phasors_from_analytic(hilbert(segment, axis=-1)[:, -n:])
+        self.history = segment[:, -self.context:]
+
+        if n >= self.window_size:
+            # The whole window is replaced, so there is nothing to subtract
+            self.phasors[:] = new_phasors[:, -self.window_size:]
+            self.position = 0
+            self.count = self.window_size
+            self.refresh()
+            return self.plv_matrix()
+
+        indices = (self.position + np.arange(n)) % self.window_size
+        evicted_count = max(self.count + n - self.window_size, 0)
+        if evicted_count > 0:
+            # Oldest phasors first; read before the new block overwrites their slots
+            evicted = self.phasors[:, (self.position - self.count + np.arange(evicted_count)) % self.window_size]
+            self.cross_spectrum -= evicted @ evicted.conj().T
+
+        self.cross_spectrum += new_phasors @ new_phasors.conj().T
+        self.phasors[:, indices] = new_phasors
+        self.position = (self.position + n) % self.window_size
+        self.count = min(self.count + n, self.window_size)
+
+        self.samples_since_refresh += n
+        if self.samples_since_refresh >= self.refresh_interval:
+            self.refresh()
+
+        return self.plv_matrix()
+
+    def refresh(self):
+        # Exact recomputation from the stored phasors (empty slots are zero and contribute nothing)
+        self.cross_spectrum = self.phasors @ self.phasors.conj().T
+        self.samples_since_refresh = 0
+
+    def plv_matrix(self):
+        if self.count == 0:
+            return np.zeros((self.num_channels, self.num_channels))
+        return np.abs(self.cross_spectrum) / self.count
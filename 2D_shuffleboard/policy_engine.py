@@ -0,0 +1,142 @@
+import numpy as np
+
+# Map entries whose B-stage message key differs from the map key
+FEATURE_KEYS = {
+    'peak_counts': 'peaks',
+    'delta': 'delta_band_power',
+    'theta': 'theta_band_power',
+    'alpha': 'alpha_band_power',
+    'beta': 'beta_band_power',
+}
+
+
+def peak_counts(peaks):
+    # 'peaks' is one dict of peak properties per channel
+    return [channel['peak_count'] for channel in peaks]
+
+def mean_phase_locking(plv_matrix):
+    # Average PLV of every channel with all the other channels; the diagonal is always 1
+    plv_matrix = np.asarray(plv_matrix, dtype=np.float64)
+    return (plv_matrix.sum(axis=1) - 1.0) / max(plv_matrix.shape[0] - 1, 1)
+
+def first_imf_energy_fraction(summaries):
+    # Share of each channel's IMF energy held by the first (fastest) IMF
+    energy = np.asarray(summaries['imf_energy'], dtype=np.float64)
+    total = energy.sum(axis=1)
+    return np.divide(energy[:, 0], total, out=np.zeros_like(total), where=total > 0)
+
+# Reductions of features that are not one value per channel to one value per channel
+CHANNEL_REDUCTIONS = {
+    'peak_counts': peak_counts,
+    'phase_synchronization': mean_phase_locking,
+    'empirical_mode_decomposition': first_imf_energy_fraction,
+}
+
+
+def compile_action_map(feature_to_action_map):
+    """
+    Flattens a feature_to_action_map into rules of (map key, message key, action, threshold, direction).
+    Entries are (action, threshold) or (action, threshold, 'below'); nested dicts such as 'band_features' are flattened.
+    """
+    rules = []
+    for name, entry in feature_to_action_map.items():
+        if isinstance(entry, dict):
+            rules.extend(compile_action_map(entry))
+            continue
+        action, threshold = entry[0], entry[1]
+        direction = entry[2] if len(entry) > 2 else 'above'
+        if direction not in ('above', 'below'):
+            raise ValueError(f"Unexpected threshold direction for {name}: {direction}")
+        rules.append((name, FEATURE_KEYS.get(name, name), action, float(threshold), direction))
+    return rules
+
+
+class PolicyEngine:
+    """
+    Evaluates a feature_to_action_map against a whole B-stage feature message at once.
+
+    The map is compiled into a threshold vector and a direction vector with one row per rule, and an
+    (actions, rules) weight matrix that averages the rules of each action. Every message is written
+    into a preallocated (rules, channels) matrix, so comparing every feature of every channel to its
+    threshold is one NumPy expression. The score of a rule is the fraction of channels that cross its
+    threshold, and the score of an action is the weighted sum of its rule scores. Actions switch on
+    when their score reaches `activate` and off when it falls below `release`, so a score that hovers
+    around one level does not make the action flicker. Features missing from a message count as not
+    crossing their threshold.
+    """
+    def __init__(self, feature_to_action_map, num_channels, activate=0.5, release=0.3):
+        if release > activate:
+            raise ValueError(f"Release level {release} is above the activation level {activate}.")
+        self.rules = compile_action_map(feature_to_action_map)
+        self.num_channels = num_channels
+        self.activate = activate
+        self.release = release
+
+        self.actions = list(dict.fromkeys(rule[2] for rule in self.rules))
+        action_index = {action: i for i, action in enumerate(self.actions)}
+        # 'below' rules are negated on both sides, so every comparison is value > threshold
+        signs = np.array([1.0 if rule[4] == 'above' else -1.0 for rule in self.rules])
+        self.signs = signs[:, np.newaxis]
+        self.signed_thresholds = (signs * np.array([rule[3] for rule in self.rules]))[:, np.newaxis]
+        self.weights = np.zeros((len(self.actions), len(self.rules)))
+        for j, rule in enumerate(self.rules):
+            self.weights[action_index[rule[2]], j] = 1.0
+        self.weights /= self.weights.sum(axis=1, keepdims=True)
+        self.channel_weights = self.weights / num_channels  # Turns per-rule crossing counts into channel fractions
+
+        self.values = np.full((len(self.rules), num_channels), np.nan)
+        self.crossed = np.zeros((len(self.rules), num_channels), dtype=bool)
+        self.stamps = [None] * len(self.rules)  # Timestamp of the value loaded into each row
+        self.active = np.zeros(len(self.actions), dtype=bool)  # Hysteresis state of every action
+        self.scores = np.zeros(len(self.actions))
+
+    def load(self, features):
+        """
+        Copies the per-channel value of every rule into the value matrix; missing or malformed features become NaN.
+        Rows whose feature carries the same timestamp as last time are kept, so slow features republished
+        between their runs are not converted again.
+        """
+        timestamps = features.get('timestamps') or {}
+        plain_rows, plain_values = [], []
+        for j, (name, key, _, _, _) in enumerate(self.rules):
+            stamp = timestamps.get(key)
+            if stamp is not None and stamp == self.stamps[j]:
+                continue
+            self.stamps[j] = stamp
+            value = features.get(key)
+            reduce = CHANNEL_REDUCTIONS.get(name)
+            if value is None:
+                self.values[j] = np.nan
+            elif reduce is None and len(value) == self.num_channels:
+                plain_rows.append(j)
+                plain_values.append(value)
+            else:
+                try:
+                    self.values[j] = reduce(value) if reduce is not None else value
+                except (ValueError, TypeError, KeyError, IndexError):
+                    print(f"Unexpected data shape for {key}")
+                    self.values[j] = np.nan
+                    self.stamps[j] = None
+        if plain_rows:
+            # One conversion for all the plain per-channel features
+            self.values[plain_rows] = plain_values
+        return self.values
+
+    def evaluate(self, features):
+        """
+        Updates the action states from a feature dict and returns the active actions as (action, score), best first.
+        """
+        self.load(features)
+        # NaN compares False, so missing features never cross their threshold
+        np.greater(self.values * self.signs, self.signed_thresholds, out=self.crossed)
+        self.scores = self.channel_weights @ np.count_nonzero(self.crossed, axis=1)
+        self.active = np.where(self.active, self.scores >= self.release, self.scores >= self.activate)
+
+        ranked = np.flatnonzero(self.active)
+        ranked = ranked[np.argsort(-self.scores[ranked], kind='stable')]
+        return [(self.actions[i], float(self.scores[i])) for i in ranked]
+
+    def reset(self):
+        self.stamps = [None] * len(self.rules)
+        self.active[:] = False
+        self.scores[:] = 0.0
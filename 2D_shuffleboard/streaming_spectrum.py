@@ -0,0 +1,138 @@
+from collections import deque
+
+import numpy as np
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import get_window
+
+BANDS = {'delta': (1, 4), 'theta': (4, 8), 'alpha': (8, 13), 'beta': (13, 30)}
+
+
+class WindowSpectrum:
+    """
+    A fixed (..., channels, frequencies) Welch estimate, with the interface of StreamingWelch.
+
+    StreamingWelch.snapshot() returns one; stacking the estimates of several windows along a new
+    leading axis gives a batch the band power and spectral entropy features take as it is.
+    """
+    def __init__(self, psd, frequencies, band_matrix):
+        self.estimate = np.asarray(psd)
+        self.frequencies = frequencies
+        self.band_matrix = band_matrix
+
+    def psd(self):
+        return self.estimate
+
+    def band_powers(self):
+        # (channels, bands) mean PSD per band, zero for bands without frequency bins
+        return self.psd() @ self.band_matrix
+
+    def spectral_entropy(self):
+        psd = self.psd()
+        total = psd.sum(axis=-1, keepdims=True)
+        normalized_psd = np.divide(psd, total, out=np.zeros_like(psd), where=total > 0)
+        # 0 * log(0) is taken as 0, flat channels get zero entropy
+        log_psd = np.log2(normalized_psd, out=np.zeros_like(normalized_psd), where=normalized_psd > 0)
+        return -np.sum(normalized_psd * log_psd, axis=-1)
+
+
+class StreamingWelch(WindowSpectrum):
+    """
+    Welch power spectral density of a sliding window, updated segment by segment.
+
+    The window is covered by overlapping segments of nperseg samples that start every
+    nperseg - noverlap samples. The periodogram of each segment is computed once, when the
+    segment is complete, and kept until the segment slides out of the window, so an update only
+    transforms the segments touched by the new samples. The taper, density scaling, frequency axis
+    and band-averaging matrix are built once in the constructor. num_channels may also be the leading
+    shape of (..., channels, samples) blocks, e.g. (windows, channels) for a batch of windows.
+    """
+    def __init__(self, num_channels, window_size, fs=500, nperseg=256, noverlap=None, window='hann', bands=BANDS):
+        self.num_channels = num_channels
+        self.shape = tuple(num_channels) if np.ndim(num_channels) else (num_channels,)
+        self.window_size = window_size
+        self.fs = fs
+        self.nperseg = min(nperseg, window_size)
+        self.noverlap = noverlap if noverlap is not None else self.nperseg // 2
+        self.step = self.nperseg - self.noverlap
+        if self.step <= 0:
+            raise ValueError("noverlap must be smaller than nperseg")
+
+        # Cached once: taper, one-sided density scaling and frequency axis (same conventions as scipy.signal.welch)
+        self.taper = get_window(window, self.nperseg)
+        self.frequencies = rfftfreq(self.nperseg, 1.0 / fs)
+        self.scale = np.full(self.frequencies.size, 2.0 / (fs * np.sum(self.taper ** 2)))
+        self.scale[0] /= 2
+        if self.nperseg % 2 == 0:
+            self.scale[-1] /= 2  # Nyquist bin is not doubled
+
+        # Band powers are the mean PSD over the bins of each band, i.e. one (frequencies, bands) matrix product
+        self.band_names = list(bands)
+        self.band_matrix = np.zeros((self.frequencies.size, len(bands)))
+        for j, (low, high) in enumerate(bands.values()):
+            idx = np.logical_and(self.frequencies >= low, self.frequencies <= high)
+            if np.any(idx):
+                self.band_matrix[idx, j] = 1.0 / np.count_nonzero(idx)
+
+        self.max_segments = (window_size - self.nperseg) // self.step + 1
+        self.reset()
+
+    def reset(self):
+        self.pending = np.zeros(self.shape + (0,))  # Samples after the start of the next segment
+        self.total_samples = 0  # Samples seen so far
+        self.next_segment_start = 0  # Absolute index of the next segment to complete
+        self.segments = deque()  # (start index, (channels, frequencies) periodogram)
+        self.psd_sum = np.zeros(self.shape + (self.frequencies.size,))
+        self.segments_since_refresh = 0
+
+    def update(self, new_samples):
+        """
+        Adds a (channels, n) block of samples and updates the segment periodograms it completes.
+        """
+        new_samples = np.asarray(new_samples, dtype=np.float64)
+        if new_samples.shape[:-1] != self.shape:
+            raise ValueError(f"Unexpected data shape: {new_samples.shape}. Expected {self.shape + ('number_of_samples',)}.")
+        self.pending = np.concatenate([self.pending, new_samples], axis=-1) if self.pending.shape[-1] else new_samples
+        self.total_samples += new_samples.shape[-1]
+
+        # Segments that end inside the window and are now complete, transformed in one batched FFT
+        first_start = max(self.next_segment_start, self.total_samples - self.window_size)
+        first_start += -(first_start - self.next_segment_start) % self.step  # Keep segment starts on the step grid
+        offset = first_start - self.next_segment_start
+        available = self.pending.shape[-1] - offset
+        if available >= self.nperseg:
+            count = (available - self.nperseg) // self.step + 1
+            segments = np.lib.stride_tricks.sliding_window_view(
+                self.pending[..., offset:], self.nperseg, axis=-1)[..., ::self.step, :][..., :count, :]
+            segments = segments - segments.mean(axis=-1, keepdims=True)  # detrend='constant'
+            periodograms = np.abs(rfft(segments * self.taper, axis=-1)) ** 2 * self.scale
+            for i in range(count):
+                self.segments.append((first_start + i * self.step, periodograms[..., i, :]))
+                self.psd_sum += periodograms[..., i, :]
+            self.next_segment_start = first_start + count * self.step
+            self.segments_since_refresh += count
+        else:
+            self.next_segment_start = first_start
+
+        # Drop segments that slid out of the window and samples no future segment will need
+        window_start = self.total_samples - self.window_size
+        while self.segments and self.segments[0][0] < window_start:
+            self.psd_sum -= self.segments.popleft()[1]
+        self.pending = self.pending[..., max(self.next_segment_start - (self.total_samples - self.pending.shape[-1]), 0):]
+
+        if self.segments_since_refresh >= self.max_segments:
+            self.refresh()
+
+    def refresh(self):
+        # Re-sum the stored periodograms so the running sum does not accumulate rounding drift
+        self.psd_sum = sum((periodogram for _, periodogram in self.segments), np.zeros_like(self.psd_sum))
+        self.segments_since_refresh = 0
+
+    def psd(self):
+        # Welch estimate: mean of the segment periodograms currently inside the window
+        if not self.segments:
+            return np.zeros_like(self.psd_sum)
+        return self.psd_sum / len(self.segments)
+
+    def snapshot(self):
+        # The current estimate, unaffected by later updates
+        return WindowSpectrum(self.psd(), self.frequencies, self.band_matrix)
@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class WindowStats:
+    """
+    Statistics of one fixed (..., channels, samples) window, with the interface of SlidingWindowStats.
+
+    The window is kept by reference, so a strided view such as the windows of
+    windowing.sliding_windows is never copied; the statistics have the window's leading shape.
+    """
+    def __init__(self, window):
+        self.samples = np.asarray(window)
+        self.count = self.samples.shape[-1]
+        self.window_size = self.count
+        window = self.samples.astype(np.float64)
+        self.sum = window.sum(axis=-1)
+        self.sum_sq = (window ** 2).sum(axis=-1)
+        self.zero_crossings = np.count_nonzero(np.diff(np.sign(window), axis=-1), axis=-1)
+
+    def is_full(self):
+        return self.count == self.window_size
+
+    def window(self):
+        return self.samples
+
+    def mean(self):
+        return self.sum / max(self.count, 1)
+
+    def variance(self):
+        # Population variance, as np.var; clipped since cancellation can leave tiny negatives
+        return np.maximum(self.sum_sq / max(self.count, 1) - self.mean() ** 2, 0.0)
+
+    def std_dev(self):
+        return np.sqrt(self.variance())
+
+    def rms(self):
+        return np.sqrt(self.sum_sq / max(self.count, 1))
+
+    def zero_crossing_rate(self):
+        return self.zero_crossings / max(self.count - 1, 1)
+
+
+class SlidingWindowStats(WindowStats):
+    """
+    Sliding (channels, window_size) sample window with incrementally maintained statistics.
+
+    Samples are written into a ring buffer, and running sums, sums of squares and zero-crossing
+    counts are updated by adding the new samples and removing the evicted ones. Each update costs
+    O(new samples x channels) instead of O(window x channels) for np.roll plus full recomputation.
+    """
+    def __init__(self, num_channels, window_size, dtype=np.float32):
+        self.num_channels = num_channels
+        self.window_size = window_size
+        # Every sample is written twice, at i and i + window_size, so the ordered window is always
+        # the contiguous slice [position, position + window_size) and can be returned without a copy
+        self.samples = np.zeros((num_channels, 2 * window_size), dtype=dtype)
+        self.position = 0  # Index of the oldest sample in the window
+        self.count = 0  # Number of valid samples in the window
+
+        self.sum = np.zeros(num_channels)
+        self.sum_sq = np.zeros(num_channels)
+        self.zero_crossings = np.zeros(num_channels, dtype=np.int64)
+        self.samples_since_refresh = 0
+
+    def append(self, new_samples):
+        """
+        Adds a (channels, n) block of samples, evicting the oldest samples once the window is full.
+        """
+        new_samples = np.asarray(new_samples)
+        if new_samples.ndim != 2 or new_samples.shape[0] != self.num_channels:
+            raise ValueError(f"Unexpected data shape: {new_samples.shape}. Expected ({self.num_channels}, number_of_samples).")
+        n = new_samples.shape[1]
+        if n == 0:
+            return
+        if n >= self.window_size:
+            # Nothing of the current window survives, start over from the tail of the block
+            self.samples[:, :self.window_size] = new_samples[:, -self.window_size:]
+            self.samples[:, self.window_size:] = self.samples[:, :self.window_size]
+            self.position = 0
+            self.count = self.window_size
+            self.refresh()
+            return
+
+        evicted_count = max(self.count + n - self.window_size, 0)
+        if evicted_count > 0:
+            # Evicted samples plus the one after them, to drop the zero crossings they took part in
+            evicted = self.samples[:, self.position:self.position + evicted_count + 1].astype(np.float64)
+            self.sum -= evicted[:, :-1].sum(axis=1)
+            self.sum_sq -= (evicted[:, :-1] ** 2).sum(axis=1)
+            self.zero_crossings -= np.count_nonzero(np.diff(np.sign(evicted), axis=1), axis=1)
+
+        # Pair the newest stored sample with the incoming block so the boundary crossing is counted
+        incoming = new_samples.astype(np.float64)
+        if self.count > 0:
+            last = self.samples[:, self.position + self.count - 1, np.newaxis].astype(np.float64)
+            self.zero_crossings += np.count_nonzero(np.diff(np.sign(np.concatenate([last, incoming], axis=1)), axis=1), axis=1)
+        else:
+            self.zero_crossings += np.count_nonzero(np.diff(np.sign(incoming), axis=1), axis=1)
+        self.sum += incoming.sum(axis=1)
+        self.sum_sq += (incoming ** 2).sum(axis=1)
+
+        # Write the block into both halves of the doubled ring buffer
+        write = (self.position + self.count + np.arange(n)) % self.window_size
+        self.samples[:, write] = new_samples
+        self.samples[:, write + self.window_size] = new_samples
+        self.position = (self.position + evicted_count) % self.window_size
+        self.count = min(self.count + n, self.window_size)
+
+        # Re-summing once per window keeps floating point drift bounded at O(channels) amortized cost per sample
+        self.samples_since_refresh += n
+        if self.samples_since_refresh >= self.window_size:
+            self.refresh()
+
+    def refresh(self):
+        window = self.window().astype(np.float64)
+        self.sum = window.sum(axis=1)
+        self.sum_sq = (window ** 2).sum(axis=1)
+        self.zero_crossings = np.count_nonzero(np.diff(np.sign(window), axis=1), axis=1)
+        self.samples_since_refresh = 0
+
+    def window(self):
+        # Ordered (channels, count) view of the window, oldest sample first
+        return self.samples[:, self.position:self.position + self.count]
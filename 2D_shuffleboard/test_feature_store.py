@@ -0,0 +1,34 @@
+import numpy as np
+
+from B_signals_to_features import BUFFER_SIZE, NUM_CHANNELS, TICK_RATE, analyze_signals, build_feature_registry
+from feature_registry import FeatureScheduler
+from feature_store import FeatureStore, read_features
+
+
+def test_live_messages_round_trip_through_read_features(tmp_path):
+    rng = np.random.default_rng(0)
+    scheduler = FeatureScheduler(build_feature_registry(), tick_rate=TICK_RATE)
+    messages = [analyze_signals(rng.standard_normal((NUM_CHANNELS, BUFFER_SIZE)), scheduler=scheduler) for _ in range(10)]
+    # Slow features are phased onto later ticks, so the batch starts with features that have no value yet
+    assert any(value is None for value in messages[0].values())
+
+    store = FeatureStore(root=tmp_path, session='session', batch_size=4)
+    for i, message in enumerate(messages):
+        store.append(message, timestamp=1000.0 + i)
+    store.close()
+    features = read_features('session', root=tmp_path)
+
+    np.testing.assert_array_equal(features['time'], 1000.0 + np.arange(10))
+    assert 'peaks' not in features
+    for i, message in enumerate(messages):
+        np.testing.assert_allclose(features['rms'][i], message['rms'])
+        for name in ('peaks.peak_count', 'phase_synchronization', 'empirical_mode_decomposition.imf_energy'):
+            feature, _, key = name.partition('.')
+            value = message[feature]
+            if value is None:
+                assert np.all(np.isnan(features[name][i])), name
+            elif key:
+                value = [item[key] for item in value] if isinstance(value, list) else value[key]
+                np.testing.assert_allclose(features[name][i], value)
+            else:
+                np.testing.assert_allclose(features[name][i], value)
@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+
+from B_signals_to_features import BUFFER_SIZE, FS, NUM_CHANNELS, SLOW_RATE, TICK_RATE, build_feature_registry
+from feature_registry import FeatureScheduler
+from feature_workers import FeatureWorkerPool
+
+COLLECT_LAG = 2  # Ticks a result may take to reach collect() after the worker computed it
+
+
+def test_scheduler_with_skipped_ticks_runs_every_feature():
+    # Only every seventh tick reaches the scheduler, as on a worker busy with a slow feature
+    scheduler = FeatureScheduler(build_feature_registry(), tick_rate=TICK_RATE, skipped_ticks=True)
+    signals = np.random.default_rng(0).standard_normal((NUM_CHANNELS, BUFFER_SIZE))
+    runs = {name: [] for name in scheduler.registry.features}
+    for tick in range(0, 3 * TICK_RATE, 7):
+        scheduler.update_count = tick
+        scheduler.run(raw=signals)
+        for feature in scheduler.registry.enabled_features():
+            if feature.last_run == tick:
+                runs[feature.name].append(tick)
+
+    for feature in scheduler.registry.enabled_features():
+        period = scheduler.period(feature)
+        ticks = [0] + runs[feature.name]
+        assert max(np.diff(ticks)) < period + 7, feature.name
+
+def test_every_assigned_feature_reports_within_two_periods():
+    tick_period = 1.0 / TICK_RATE
+    samples_per_tick = FS // TICK_RATE
+    rng = np.random.default_rng(0)
+    pool = FeatureWorkerPool(build_feature_registry, NUM_CHANNELS, BUFFER_SIZE, num_workers=2, tick_rate=TICK_RATE, fs=FS,
+                             slow_rate=SLOW_RATE)
+    reports = {}  # Feature name -> ticks at which a newly computed value arrived
+    try:
+        pool.append(rng.standard_normal((NUM_CHANNELS, BUFFER_SIZE)).astype(np.float32))
+        last_timestamps = {}
+        for tick in range(3 * TICK_RATE):
+            start = time.perf_counter()
+            pool.append(rng.standard_normal((NUM_CHANNELS, samples_per_tick)).astype(np.float32))
+            pool.tick()
+            for name, timestamp in pool.collect()['timestamps'].items():
+                if timestamp != last_timestamps.get(name):
+                    reports.setdefault(name, []).append(tick)
+                    last_timestamps[name] = timestamp
+            time.sleep(max(tick_period - (time.perf_counter() - start), 0))
+    finally:
+        pool.close()
+
+    # Counted from the first result of any worker, the pool takes a few ticks to start its processes
+    started = min(ticks[0] for ticks in reports.values())
+    scheduler = FeatureScheduler(build_feature_registry(), tick_rate=TICK_RATE)
+    for names in pool.assignments:
+        for name in names:
+            period = scheduler.period(scheduler.registry.features[name])
+            assert name in reports, f"{name} never reported"
+            ticks = [started] + reports[name]
+            assert max(np.diff(ticks)) <= 2 * period + COLLECT_LAG, f"{name} reported at ticks {reports[name]}"
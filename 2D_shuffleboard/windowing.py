@@ -0,0 +1,72 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def window_starts(samples, window, hop=1, padding=None):
+    # Start index of every window, in samples of the unpadded signal (negative for the first centered windows)
+    if padding == 'center':
+        return np.arange(0, samples, hop) - window // 2
+    if padding == 'end':
+        # Enough windows for the last one to reach the last sample
+        return np.arange(0, -(-max(samples - window, 0) // hop) * hop + 1, hop)
+    return np.arange(0, samples - window + 1, hop)
+
+def sliding_windows(signals, window, hop=1, padding=None, pad_mode='constant', **pad_options):
+    """
+    Windows of `window` samples every `hop` samples of (..., channels, samples) signals, as a read-only
+    (windows, ..., channels, window) strided view: no window is copied, so overlapping windows cost no
+    memory. Every feature function that works on (..., channels, samples) takes the result directly.
+
+    padding=None keeps only complete windows, 'end' pads after the last sample so that a last, partial
+    window covers the samples the complete windows leave out, and 'center' pads window // 2 on both sides so window k is centered on sample
+    k * hop. Padding copies the signal once (np.pad with pad_mode and pad_options), never the windows.
+    The windows start at window_starts(samples, window, hop, padding).
+    """
+    signals = np.asarray(signals)
+    samples = signals.shape[-1]
+    if padding is not None:
+        if padding == 'center':
+            before = window // 2
+            after = (len(window_starts(samples, window, hop, padding)) - 1) * hop + window - before - samples
+        elif padding == 'end':
+            before = 0
+            after = (len(window_starts(samples, window, hop, padding)) - 1) * hop + window - samples
+        else:
+            raise ValueError(f"Unexpected padding: {padding}. Expected None, 'end' or 'center'.")
+        pad_width = [(0, 0)] * (signals.ndim - 1) + [(before, max(after, 0))]
+        signals = np.pad(signals, pad_width, mode=pad_mode, **pad_options)
+    if signals.shape[-1] < window:
+        raise ValueError(f"Unexpected data shape: {signals.shape}. Expected at least {window} samples per channel.")
+    windows = sliding_window_view(signals, window, axis=-1)[..., ::hop, :]
+    return np.moveaxis(windows, -2, 0)
+
+def window_batches(windows, batch_windows=None, batch_channels=None):
+    """
+    Yields (window index, channel index, view) blocks of a (windows, ..., channels, window) array, at most
+    batch_windows windows and batch_channels channels each, e.g. to bound the memory of a feature that
+    copies its input. Channel blocks only suit features that treat channels independently.
+    """
+    count, channels = windows.shape[0], windows.shape[-2]
+    batch_windows = batch_windows or count
+    batch_channels = batch_channels or channels
+    for start in range(0, count, batch_windows):
+        for channel in range(0, channels, batch_channels):
+            yield start, channel, windows[start:start + batch_windows, ..., channel:channel + batch_channels, :]
+
+def delay_embedding(data, emb_dim, delay):
+    # Same rows as delay_embedding in analysis_experiments/Analysis_experiments.ipynb, as a view of `data`
+    span = (emb_dim - 1) * delay + 1
+    return sliding_window_view(np.asarray(data), span, axis=-1)[..., ::delay]
+
+def coarse_grain(signals, scale):
+    """
+    Means of consecutive, non-overlapping groups of `scale` samples along the last axis, the last group
+    shorter when the length is not a multiple of `scale` (coarse_grain in Analysis_experiments.ipynb).
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    samples = signals.shape[-1]
+    complete = samples // scale * scale
+    grouped = signals[..., :complete].reshape(signals.shape[:-1] + (samples // scale, scale)).mean(axis=-1)
+    if complete == samples:
+        return grouped
+    return np.concatenate([grouped, signals[..., complete:].mean(axis=-1, keepdims=True)], axis=-1)